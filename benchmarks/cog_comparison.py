@@ -0,0 +1,84 @@
+"""
+Compare size and read latency of the RGB GeoTIFF as we get it from earth engine, and as a Cloud
+Optimized GeoTIFF.
+
+Two reads are timed, each after re-opening the file (so nothing is cached by GDAL):
+- tile: a single 256x256 window at full resolution (a viewer zoomed in).
+- overview: the whole raster at 1/16th resolution (a viewer zoomed out), which a COG serves from its
+  overviews, and a plain GeoTIFF has to read every pixel for.
+
+Usage:
+    poetry run python -m benchmarks.cog_comparison [--source rgb.tif] [--size 4000]
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy
+from osgeo import gdal
+from fire_perimeter.cog import translate_to_cog
+
+
+def create_synthetic_rgb(filename: str, size: int, seed: int = 42):
+    """ Create a 3 band Float32 GeoTIFF, striped and uncompressed, like the ones earth engine gives us. """
+    rng = numpy.random.default_rng(seed)
+    driver = gdal.GetDriverByName('GTiff')
+    dataset = driver.Create(filename, size, size, 3, gdal.GDT_Float32)
+    dataset.SetGeoTransform((-121.6, 0.0002, 0, 51.5, 0, -0.0002))
+    strip_rows = 256
+    for band_index in range(1, 4):
+        band = dataset.GetRasterBand(band_index)
+        for yoff in range(0, size, strip_rows):
+            ysize = min(strip_rows, size - yoff)
+            # smooth-ish reflectance values, so compression behaves like it would on real imagery
+            x = numpy.linspace(0, 8 * numpy.pi, size)
+            y = numpy.linspace(0, 8 * numpy.pi, size)[yoff:yoff + ysize]
+            strip = 0.2 + 0.1 * numpy.sin(x)[numpy.newaxis, :] * numpy.cos(y)[:, numpy.newaxis]
+            strip += rng.normal(0, 0.01, strip.shape)
+            band.WriteArray(strip.astype(numpy.float32), 0, yoff)
+    dataset.FlushCache()
+    del dataset
+
+
+def time_read(filename: str, overview: bool) -> float:
+    start = time.perf_counter()
+    dataset = gdal.Open(filename, gdal.GA_ReadOnly)
+    if overview:
+        dataset.ReadRaster(0, 0, dataset.RasterXSize, dataset.RasterYSize,
+                           buf_xsize=dataset.RasterXSize // 16, buf_ysize=dataset.RasterYSize // 16)
+    else:
+        xoff = dataset.RasterXSize // 2
+        yoff = dataset.RasterYSize // 2
+        dataset.ReadRaster(xoff, yoff, 256, 256)
+    del dataset
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', help='GeoTIFF to convert, a synthetic one is generated if not given')
+    parser.add_argument('--size', type=int, default=4000, help='size of the synthetic GeoTIFF')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporary_path:
+        source = args.source
+        if not source:
+            source = os.path.join(temporary_path, 'rgb.tif')
+            create_synthetic_rgb(source, args.size)
+        cog = os.path.join(temporary_path, 'rgb_cog.tif')
+        start = time.perf_counter()
+        translate_to_cog(source, cog)
+        print(f'conversion took {time.perf_counter() - start:.2f}s')
+
+        print(f'{"":>10} {"size (MB)":>10} {"tile (ms)":>10} {"overview (ms)":>14}')
+        for name, filename in (('original', source), ('cog', cog)):
+            size = os.path.getsize(filename) / 1024 / 1024
+            tile = min(time_read(filename, overview=False) for _ in range(args.repeat)) * 1000
+            overview = min(time_read(filename, overview=True) for _ in range(args.repeat)) * 1000
+            print(f'{name:>10} {size:>10.1f} {tile:>10.1f} {overview:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,14 @@
+def pytest_addoption(parser):
+    parser.addoption('--raster-sizes', default='512,2048',
+                     help='comma separated sizes (pixels per side) of the synthetic rasters to benchmark')
+    parser.addoption('--fragmentation', default='low,high',
+                     help='comma separated fragmentation levels (low, medium, high) of the synthetic rasters')
+
+
+def pytest_generate_tests(metafunc):
+    if 'size' in metafunc.fixturenames:
+        sizes = [int(size) for size in metafunc.config.getoption('raster_sizes').split(',')]
+        metafunc.parametrize('size', sizes, scope='session')
+    if 'fragmentation' in metafunc.fixturenames:
+        metafunc.parametrize('fragmentation', metafunc.config.getoption('fragmentation').split(','),
+                             scope='session')
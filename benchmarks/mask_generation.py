@@ -0,0 +1,68 @@
+"""
+Compare the scanline (per pixel python loop) and vectorized (numpy) paths for generating the mask used
+by polygonize.
+
+Usage:
+    poetry run python -m benchmarks.mask_generation --sizes 1000 4000 10000
+
+NOTE: The scanline path is very slow for large rasters (10000x10000 is 100 million python comparisons),
+use --skip-scanline to only time the vectorized path.
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy
+from osgeo import gdal
+from benchmarks.synthetic import FRAGMENTATION, create_fire_classification
+from fire_perimeter.client import read_mask, read_scanline
+
+
+def scanline_mask(band) -> numpy.ndarray:
+    """ The original mask generation, one scanline and one python comparison at a time. """
+    rows = band.YSize
+    cols = band.XSize
+    mask_data = numpy.empty([rows, cols], bool)
+    for y_row_index in range(rows):
+        row = read_scanline(band, y_row_index)
+        for index, cell in enumerate(row):
+            mask_data[y_row_index, index] = cell == 1
+    return mask_data
+
+
+def time_mask(filename: str, function) -> float:
+    dataset = gdal.Open(filename, gdal.GA_ReadOnly)
+    band = dataset.GetRasterBand(1)
+    start = time.perf_counter()
+    function(band)
+    elapsed = time.perf_counter() - start
+    del dataset
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 4000, 10000])
+    parser.add_argument('--fragmentation', choices=list(FRAGMENTATION), default='medium')
+    parser.add_argument('--skip-scanline', action='store_true')
+    args = parser.parse_args()
+
+    print(f'{"size":>12} {"scanline (s)":>14} {"vectorized (s)":>16} {"speedup":>10}')
+    with tempfile.TemporaryDirectory() as temporary_path:
+        for size in args.sizes:
+            filename = os.path.join(temporary_path, f'classification_{size}.tif')
+            create_fire_classification(filename, size, args.fragmentation)
+
+            vectorized = time_mask(filename, read_mask)
+            if args.skip_scanline:
+                scanline = float('nan')
+            else:
+                scanline = time_mask(filename, scanline_mask)
+            print(f'{f"{size}x{size}":>12} {scanline:>14.3f} {vectorized:>16.3f} '
+                  f'{scanline / vectorized:>9.1f}x')
+            os.remove(filename)
+
+
+if __name__ == '__main__':
+    main()
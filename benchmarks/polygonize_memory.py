@@ -0,0 +1,65 @@
+"""
+Measure peak memory of polygonize, with the mask built in memory and written to disk, at several raster
+sizes.
+
+Each measurement runs in a fresh process, so peak RSS (resident set size) isn't polluted by earlier
+runs. tracemalloc reports the peak of python/numpy allocations, RSS includes GDAL's own allocations.
+
+Usage:
+    poetry run python -m benchmarks.polygonize_memory --sizes 1000 4000 10000
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+from benchmarks.synthetic import FRAGMENTATION, create_fire_classification
+from fire_perimeter.client import polygonize
+
+
+def measure(filename: str, on_disk: bool, queue: multiprocessing.Queue):
+    tracemalloc.start()
+    start = time.perf_counter()
+    # 0 forces the on disk mask, anything bigger than the raster keeps it in memory
+    polygons = polygonize(filename, max_in_memory_pixels=0 if on_disk else 2 ** 62)
+    elapsed = time.perf_counter() - start
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # ru_maxrss is in kilobytes on linux
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    queue.put((len(polygons), elapsed, traced_peak, rss_peak))
+
+
+def run_measurement(filename: str, on_disk: bool):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=measure, args=(filename, on_disk, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 4000, 10000])
+    parser.add_argument('--fragmentation', choices=list(FRAGMENTATION), default='medium')
+    args = parser.parse_args()
+
+    print(f'{"size":>12} {"mask":>8} {"polygons":>9} {"time (s)":>9} {"tracemalloc (MB)":>17} '
+          f'{"peak rss (MB)":>14}')
+    with tempfile.TemporaryDirectory() as temporary_path:
+        for size in args.sizes:
+            filename = os.path.join(temporary_path, f'classification_{size}.tif')
+            create_fire_classification(filename, size, args.fragmentation)
+            for on_disk in (False, True):
+                polygons, elapsed, traced_peak, rss_peak = run_measurement(filename, on_disk)
+                print(f'{f"{size}x{size}":>12} {"disk" if on_disk else "memory":>8} {polygons:>9} '
+                      f'{elapsed:>9.2f} {traced_peak / 1024 / 1024:>17.1f} {rss_peak / 1024 / 1024:>14.1f}')
+            os.remove(filename)
+
+
+if __name__ == '__main__':
+    main()
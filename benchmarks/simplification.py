@@ -0,0 +1,59 @@
+"""
+Compare vertex count and payload size (WKB) of fire perimeters at different simplification tolerances.
+
+Perimeters are synthetic: random blobs of pixels (like gdal.Polygonize output, they follow pixel edges),
+on a 20m grid somewhere in BC.
+
+Usage:
+    poetry run python -m benchmarks.simplification --pixels 200 1000 --tolerances 10 20 100 500 2000
+"""
+import argparse
+import random
+import time
+from shapely.geometry import box
+from shapely.ops import unary_union
+from fire_perimeter.persistence import construct_multipolygon
+from fire_perimeter.simplify import METERS_PER_DEGREE, describe, simplify_perimeter
+
+ORIGIN = (-120.5, 50.5)
+PIXEL_METERS = 20
+
+
+def create_synthetic_perimeter(size: int, seed: int = 42):
+    """ Grow a blob of (about) size x size pixels, by random walk, and return its polygons. """
+    random_generator = random.Random(seed)
+    pixel = PIXEL_METERS / METERS_PER_DEGREE
+    pixels = set()
+    x = y = 0
+    while len(pixels) < size * size // 2:
+        pixels.add((x, y))
+        x = max(-size // 2, min(size // 2, x + random_generator.choice((-1, 0, 1))))
+        y = max(-size // 2, min(size // 2, y + random_generator.choice((-1, 0, 1))))
+    union = unary_union([box(ORIGIN[0] + x * pixel, ORIGIN[1] + y * pixel,
+                             ORIGIN[0] + (x + 1) * pixel, ORIGIN[1] + (y + 1) * pixel) for x, y in pixels])
+    return list(getattr(union, 'geoms', [union]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pixels', type=int, nargs='+', default=[100, 300])
+    parser.add_argument('--tolerances', type=float, nargs='+', default=[10, 20, 100, 500, 2000])
+    args = parser.parse_args()
+
+    print(f'{"size":>10} {"tolerance (m)":>14} {"vertices":>9} {"wkb (KB)":>9} {"time (ms)":>10}')
+    for size in args.pixels:
+        multi_polygon = construct_multipolygon(create_synthetic_perimeter(size))
+        vertices, payload = describe(multi_polygon)
+        print(f'{f"{size}x{size}":>10} {"-":>14} {vertices:>9} {payload / 1024:>9.1f} {"-":>10}')
+        for tolerance in args.tolerances:
+            start = time.perf_counter()
+            simplified = simplify_perimeter(multi_polygon, tolerance)
+            elapsed = time.perf_counter() - start
+            vertices, payload = describe(simplified) if simplified is not None else (0, 0)
+            print(f'{f"{size}x{size}":>10} {tolerance:>14g} {vertices:>9} {payload / 1024:>9.1f} '
+                  f'{elapsed * 1000:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
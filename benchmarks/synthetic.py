@@ -0,0 +1,77 @@
+"""
+Synthetic, fire like classification rasters for benchmarking.
+
+A fire is a main blob (a radial falloff from the middle of the raster, with a wobbly edge), plus
+noise. The more fragmented the fire, the finer and stronger the noise - which gives us ragged edges,
+unburnt islands inside the fire and spot fires outside of it, i.e. lots of small polygons, holes and
+vertices for polygonize to deal with.
+"""
+from typing import NamedTuple
+import numpy
+from osgeo import gdal
+
+
+class Fragmentation(NamedTuple):
+    # size (as a fraction of the raster) of the features in the noise
+    scale: float
+    # how much the noise is allowed to push pixels in or out of the fire
+    amplitude: float
+
+
+FRAGMENTATION = {
+    'low': Fragmentation(scale=1 / 4, amplitude=0.15),
+    'medium': Fragmentation(scale=1 / 32, amplitude=0.35),
+    'high': Fragmentation(scale=1 / 256, amplitude=0.6),
+}
+
+PIXEL_SIZE = 0.0002
+ORIGIN = (-121.6, 51.5)
+
+
+def _smooth_noise(rng: numpy.random.Generator, size: int, scale: float):
+    """ Return a function giving smooth noise (in -1..1) for a strip of rows, by bilinear interpolation
+    of a coarse grid of random values. """
+    cells = max(2, int(1 / scale) + 1)
+    grid = rng.uniform(-1, 1, (cells + 1, cells + 1))
+    x = numpy.arange(size) / size * cells
+    x0 = x.astype(int)
+    xf = x - x0
+
+    def strip(yoff: int, ysize: int) -> numpy.ndarray:
+        y = numpy.arange(yoff, yoff + ysize) / size * cells
+        y0 = y.astype(int)[:, None]
+        yf = (y - y.astype(int))[:, None]
+        top = grid[y0, x0] * (1 - xf) + grid[y0, x0 + 1] * xf
+        bottom = grid[y0 + 1, x0] * (1 - xf) + grid[y0 + 1, x0 + 1] * xf
+        return top * (1 - yf) + bottom * yf
+    return strip
+
+
+def fire_strips(size: int, fragmentation: str = 'medium', seed: int = 42, strip_rows: int = 256):
+    """ Yield (yoff, strip) pairs covering a size x size classification (1 = fire, 0 = no fire). """
+    rng = numpy.random.default_rng(seed)
+    settings = FRAGMENTATION[fragmentation]
+    edge = _smooth_noise(rng, size, 1 / 8)
+    noise = _smooth_noise(rng, size, settings.scale)
+    x = (numpy.arange(size) - size / 2) / (size / 2)
+    for yoff in range(0, size, strip_rows):
+        ysize = min(strip_rows, size - yoff)
+        y = ((numpy.arange(yoff, yoff + ysize) - size / 2) / (size / 2))[:, None]
+        # 1 in the middle of the fire, 0 at about a third of the way out to the edge of the raster.
+        falloff = 1 - numpy.sqrt(x ** 2 + y ** 2) / (0.6 + 0.2 * edge(yoff, ysize))
+        value = falloff + settings.amplitude * noise(yoff, ysize)
+        yield yoff, (value > 0.2).astype(numpy.float32)
+
+
+def create_fire_classification(filename: str, size: int, fragmentation: str = 'medium', seed: int = 42):
+    """ Write a size x size Float32 classification GeoTIFF (like the one earth engine gives us). The raster
+    is written in strips, so we never hold the whole thing in memory. """
+    driver = gdal.GetDriverByName('GTiff')
+    dataset = driver.Create(filename, size, size, 1, gdal.GDT_Float32,
+                            options=['TILED=YES', 'COMPRESS=DEFLATE'])
+    dataset.SetGeoTransform((ORIGIN[0], PIXEL_SIZE, 0, ORIGIN[1], 0, -PIXEL_SIZE))
+    band = dataset.GetRasterBand(1)
+    for yoff, strip in fire_strips(size, fragmentation, seed):
+        band.WriteArray(strip, 0, yoff)
+    dataset.FlushCache()
+    del dataset
@@ -0,0 +1,94 @@
+"""
+Benchmarks for the raster to perimeter hot path, on synthetic fire rasters of several sizes and
+fragmentation levels (see benchmarks.synthetic). Everything runs offline.
+
+Besides timing, each benchmark records the peak python/numpy memory (tracemalloc) of a single call, and
+the peak RSS of the process, as extra info in the benchmark report.
+
+Usage:
+    poetry run pytest benchmarks --benchmark-only
+    poetry run pytest benchmarks --benchmark-only --raster-sizes 1000,4000 --fragmentation low,medium,high
+    # save a baseline, and compare against it after making changes:
+    poetry run pytest benchmarks --benchmark-only --benchmark-autosave
+    poetry run pytest benchmarks --benchmark-only --benchmark-compare --benchmark-compare-fail=mean:10%
+"""
+import os
+import resource
+import tracemalloc
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+gdal = pytest.importorskip('osgeo.gdal')
+pytest.importorskip('ee')
+
+from shapely.geometry import Point  # noqa: E402
+from benchmarks.synthetic import create_fire_classification  # noqa: E402
+from fire_perimeter.client import (calculate_area, calculate_bounding_box, create_in_memory_band,  # noqa: E402
+                                   polygonize, read_mask, read_scanline)
+from fire_perimeter.persistence import construct_multipolygon  # noqa: E402
+
+
+def track_memory(benchmark, function, *args):
+    """ Run function once under tracemalloc, recording its peak memory in the benchmark's extra info. """
+    tracemalloc.start()
+    function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    benchmark.extra_info['tracemalloc_peak_bytes'] = peak
+    # ru_maxrss is in kilobytes on linux
+    benchmark.extra_info['peak_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@pytest.fixture(scope='session')
+def classification(tmp_path_factory, size, fragmentation):
+    filename = os.path.join(tmp_path_factory.mktemp('rasters'), f'classification_{size}_{fragmentation}.tif')
+    create_fire_classification(filename, size, fragmentation)
+    return filename
+
+
+@pytest.fixture(scope='session')
+def polygons(classification):
+    return polygonize(classification)
+
+
+@pytest.fixture
+def band(classification):
+    dataset = gdal.Open(classification, gdal.GA_ReadOnly)
+    yield dataset.GetRasterBand(1)
+    del dataset
+
+
+def test_polygonize(benchmark, classification):
+    track_memory(benchmark, polygonize, classification)
+    polygons = benchmark(polygonize, classification)
+    benchmark.extra_info['polygons'] = len(polygons)
+
+
+def test_read_scanline(benchmark, band):
+    def read_all():
+        for yoff in range(band.YSize):
+            read_scanline(band, yoff)
+    track_memory(benchmark, read_all)
+    benchmark(read_all)
+
+
+def test_create_in_memory_band(benchmark, band):
+    mask = read_mask(band)
+    geotransform = (-121.6, 0.0002, 0, 51.5, 0, -0.0002)
+    track_memory(benchmark, create_in_memory_band, mask, band.XSize, band.YSize, '', geotransform)
+    benchmark(create_in_memory_band, mask, band.XSize, band.YSize, '', geotransform)
+
+
+def test_calculate_area(benchmark, polygons):
+    track_memory(benchmark, calculate_area, polygons)
+    benchmark(calculate_area, polygons)
+
+
+def test_construct_multipolygon(benchmark, polygons):
+    track_memory(benchmark, construct_multipolygon, polygons)
+    benchmark(construct_multipolygon, polygons)
+
+
+@pytest.mark.parametrize('current_size', [90, 10000, 500000])
+def test_calculate_bounding_box(benchmark, current_size):
+    benchmark(calculate_bounding_box, Point(-121.6, 51.5), current_size)
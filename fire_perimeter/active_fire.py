@@ -4,6 +4,9 @@ https://github.com/bcgov/wps-research/blob/master/py/gee/active_fire.js
 """
 import ee
 
+COLLECTION = 'COPERNICUS/S2_SR'
+CLASSIFICATION_RULE = 'x = R > G && R > B && (LC != 80) && (LC != 50) && (LC != 70) && (DEM < 1500)'
+
 
 def maskS2clouds(image):
     """ function from online example """
@@ -17,7 +20,7 @@ def maskS2clouds(image):
 
 def apply_cloud_cover_threshold(start_date, n_days, cloud_threshold):
     # https://developers.google.com/earth-engine/apidocs/ee-imagecollection-filterdate
-    data = ee.ImageCollection('COPERNICUS/S2_SR').filterDate(
+    data = ee.ImageCollection(COLLECTION).filterDate(
         start_date,
         start_date.advance(n_days, 'day'))
 
@@ -29,18 +32,37 @@ def apply_cloud_cover_threshold(start_date, n_days, cloud_threshold):
     return data
 
 
+def get_scene_ids(start_date, n_days, cloud_threshold, region):
+    """ Return the ids (system:index) of the scenes that intersect region, and would go into the
+    composite made by apply_cloud_cover_threshold. """
+    data = ee.ImageCollection(COLLECTION).filterDate(
+        start_date,
+        start_date.advance(n_days, 'day')).filter(ee.Filter.lt(
+            'CLOUDY_PIXEL_PERCENTAGE',
+            cloud_threshold)).filterBounds(region)
+
+    return data.aggregate_array('system:index').getInfo()
+
+
+def get_dem():
+    return ee.Image('NASA/NASADEM_HGT/001').select('elevation')
+
+
+def get_land_cover():
+    return ee.ImageCollection("ESA/WorldCover/v100").first().select('Map')
+
+
 def apply_classification_rule(data):
     # get DEM, LandCover, Sentinel-2 "L2A" (level two atmospherically-
     # corrected "bottom of atmosphere (BOA) reflectance) data """
-    nasa_dem = ee.Image('NASA/NASADEM_HGT/001').select('elevation')
-    land_cover = ee.ImageCollection("ESA/WorldCover/v100").first()
+    nasa_dem = get_dem()
+    land_cover = get_land_cover()
 
     # apply classification rule
-    rule = 'x = R > G && R > B && (LC != 80) && (LC != 50) && (LC != 70) && (DEM < 1500)'
-    r = data.expression(rule, {'R': data.select('B12'),
-                               'G': data.select('B11'),
-                               'B': data.select('B9'),
-                               'LC': land_cover.select('Map'),
-                               'DEM': nasa_dem})
+    r = data.expression(CLASSIFICATION_RULE, {'R': data.select('B12'),
+                                              'G': data.select('B11'),
+                                              'B': data.select('B9'),
+                                              'LC': land_cover,
+                                              'DEM': nasa_dem})
 
     return r
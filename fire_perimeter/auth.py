@@ -1,14 +1,48 @@
 """
+Authentication with google earth engine.
+
+Earth engine is initialized once per process, and shared by every fire being processed:
+
+    get_session().ensure()
+
+The service account is read once, and the token we sign with it is tracked, so the session is only
+initialized again shortly before the token expires - not for every fire.
 """
 import json
 import os
+import threading
+import time
 from datetime import datetime, timedelta
+from typing import Optional, Tuple
+import ee
 import jwt
 from decouple import config
+from google.oauth2.credentials import Credentials
+from fire_perimeter import limits
+
 
-def jwt_token():
+def load_service_account() -> Optional[dict]:
     """
-    Generate a JWT token for the Google Earth Engine API.
+    Return our service account details, as provided by the google console - or None if there's no
+    service account configured (e.g. running locally, signed in with gcloud).
+    """
+    service_account_config = config('service_account_config', None)
+    if service_account_config and os.path.exists(service_account_config):
+        with open(service_account_config) as f:
+            return json.load(f)
+    if not config('client_email', None):
+        return None
+    return {
+        'client_email': config('client_email'),
+        'private_key': config('private_key').replace('\\n', '\n'),
+        'private_key_id': config('private_key_id')
+    }
+
+
+def create_jwt_token(service_account: dict, lifetime: int = 3600) -> Tuple[str, float]:
+    """
+    Generate a JWT token for the Google Earth Engine API, valid for lifetime seconds.
+    Returns the token, and when it expires (seconds since the epoch).
     Reference: https://developers.google.com/identity/protocols/oauth2#serviceaccount
     """
 
@@ -16,20 +50,8 @@ def jwt_token():
     # https://developers.google.com/earth-engine/reference/rest?hl=en_GB
     # https://developers.google.com/identity/protocols/oauth2/service-account#python_2
 
-    # we take our service account details as provided by the google console:
-    service_account_config = config('service_account_config', None)
-    if service_account_config and os.path.exists(service_account_config):
-        with open(service_account_config) as f:
-            service_account = json.load(f)
-    else:
-        service_account = {
-            'client_email': config('client_email'),
-            'private_key': config('private_key').replace('\\n', '\n'),
-            'private_key_id': config('private_key_id')
-        }
-
     iat = datetime.now()
-    exp = iat + timedelta(seconds=3600)
+    exp = iat + timedelta(seconds=lifetime)
 
     payload = {
         'iss': service_account['client_email'],
@@ -50,4 +72,69 @@ def jwt_token():
         headers=additional_headers,
         algorithm='RS256')
 
-    return token
\ No newline at end of file
+    return token, payload['exp']
+
+
+class EarthEngineSession:
+    """
+    Keeps earth engine initialized for the whole process.
+
+    ensure() is cheap when the session is still good, so call it before using earth engine, rather than
+    once at start up - long running processes will outlive a token. It's thread safe: when the token is
+    about to expire, the first thread to notice refreshes it, while the others wait for it to finish.
+    """
+
+    def __init__(self, lifetime: int = 3600, refresh_margin: int = 300):
+        # how long the tokens we sign are good for, and how long before they expire we replace them.
+        self.lifetime = lifetime
+        self.refresh_margin = refresh_margin
+        self.initializations = 0
+        self._lock = threading.Lock()
+        self._service_account = None
+        self._loaded = False
+        self._expires: Optional[float] = None
+
+    def _initialize(self):
+        if not self._loaded:
+            self._service_account = load_service_account()
+            self._loaded = True
+
+        if self._service_account is None:
+            # no service account, so use whatever credentials we've been signed in with, they take care
+            # of refreshing themselves.
+            try:
+                ee.Initialize()  # don't re-authenticate if already signed in
+            except Exception:
+                ee.Authenticate(auth_mode="gcloud")
+                ee.Initialize()
+            self._expires = float('inf')
+        else:
+            token, expires = create_jwt_token(self._service_account, self.lifetime)
+            # from google.oauth2.credentials import Credentials - only works with python 3.8.* or earlier.
+            ee.Initialize(Credentials(token=token))
+            self._expires = expires
+        self.initializations += 1
+
+    def ensure(self):
+        """ Initialize earth engine, if we haven't yet, or if our token is about to expire. """
+        with self._lock:
+            if self._expires is not None and time.time() < self._expires - self.refresh_margin:
+                return
+            # initializing makes earth engine api calls, which mustn't overlap with anybody else's.
+            with limits.earth_engine_api:
+                self._initialize()
+
+
+_session = None
+_lock = threading.Lock()
+
+
+def get_session() -> EarthEngineSession:
+    """ The earth engine session shared by the whole process. """
+    global _session
+    with _lock:
+        if _session is None:
+            _session = EarthEngineSession(
+                lifetime=int(config('earth_engine_token_lifetime', 3600)),
+                refresh_margin=int(config('earth_engine_token_refresh_margin', 300)))
+    return _session
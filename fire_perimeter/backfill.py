@@ -0,0 +1,149 @@
+"""
+Backfill fire perimeters for a range of dates.
+
+Every (fire, date) pair is a job, and jobs are spread over a pool of processes, so polygonizing and
+calculating areas uses every core. Earth engine and database limits (see fire_perimeter.limits) are
+shared by all the processes, so running more processes doesn't mean hitting earth engine any harder.
+
+Jobs for which we already have a perimeter are skipped, so an interrupted backfill can be re-run with
+the same arguments to pick up where it left off.
+
+Fires are looked up in the current fire points, which only cover this fire season - use --historical for
+fires from previous years.
+
+Usage:
+    poetry run python -m fire_perimeter.backfill --fires K20637 C50744 --historical --start 2021-07-01 \\
+        --end 2021-09-30
+    poetry run python -m fire_perimeter.backfill --bbox -122 50 -119 52 --historical --start 2021-07-01 \\
+        --end 2021-09-30 --step 7
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+from functools import partial
+from typing import List, Optional, Sequence
+from decouple import config
+from shapely.geometry import shape
+from fire_perimeter import fire_feed, limits, scheduler, store
+from fire_perimeter.client import generate_data
+from fire_perimeter.persistence import create_table, get_existing_perimeters
+
+
+def get_fires(fire_numbers: Optional[Sequence[str]] = None,
+              bbox: Optional[Sequence[float]] = None,
+              historical: bool = False,
+              years: Optional[Sequence[int]] = None) -> List[dict]:
+    """
+    Fetch fire points, either by fire number or within a (west, south, east, north) bounding box.
+    Unlike client.get_active_fires, fires that are out are included.
+
+    historical: look in the fire incidents of previous years, instead of the current fire points.
+    years: with historical, only fires from these years (fire numbers are re-used every year).
+
+    Raises ValueError if any of fire_numbers can't be found.
+    """
+    feed = fire_feed.get_feed(historical)
+    years_filter = fire_feed.fire_years_filter(years) if historical and years else None
+    if fire_numbers:
+        return fire_feed.find_fires(feed, fire_numbers, years_filter)
+    current_size_threshold = float(config('current_size_threshold', 90))
+    # the WFS doesn't allow a filter with a bbox, so we filter on year ourselves.
+    return [feature for feature in feed.features(bbox=bbox)
+            if float(feature['properties'].get('CURRENT_SIZE') or 0) >= current_size_threshold
+            and (years_filter is None or int(feature['properties'].get('FIRE_YEAR') or 0) in years)]
+
+
+def date_range(start: date, end: date, step: int) -> List[date]:
+    """ Dates from start to end (inclusive), step days apart. """
+    return [start + timedelta(days=days) for days in range(0, (end - start).days + 1, step)]
+
+
+def _initialize_worker(earth_engine, database):
+    """ Swap this process' limits for the ones shared by the whole pool. """
+    limits.earth_engine = earth_engine
+    limits.database = database
+
+
+def backfill_fire(feature: dict, date_of_interest: date):
+    """ Generate the perimeter of a fire on a given date, waiting for its uploads to finish. """
+    properties = feature['properties']
+    status = generate_data(date_of_interest, shape(feature['geometry']), properties['FIRE_NUMBER'],
+                           float(properties['CURRENT_SIZE']), incremental=False)
+    # worker processes outlive the job, so we can't leave uploads running in the background.
+    failed = [result.key for result in store.get_uploader().wait() if result.status != 'ok']
+    if failed:
+        raise RuntimeError(f'upload failed: {", ".join(failed)}')
+    return status
+
+
+def run(jobs: List[tuple], workers: int, earth_engine_concurrency: int,
+        database_concurrency: int) -> List[scheduler.Result]:
+    """ Run (identifier, process) jobs on a pool of processes, printing progress as they finish. """
+    # spawn rather than fork, so workers don't inherit our database connections or earth engine session.
+    context = multiprocessing.get_context('spawn')
+    results = []
+    with context.Manager() as manager:
+        earth_engine = manager.BoundedSemaphore(earth_engine_concurrency)
+        database = manager.BoundedSemaphore(database_concurrency)
+        run_start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_initialize_worker,
+                                 initargs=(earth_engine, database)) as executor:
+            futures = [executor.submit(scheduler.run_one, identifier, process, run_start)
+                       for identifier, process in jobs]
+            for future in as_completed(futures):
+                results.append(future.result())
+                elapsed = time.perf_counter() - run_start
+                rate = len(results) / elapsed
+                remaining = (len(jobs) - len(results)) / rate
+                print(f'[{len(results)}/{len(jobs)}] {results[-1].identifier} {results[-1].status} '
+                      f'in {results[-1].seconds:.1f}s, {rate * 3600:.1f} jobs/hour, '
+                      f'{remaining / 60:.1f} minutes remaining')
+    return sorted(results, key=lambda result: result.started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    fires = parser.add_mutually_exclusive_group(required=True)
+    fires.add_argument('--fires', nargs='+', metavar='FIRE_NUMBER')
+    fires.add_argument('--bbox', nargs=4, type=float, metavar=('WEST', 'SOUTH', 'EAST', 'NORTH'))
+    parser.add_argument('--historical', action='store_true',
+                        help='look fires up in the fire incidents of previous years, instead of current fires')
+    parser.add_argument('--start', type=date.fromisoformat, required=True)
+    parser.add_argument('--end', type=date.fromisoformat, default=date.today())
+    parser.add_argument('--step', type=int, default=1, help='days between perimeters')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--earth-engine-concurrency', type=int,
+                        default=int(config('earth_engine_concurrency', 4)))
+    parser.add_argument('--database-concurrency', type=int, default=int(config('database_concurrency', 2)))
+    args = parser.parse_args()
+
+    create_table()
+    try:
+        features = get_fires(args.fires, args.bbox, args.historical,
+                             list(range(args.start.year, args.end.year + 1)))
+    except ValueError as e:
+        parser.error(str(e))
+    print(f'found {len(features)} fires')
+    dates = date_range(args.start, args.end, args.step)
+    existing = get_existing_perimeters([feature['properties']['FIRE_NUMBER'] for feature in features],
+                                       args.start, args.end)
+
+    jobs = []
+    for feature in features:
+        fire_number = feature['properties']['FIRE_NUMBER']
+        for date_of_interest in dates:
+            if (fire_number, date_of_interest) not in existing:
+                jobs.append((f'{fire_number} {date_of_interest.isoformat()}',
+                             partial(backfill_fire, feature, date_of_interest)))
+    print(f'{len(jobs)} perimeters to generate, {len(features) * len(dates) - len(jobs)} already done')
+
+    results = run(jobs, args.workers, args.earth_engine_concurrency, args.database_concurrency)
+    scheduler.print_summary(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Local, on disk cache of rasters downloaded from earth engine.
+
+Rasters are stored under a hash of everything that went into requesting them (collection, date window,
+cloud cover, bands, region, dimensions etc.), so asking for the same thing twice - re-runs, backfills,
+playing around with the cli - doesn't go back to earth engine.
+The cache is bounded in size, evicting the least recently used rasters first.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from typing import Optional
+from decouple import config
+
+
+class RasterCache:
+    """ Size bounded, least recently used cache of files. """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(params: dict) -> str:
+        """ Return a key identifying a set of request parameters. """
+        serialized = json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+    def _filename(self, key: str) -> str:
+        return os.path.join(self.path, f'{key}.tif')
+
+    def get(self, key: str, filename: str) -> bool:
+        """ Copy the cached raster for key to filename, returning False if we don't have it. """
+        cached = self._filename(key)
+        try:
+            shutil.copyfile(cached, filename)
+            # bump the modified time, which is what we use to find the least recently used entries.
+            os.utime(cached)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def put(self, key: str, filename: str):
+        """ Store a copy of filename under key, evicting old entries if we're over our size limit. """
+        handle, temporary = tempfile.mkstemp(dir=self.path, suffix='.partial')
+        os.close(handle)
+        shutil.copyfile(filename, temporary)
+        # rename is atomic, so no one ever sees a partially written raster.
+        os.replace(temporary, self._filename(key))
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.path):
+                if entry.name.endswith('.tif'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def print_stats(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total * 100 if total else 0.0
+        print(f'raster cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate)')
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[RasterCache]:
+    """ Return the raster cache, or None if caching is disabled (raster_cache_path isn't set). """
+    global _cache
+    path = config('raster_cache_path', '')
+    if not path:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = RasterCache(path, int(config('raster_cache_max_bytes', 2 * 1024 * 1024 * 1024)))
+    return _cache
@@ -0,0 +1,64 @@
+"""
+Local (numpy) implementation of the classification rule in active_fire.apply_classification_rule.
+
+Classifying locally means we don't have to download a separate classification raster from earth
+engine - we classify the RGB raster we're downloading anyway, at its full resolution. The land cover and
+elevation layers don't change, so they're downloaded in tiles of a fixed grid and served from the raster
+cache after the first download (see client.generate_raster).
+"""
+import numpy
+from numpy import ndarray
+from osgeo import gdal
+
+# ESA WorldCover classes that can't be on fire: 80 = permanent water bodies, 50 = built-up, 70 = snow and ice
+EXCLUDED_LAND_COVER = (80, 50, 70)
+# Only consider pixels below this elevation (meters)
+MAX_ELEVATION = 1500
+
+
+def classify(r: ndarray, g: ndarray, b: ndarray, land_cover: ndarray, dem: ndarray) -> ndarray:
+    """
+    R > G && R > B && LC not in (80, 50, 70) && DEM < 1500, where R, G, B are the B12, B11 and B9
+    Sentinel-2 bands. Returns 1 for fire, 0 for no fire.
+    """
+    return ((r > g) & (r > b) & ~numpy.isin(land_cover, EXCLUDED_LAND_COVER) & (dem < MAX_ELEVATION)).astype(
+        numpy.uint8)
+
+
+def classify_geotiff(rgb_filename: str, land_cover_filename: str, dem_filename: str,
+                     classification_filename: str):
+    """
+    Classify an RGB (B12, B11, B9) GeoTIFF, using land cover and elevation GeoTIFFs on the same grid,
+    writing the result to a single band GeoTIFF. Rasters are processed in strips, so memory use doesn't
+    depend on the size of the raster.
+    """
+    rgb = gdal.Open(rgb_filename, gdal.GA_ReadOnly)
+    land_cover = gdal.Open(land_cover_filename, gdal.GA_ReadOnly)
+    dem = gdal.Open(dem_filename, gdal.GA_ReadOnly)
+    cols = rgb.RasterXSize
+    rows = rgb.RasterYSize
+    for other in (land_cover, dem):
+        if (other.RasterXSize, other.RasterYSize) != (cols, rows):
+            raise ValueError(f'{other.GetDescription()} is {other.RasterXSize}x{other.RasterYSize}, '
+                             f'expected {cols}x{rows}')
+
+    driver = gdal.GetDriverByName('GTiff')
+    classification = driver.Create(classification_filename, cols, rows, 1, gdal.GDT_Byte,
+                                   options=['TILED=YES', 'COMPRESS=DEFLATE'])
+    classification.SetProjection(rgb.GetProjection())
+    classification.SetGeoTransform(rgb.GetGeoTransform())
+    band = classification.GetRasterBand(1)
+
+    _, strip_rows = rgb.GetRasterBand(1).GetBlockSize()
+    # reading one row at a time is very slow, so make sure strips are reasonably tall
+    strip_rows = max(strip_rows, 256)
+    for yoff in range(0, rows, strip_rows):
+        ysize = min(strip_rows, rows - yoff)
+        r, g, b = (rgb.GetRasterBand(index).ReadAsArray(0, yoff, cols, ysize) for index in (1, 2, 3))
+        band.WriteArray(classify(r, g, b,
+                                 land_cover.GetRasterBand(1).ReadAsArray(0, yoff, cols, ysize),
+                                 dem.GetRasterBand(1).ReadAsArray(0, yoff, cols, ysize)),
+                        0, yoff)
+
+    classification.FlushCache()
+    del classification, rgb, land_cover, dem
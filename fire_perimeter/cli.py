@@ -1,18 +1,12 @@
 import os
-import ee
 import sys
 import fire
-import json
-import shutil
-import zipfile
-import datetime
-import urllib.request
 from datetime import date
-from shapely.geometry import Point
-
-from osgeo import ogr
+from shapely.geometry import Point, shape
 
+from fire_perimeter.auth import get_session
 from fire_perimeter.client import generate_raster, polygonize
+from fire_perimeter.fire_feed import get_active_fires
 
 
 def _fire_perimeter(
@@ -26,12 +20,8 @@ def _fire_perimeter(
         current_size: float,
         geojson_filename: str):
 
-    # gcloud authentication
-    try:
-        ee.Initialize()  # don't re-authenticate if already signed in
-    except Exception:
-        ee.Authenticate(auth_mode="gcloud")
-        ee.Initialize()
+    # service account, or gcloud authentication if there isn't one - only the first time round.
+    get_session().ensure()
 
     # clean up existing files
     for file in [classification_filename, rgb_filename, geojson_filename]:
@@ -63,12 +53,8 @@ def _fire_perimeter_(
         current_size: float,
         geojson_filename: str):
 
-    # gcloud authentication
-    try:
-        ee.Initialize()  # don't re-authenticate if already signed in
-    except Exception:
-        ee.Authenticate(auth_mode="gcloud")
-        ee.Initialize()
+    # service account, or gcloud authentication if there isn't one - only the first time round.
+    get_session().ensure()
 
     # clean up existing files
     for file in [classification_filename, rgb_filename, geojson_filename]:
@@ -113,55 +99,33 @@ def fire_perimeter(
 
 
 if __name__ == '__main__':
-    fn = 'prot_current_fire_points.zip'  # download fire data
-    dl_path = 'https://pub.data.gov.bc.ca/datasets/2790e3f7-6395-4230-8545-04efb5a18800/' + fn
-    urllib.request.urlretrieve(dl_path, fn)
-
-    t = datetime.datetime.now().strftime("%Y%m%d")  # %H%M%S")  # timestamped backup
-    shutil.copyfile(fn, 'prot_current_fire_points_' + t + '.zip')
-    zipfile.ZipFile(fn).extractall()
-
-    # Open Shapefile
-    Shapefile = ogr.Open('prot_current_fire_points.shp')
-    print(Shapefile)
-    layer = Shapefile.GetLayer()
-    layerDefinition = layer.GetLayerDefn()
-    feature_count = layer.GetFeatureCount()
-    spatialRef = layer.GetSpatialRef()
-
-    def records(layer):
-        for i in range(layer.GetFeatureCount()):
-            feature = layer.GetFeature(i)
-            yield json.loads(feature.ExportToJson())
-
-    features = records(layer)
-    feature_names, feature_ids, records_use = [], [], []
-    for f in features:
-        for key in f.keys():
-            if key == 'properties':
-                fk = f[key]
-                fire_size = float(fk['CURRENT_SI'])
-                if fk['FIRE_STATU'].lower() != 'out' and fire_size > 100.:  # fire_size > biggest_size
-                    records_use.append(fk)  # selected fires
-                    print(fk)
+    records_use = []
+    for feature in get_active_fires(min_size=100.):  # selected fires
+        properties = feature['properties']
+        point = shape(feature['geometry'])
+        records_use.append({'FIRE_NUMBER': properties['FIRE_NUMBER'],
+                            'CURRENT_SIZE': float(properties['CURRENT_SIZE']),
+                            'LATITUDE': point.y,
+                            'LONGITUDE': point.x})
+        print(properties)
 
     if len(sys.argv) > 1:
         fire.Fire(fire_perimeter)
     else:
         # call with different parameters
         for fk in records_use:
-            rgb_f = fk['FIRE_NUMBE'] + '_rgb.tif'
-            _fire_perimeter_(latitude=float(fk['LATITUDE']),
-                             longitude=float(fk['LONGITUDE']),
+            rgb_f = fk['FIRE_NUMBER'] + '_rgb.tif'
+            _fire_perimeter_(latitude=fk['LATITUDE'],
+                             longitude=fk['LONGITUDE'],
                              # .isoformat(), #.strftime("%Y-%m-%d"),
-                             date_of_interest=datetime.date.today(),
-                             current_size=float(fk['CURRENT_SI']),
+                             date_of_interest=date.today(),
+                             current_size=fk['CURRENT_SIZE'],
                              date_range=11.,
                              cloud_cover=30.,
-                             classification_filename=fk['FIRE_NUMBE'] + \
+                             classification_filename=fk['FIRE_NUMBER'] + \
                              '_classification.tif',
                              rgb_filename=rgb_f,
-                             geojson_filename=fk['FIRE_NUMBE'] + '.json')
+                             geojson_filename=fk['FIRE_NUMBER'] + '.json')
             a = os.system('gdal_translate -of ENVI -ot Float32 ' +
                           rgb_f + ' ' + rgb_f[:-3] + 'bin')
             hdr_cleanup = '~/GitHub/wps-research/py/envi_header_cleanup.py'
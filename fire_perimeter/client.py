@@ -1,57 +1,183 @@
 import os
 import math
+import hashlib
+import json
 import shutil
 import tempfile
-import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
+from functools import partial
+from typing import List, Optional, Tuple
 import struct
-import json
 import numpy
-import requests
-from google.oauth2.credentials import Credentials
 import ee
 from numpy import ndarray
-from osgeo import gdal, ogr, osr
-from pyproj import Geod
+from osgeo import gdal, ogr
 from decouple import config
-from shapely.geometry import shape, Point
-from fire_perimeter.active_fire import apply_classification_rule, apply_cloud_cover_threshold
-from fire_perimeter.auth import jwt_token
-from fire_perimeter.persistence import persist_polygon
-from fire_perimeter.store import get_client
-
+from shapely import wkb
+from shapely.geometry import shape, Point, Polygon
+from fire_perimeter import fire_feed, limits, metrics, scheduler, store
+from fire_perimeter.active_fire import (COLLECTION, CLASSIFICATION_RULE, apply_classification_rule,
+                                        apply_cloud_cover_threshold, get_dem, get_land_cover, get_scene_ids)
+from fire_perimeter.auth import get_session
+from fire_perimeter.cache import get_cache
+from fire_perimeter.classify import classify_geotiff
+from fire_perimeter.cog import translate_to_cog
+from fire_perimeter.download import download
+from fire_perimeter.persistence import (create_table, get_previous_perimeters, get_scene_fingerprint,
+                                        persist_polygons, prepare_perimeter)
+from fire_perimeter.planner import (MAX_DOWNLOAD_BYTES, Cluster, Fire, assign_polygons, clamp_bounding_box,
+                                    cluster_fires, expand_bounding_box, nearest_polygons, touching_edges)
+from fire_perimeter.simplify import count_vertices
+from fire_perimeter.stats import GEOD, calculate_statistics
+from fire_perimeter.store import get_uploader
+
+
+def download_image(data, params: dict, filename: str) -> bool:
+    """ Ask earth engine for a download url, and stream it to filename. """
+    with limits.earth_engine:
+        # downloads can queue for a long time, make sure our token hasn't expired in the meantime.
+        authenticate()
+        with limits.earth_engine_api:
+            url = data.getDownloadUrl(params)
+        return download(url, filename) is not None
+
+
+def calculate_tiles(bounds: Tuple[float, float, float, float], pixels: Tuple[int, int], max_pixels: float):
+    """
+    Split bounds (west, south, east, north) into a grid of tiles, none of which exceed max_pixels.
+    Returns a list of (bounds, dimensions) for each tile.
 
-def write_geotiff(data, bbox, filename, params={}, pixels=(1024, 1024), bytes_per_pixel=12):
+    Tile edges always fall on pixel boundaries of the full (pixels) grid, so all the tiles have the
+    same resolution and line up exactly.
+    """
+    west, south, east, north = bounds
+    width, height = pixels
+    side = int(math.sqrt(max_pixels))
+    columns = math.ceil(width / side)
+    rows = math.ceil(height / side)
+    x_edges = [width * column // columns for column in range(columns + 1)]
+    y_edges = [height * row // rows for row in range(rows + 1)]
+
+    tiles = []
+    for row in range(rows):
+        # pixel rows go from north to south
+        tile_north = north - (north - south) * y_edges[row] / height
+        tile_south = north - (north - south) * y_edges[row + 1] / height
+        for column in range(columns):
+            tile_west = west + (east - west) * x_edges[column] / width
+            tile_east = west + (east - west) * x_edges[column + 1] / width
+            tiles.append(((tile_west, tile_south, tile_east, tile_north),
+                          (x_edges[column + 1] - x_edges[column], y_edges[row + 1] - y_edges[row])))
+    return tiles
+
+
+def calculate_grid_tiles(bounds: Tuple[float, float, float, float],
+                         tile_size: float) -> List[Tuple[float, float, float, float]]:
+    """
+    Return the (west, south, east, north) tiles of a fixed grid, tile_size degrees square and aligned on
+    0, 0, that cover bounds - from north west to south east. The grid doesn't depend on bounds, so
+    neighbouring (or growing) areas get the same tiles.
+    """
+    west, south, east, north = bounds
+    tiles = []
+    for row in reversed(range(math.floor(south / tile_size), math.ceil(north / tile_size))):
+        for column in range(math.floor(west / tile_size), math.ceil(east / tile_size)):
+            tiles.append((round(column * tile_size, 9), round(row * tile_size, 9),
+                          round((column + 1) * tile_size, 9), round((row + 1) * tile_size, 9)))
+    return tiles
+
+
+def warp_to_grid(filenames: List[str], filename: str, like_filename: str):
+    """ Mosaic filenames into filename, on exactly the same grid as like_filename. """
+    like = gdal.Open(like_filename, gdal.GA_ReadOnly)
+    (west, south, east, north), _ = get_raster_bounds(like_filename)
+    gdal.Warp(filename, filenames, format='GTiff', dstSRS=like.GetProjection(),
+              outputBounds=(west, south, east, north), width=like.RasterXSize, height=like.RasterYSize,
+              resampleAlg='near')
+    del like
+
+
+def write_tiled_geotiff(data, bounds, filename, params, pixels, max_pixels):
+    """
+    Download bounds as a grid of tiles that each fit in the earth engine download limit, and mosaic them
+    into a single GeoTIFF. The mosaic is done through a VRT, so GDAL copies the tiles into the target
+    a block at a time - we never have the whole raster in memory.
+    """
+    tiles = calculate_tiles(bounds, pixels, max_pixels)
+    print(f'downloading {filename} as {len(tiles)} tiles')
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(filename) or None) as tile_path:
+        tile_filenames = [os.path.join(tile_path, f'tile_{index}.tif') for index in range(len(tiles))]
+        with ThreadPoolExecutor(max_workers=int(config('tile_download_workers', 4))) as executor:
+            futures = [
+                metrics.submit(executor, download_image, data,
+                               dict({'min': 0, 'max': 1, 'dimensions': tile_dimensions,
+                                     'region': ee.Geometry.BBox(*tile_bounds), 'format': 'GEO_TIFF'},
+                                    **params),
+                               tile_filename)
+                for (tile_bounds, tile_dimensions), tile_filename in zip(tiles, tile_filenames)]
+            downloaded = [future.result() for future in futures]
+
+        if not all(downloaded):
+            print(f'failed to write {filename}, {downloaded.count(False)} tiles failed')
+            return
+
+        vrt_filename = os.path.join(tile_path, 'mosaic.vrt')
+        vrt = gdal.BuildVRT(vrt_filename, tile_filenames)
+        gdal.Translate(filename, vrt, format='GTiff',
+                       creationOptions=['TILED=YES', 'COMPRESS=DEFLATE', 'BIGTIFF=IF_SAFER'])
+        del vrt
+
+
+def write_geotiff(data, bounds, filename, params={}, pixels=(1024, 1024), bytes_per_pixel=12, tiled=None,
+                  cache_key=None):
+    """
+    bounds: (west, south, east, north)
+    tiled: if the request exceeds the earth engine download limit, download it in tiles instead of
+        reducing the resolution. Defaults to the tiled_download setting.
+    cache_key: parameters identifying data (e.g. collection, date window, cloud cover, scene ids). If given,
+        and the raster cache is enabled, we only go to earth engine if we haven't downloaded this exact raster
+        before.
+    """
     # https://developers.google.com/earth-engine/apidocs/ee-image-getdownloadurl
     # the largest dimension we're allowed to use is 10000 - that's all good and well that you want 10000x10000, pixels
     # but according to docmentation the maximum size is 32 MB
     # Assuming out TIFF has 3 bands, and 4 bytes per band, that's 12 bytes per pixel
-    max_bytes = 32 * 1024 * 1024
-    max_pixels = max_bytes / bytes_per_pixel
+    max_pixels = MAX_DOWNLOAD_BYTES / bytes_per_pixel
     requested_pixels = pixels[0] * pixels[1]
     ratio = math.sqrt(max_pixels) / math.sqrt(requested_pixels)
 
-    if ratio < 1.0:
-        # we're exceeding the max size, scale it down.
-        dimensions = (int(pixels[0]*ratio),
-                      int(pixels[1]*ratio))
+    if tiled is None:
+        tiled = config('tiled_download', 'false') == 'true'
+
+    cache = get_cache() if cache_key is not None else None
+    if cache:
+        key = cache.key(dict(cache_key, bounds=bounds, pixels=pixels, bytes_per_pixel=bytes_per_pixel,
+                             tiled=tiled, params=params))
+        if cache.get(key, filename):
+            print(f'{filename} found in cache')
+            return
+
+    if ratio < 1.0 and tiled:
+        # we're exceeding the max size, fetch it in pieces.
+        write_tiled_geotiff(data, bounds, filename, params, pixels, max_pixels)
     else:
-        # we're not exceeding the max size, all good.
-        dimensions = pixels
+        if ratio < 1.0:
+            # we're exceeding the max size, scale it down.
+            dimensions = (int(pixels[0]*ratio),
+                          int(pixels[1]*ratio))
+        else:
+            # we're not exceeding the max size, all good.
+            dimensions = pixels
 
-    base_params = {'min': 0, 'max': 1, 'dimensions': dimensions,
-                   'region': bbox, 'format': 'GEO_TIFF'}
+        base_params = {'min': 0, 'max': 1, 'dimensions': dimensions,
+                       'region': ee.Geometry.BBox(*bounds), 'format': 'GEO_TIFF'}
 
-    url = data.getDownloadUrl(dict(base_params, **params))
-    response = requests.get(url, timeout=60)
+        if not download_image(data, dict(base_params, **params), filename):
+            print(f'failed to write {filename}')
 
-    # print(response.status_code)
-    if response.status_code == 200:
-        with open(filename, 'wb') as f:
-            f.write(response.content)
-    else:
-        print(f'failed to write {filename}')
-        # print(f'{filename} written')
+    if cache and os.path.exists(filename):
+        cache.put(key, filename)
 
 
 def create_in_memory_band(data: ndarray, cols, rows, projection, geotransform):
@@ -87,41 +213,112 @@ def read_scanline(band, yoff):
     return struct.unpack('f' * band.XSize, scanline)
 
 
-def polygonize(geotiff_filename, geojson_filename):
-    classification = gdal.Open(geotiff_filename, gdal.GA_ReadOnly)
-    band = classification.GetRasterBand(1)
+def read_mask(band, value=1) -> ndarray:
+    """ Read a band, returning a boolean array that is True wherever the band is equal to value.
 
-    projection = classification.GetProjection()
-    geotransform = classification.GetGeoTransform()
+    The band is read in strips that span the full width of the raster, and are as high as the band's
+    natural block size - so every block is only read (and decompressed) once, and the comparison is done
+    by numpy on a whole strip at a time.
+
+    block size: https://gdal.org/user/raster_data_model.html#raster-band
+    """
     rows = band.YSize
     cols = band.XSize
+    _, block_rows = band.GetBlockSize()
 
-    # generate mask data
     mask_data = numpy.empty([rows, cols], bool)
-    for y_row_index in range(rows):
-        row = read_scanline(band, y_row_index)
-        for index, cell in enumerate(row):
-            mask_data[y_row_index, index] = cell == 1
-    mask_ds, mask_band = create_in_memory_band(
-        mask_data, cols, rows, projection, geotransform)
+    for yoff in range(0, rows, block_rows):
+        ysize = min(block_rows, rows - yoff)
+        strip = band.ReadAsArray(xoff=0, yoff=yoff, win_xsize=cols, win_ysize=ysize)
+        numpy.equal(strip, value, out=mask_data[yoff:yoff + ysize])
+    return mask_data
 
-    # Create a GeoJSON layer.
-    geojson_driver = ogr.GetDriverByName('GeoJSON')
-    dst_ds = geojson_driver.CreateDataSource(geojson_filename)
-    dst_layer = dst_ds.CreateLayer('fire')
-    field_name = ogr.FieldDefn("fire", ogr.OFTInteger)
-    field_name.SetWidth(24)
-    dst_layer.CreateField(field_name)
 
-    # Turn the rasters into polygons.
-    gdal.Polygonize(band, mask_band, dst_layer, 0, [], callback=None)
+def create_on_disk_mask_band(band, filename: str, projection, geotransform, value=1):
+    """ Create a mask band (1 wherever band is equal to value, 0 elsewhere) in a tiled GeoTIFF.
 
-    # Ensure that all data in the target dataset is written to disk.
-    dst_ds.FlushCache()
-    # Explicitly clean up (is this needed?)
+    The mask is written one strip at a time, so memory use is bounded by the size of a strip, no matter
+    how big the raster is.
+    """
+    rows = band.YSize
+    cols = band.XSize
+    _, block_rows = band.GetBlockSize()
+
+    driver = gdal.GetDriverByName('GTiff')
+    dataset = driver.Create(filename, cols, rows, 1, gdal.GDT_Byte,
+                            options=['TILED=YES', 'COMPRESS=DEFLATE', 'SPARSE_OK=TRUE'])
+    dataset.SetProjection(projection)
+    dataset.SetGeoTransform(geotransform)
+    mask_band = dataset.GetRasterBand(1)
+    for yoff in range(0, rows, block_rows):
+        ysize = min(block_rows, rows - yoff)
+        strip = band.ReadAsArray(xoff=0, yoff=yoff, win_xsize=cols, win_ysize=ysize)
+        mask_band.WriteArray((strip == value).astype(numpy.uint8), 0, yoff)
+    mask_band.FlushCache()
+
+    return dataset, mask_band
 
-    del dst_ds, classification, mask_ds
-    print(f'{geojson_filename} written')
+
+def polygonize(geotiff_filename: str, geojson_filename: Optional[str] = None,
+               max_in_memory_pixels: Optional[int] = None) -> List[Polygon]:
+    """
+    Turn the fire pixels in the classification raster into polygons.
+
+    The polygons are built in an in memory layer and returned as shapely geometries, so nothing has to
+    be written to disk and read back in again. If geojson_filename is given, the polygons are also written
+    to that file (useful for debugging).
+
+    max_in_memory_pixels: rasters larger than this have their mask written to disk a strip at a time,
+        instead of being built in memory, so memory use stays bounded for huge fires. Defaults to the
+        polygonize_max_in_memory_pixels setting.
+    """
+    if max_in_memory_pixels is None:
+        max_in_memory_pixels = int(config('polygonize_max_in_memory_pixels', 25000000))
+
+    classification = gdal.Open(geotiff_filename, gdal.GA_ReadOnly)
+    band = classification.GetRasterBand(1)
+
+    projection = classification.GetProjection()
+    geotransform = classification.GetGeoTransform()
+    rows = band.YSize
+    cols = band.XSize
+    # recorded whichever way the mask is made - the biggest rasters are the ones that go to disk.
+    metrics.add(raster_width_pixels=cols, raster_height_pixels=rows)
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(geotiff_filename) or None) as temporary_path:
+        # generate mask data
+        if rows * cols > max_in_memory_pixels:
+            mask_ds, mask_band = create_on_disk_mask_band(
+                band, os.path.join(temporary_path, 'mask.tif'), projection, geotransform)
+        else:
+            mask_data = read_mask(band)
+            mask_ds, mask_band = create_in_memory_band(
+                mask_data, cols, rows, projection, geotransform)
+            del mask_data
+
+        # Create an in memory layer.
+        memory_driver = ogr.GetDriverByName('Memory')
+        dst_ds = memory_driver.CreateDataSource('fire')
+        dst_layer = dst_ds.CreateLayer('fire')
+        field_name = ogr.FieldDefn("fire", ogr.OFTInteger)
+        field_name.SetWidth(24)
+        dst_layer.CreateField(field_name)
+
+        # Turn the rasters into polygons.
+        gdal.Polygonize(band, mask_band, dst_layer, 0, [], callback=None)
+
+        polygons = [wkb.loads(bytes(feature.GetGeometryRef().ExportToWkb())) for feature in dst_layer]
+
+        if geojson_filename:
+            geojson_driver = ogr.GetDriverByName('GeoJSON')
+            geojson_ds = geojson_driver.CopyDataSource(dst_ds, geojson_filename)
+            # Ensure that all data in the target dataset is written to disk.
+            geojson_ds.FlushCache()
+            del geojson_ds
+            print(f'{geojson_filename} written')
+
+        del dst_ds, classification, mask_band, mask_ds
+    return polygons
 
 
 def calculate_bounding_box(point_of_intereset: Point, current_size: float):
@@ -140,7 +337,7 @@ def calculate_bounding_box(point_of_intereset: Point, current_size: float):
     lon = point_of_intereset.x
     lat = point_of_intereset.y
     # https://pyproj4.github.io/pyproj/stable/api/geod.html
-    g = Geod(ellps='WGS84')
+    g = GEOD
 
     n = g.fwd(lon, lat, 0, distance, radians=False)  # north
     s = g.fwd(lon, lat, 180, distance, radians=False)  # south
@@ -155,16 +352,89 @@ def calculate_bounding_box(point_of_intereset: Point, current_size: float):
     return (west, south, east, north)
 
 
+def adapt_bounding_boxes(fires: List[Fire], date_of_interest: date) -> List[Fire]:
+    """
+    calculate_bounding_box has to guess how far a fire has spread from its size, so it downloads far more
+    than we need for most fires, and crops irregularly shaped ones. If we have a previous perimeter for a
+    fire, we use the envelope of the part of it at the fire point (grown by adaptive_bounding_box_growth
+    meters) instead - never more than adaptive_bounding_box_max_multiple times the area
+    calculate_bounding_box would give the fire. Fires without a previous perimeter keep their bounding box.
+    """
+    if not fires or config('adaptive_bounding_box', 'true') != 'true':
+        return fires
+    try:
+        with limits.database:
+            perimeters = get_previous_perimeters([fire.identifier for fire in fires], date_of_interest)
+    except Exception as e:
+        print(f'Could not fetch previous perimeters: {e}')
+        return fires
+
+    growth = float(config('adaptive_bounding_box_growth', 2000))
+    max_multiple = float(config('adaptive_bounding_box_max_multiple', 4))
+    adapted = []
+    for fire in fires:
+        perimeter = perimeters.get(fire.identifier)
+        if perimeter is None:
+            adapted.append(fire)
+            continue
+        # false positives elsewhere in the last raster are part of the previous perimeter too, if we sized
+        # the box to include them, it would only ever grow.
+        polygons = nearest_polygons(perimeter.geoms, fire.point)
+        # the fire point should always be in the area we look at, even if the perimeter has moved off it.
+        envelope = (min([polygon.bounds[0] for polygon in polygons] + [fire.point.x]),
+                    min([polygon.bounds[1] for polygon in polygons] + [fire.point.y]),
+                    max([polygon.bounds[2] for polygon in polygons] + [fire.point.x]),
+                    max([polygon.bounds[3] for polygon in polygons] + [fire.point.y]))
+        limit = calculate_bounding_box(fire.point, fire.current_size * max_multiple)
+        adapted.append(fire._replace(bounds=clamp_bounding_box(expand_bounding_box(envelope, growth), limit)))
+    return adapted
+
+
+def get_raster_bounds(filename: str) -> Tuple[Tuple[float, float, float, float], Tuple[float, float]]:
+    """ Return the (west, south, east, north) bounds of a raster, and its (width, height) pixel size. """
+    dataset = gdal.Open(filename, gdal.GA_ReadOnly)
+    west, pixel_width, _, north, _, pixel_height = dataset.GetGeoTransform()
+    east = west + pixel_width * dataset.RasterXSize
+    south = north + pixel_height * dataset.RasterYSize
+    del dataset
+    return (west, south, east, north), (abs(pixel_width), abs(pixel_height))
+
+
 def authenticate():
     """
-    Authenticate with the google earth engine
+    Authenticate with the google earth engine - only does anything the first time it's called in a
+    process, or when our token is about to expire (see auth.EarthEngineSession).
     """
-    # construct jwt token
-    token = jwt_token()
+    get_session().ensure()
+
+
+def to_ee_date(value: date):
+    """ Earth engine date for the start of value, in pacific standard time. """
+    return ee.Date(f'{value.isoformat()}T00:00', 'Etc/GMT-8')
 
-    # from google.oauth2.credentials import Credentials - only works with python 3.8.* or earlier.
-    credentials = Credentials(token=token)
-    ee.Initialize(credentials)
+
+def calculate_scene_fingerprint(date_of_interest: date,
+                                points: List[Point],
+                                bounds: Tuple[float, float, float, float],
+                                date_range: int,
+                                cloud_cover: float) -> str:
+    """
+    Return a fingerprint of everything that goes into the classification of the fires at points: the
+    sentinel 2 scenes over the area downloaded (bounds) that generate_raster would composite, and the
+    classification rule. If the fingerprint hasn't changed since the last run, neither has the perimeter.
+
+    The scenes are looked up over bounds, so a new scene over any part of the perimeter counts, not just
+    one over the fire points. bounds itself isn't part of the fingerprint though, because it changes from
+    run to run (see adapt_bounding_boxes) even when the imagery doesn't.
+    """
+    start_date = date_of_interest - timedelta(days=date_range)
+    with limits.earth_engine_api:
+        scene_ids = get_scene_ids(to_ee_date(start_date), date_range, cloud_cover, ee.Geometry.BBox(*bounds))
+    fingerprint = {'collection': COLLECTION,
+                   'scenes': sorted(scene_ids),
+                   'points': sorted([point.x, point.y] for point in points),
+                   'rule': CLASSIFICATION_RULE}
+    return hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode('utf-8')).hexdigest()
 
 
 def generate_raster(date_of_interest: date,
@@ -173,9 +443,12 @@ def generate_raster(date_of_interest: date,
                     rgb_geotiff_filename: str,
                     current_size: float,
                     date_range: int,
-                    cloud_cover: float):
+                    cloud_cover: float,
+                    bounds: Optional[Tuple[float, float, float, float]] = None):
     """
     Step back 14 days from the the of interest, and classify an area around the point of interest.
+    bounds: (west, south, east, north) of the area to classify, if not given, it's calculated from the
+        point of interest and current size.
     """
     # https://developers.google.com/earth-engine/guides/python_install#syntax
 
@@ -185,7 +458,7 @@ def generate_raster(date_of_interest: date,
     print(f'start date: {start_date}')
 
     data = apply_cloud_cover_threshold(
-        ee.Date(f'{start_date.isoformat()}T00:00', 'Etc/GMT-8'),
+        to_ee_date(start_date),
         date_range,  # date range: [t1, t1 + N_DAYS]
         cloud_cover  # cloud cover max %
     )
@@ -202,13 +475,12 @@ def generate_raster(date_of_interest: date,
     # south = lat-0.2
     # east = lon+0.3
     # north = lat+0.2
-    west, south, east, north = calculate_bounding_box(
-        point_of_interest, current_size)
-
-    bbox = ee.Geometry.BBox(west, south, east, north)
+    if bounds is None:
+        bounds = calculate_bounding_box(point_of_interest, current_size)
+    west, south, east, north = bounds
 
     # attempt to figure out how many pixels we need to ask for to get 20m resolution:
-    g = Geod(ellps='WGS84')
+    g = GEOD
     _, _, width = g.inv(west, lat, east, lat)
     _, _, height = g.inv(lon, south, lon, north)
     width = int(width / 20)
@@ -216,51 +488,82 @@ def generate_raster(date_of_interest: date,
 
     # NOTE: sadly, even though we're only getting a single 8 bit band, I can't convince
     # google earth that's the case, so we're not getting the classification raster
-    # at the resolution we'd like.
-    write_geotiff(fires, bbox, classification_geotiff_filename,
-                  {'bands': ['x']},
-                  pixels=(width, height), bytes_per_pixel=12)
-    write_geotiff(data, bbox, rgb_geotiff_filename,
-                  {'bands': ['B12', 'B11', 'B9']}, (width, height), bytes_per_pixel=12)
-
-
-def calculate_area(filename):
-    # TODO: you have to do some magic here, to re-project to something that uses meters
-    print(filename)
-    driver = ogr.GetDriverByName('GeoJSON')
-    ds = driver.Open(filename, gdal.GA_ReadOnly)
-    layer = ds.GetLayer()
-    source_projection = layer.GetSpatialRef()
-    target_projection = osr.SpatialReference()
-    # target_projection.SetWellKnownGeogCS('NAD83')
-    # TODO: use a better target projection!! I just thumb sucked this one!
-    # https://spatialreference.org/ref/epsg/nad83-utm-zone-10n/
-    target_projection.ImportFromEPSG(26910)
-    transform = osr.CoordinateTransformation(
-        source_projection, target_projection)
-    area_total = 0
-    for feature in layer:
-        transformed = feature.GetGeometryRef()
-        transformed.Transform(transform)
-        area_total += transformed.GetArea()
-    print(f'Total area: {area_total} m^2, {area_total/10000} hectares')
-
-    del ds
-
-
-def calculate_area_fail(filename):
-    print(filename)
-    with open(filename) as f:
-        js = json.load(f)
-    total_area = 0
-    for feature in js['features']:
-        polygon = shape(feature['geometry'])
-        geod = Geod(ellps="WGS84")
-        area, perim = geod.geometry_area_perimeter(polygon)
-        total_area += area
-        # print(f'area: {area}')
-        # print(f'perim: {perim}')
-    print(f'total_area {total_area}')
+    # at the resolution we'd like - unless tiled_download or local_classification is enabled.
+
+    # everything (other than the region, bands and size) that decides what earth engine gives us.
+    cache_key = {'collection': COLLECTION,
+                 'start_date': start_date,
+                 'date_range': date_range,
+                 'cloud_cover': cloud_cover}
+    if get_cache() is not None:
+        # scenes keep being ingested for a date window, so the scenes that went into a raster are part of
+        # what identifies it - otherwise we'd keep handing back rasters made from the imagery we had before.
+        with metrics.stage('scene_ids'), limits.earth_engine_api:
+            cache_key['scenes'] = sorted(get_scene_ids(to_ee_date(start_date), date_range, cloud_cover,
+                                                       ee.Geometry.BBox(*bounds)))
+
+    local_classification = config('local_classification', 'false') == 'true'
+    static_tiles = {}
+    if local_classification:
+        # Classify the RGB raster ourselves, instead of downloading a classification. Land cover and
+        # elevation never change, so we download them in tiles of a fixed grid, that come from the raster
+        # cache after the first download no matter how the area we're looking at moves, and warp them
+        # onto the RGB raster's grid.
+        base_filename, _ = os.path.splitext(classification_geotiff_filename)
+        land_cover_filename = f'{base_filename}_land_cover.tif'
+        dem_filename = f'{base_filename}_dem.tif'
+        downloads = [('rgb', data, rgb_geotiff_filename, {'bands': ['B12', 'B11', 'B9']}, cache_key, bounds,
+                      (width, height))]
+        tile_size = float(config('static_layer_tile_size', 0.25))
+        for name, image, params, image_id in (
+                ('land_cover', get_land_cover(), {'bands': ['Map']}, 'ESA/WorldCover/v100'),
+                ('dem', get_dem(), {'bands': ['elevation']}, 'NASA/NASADEM_HGT/001')):
+            static_tiles[name] = []
+            for index, tile_bounds in enumerate(calculate_grid_tiles(bounds, tile_size)):
+                tile_filename = f'{base_filename}_{name}_{index}.tif'
+                static_tiles[name].append(tile_filename)
+                tile_west, tile_south, tile_east, tile_north = tile_bounds
+                tile_lat = (tile_south + tile_north) / 2
+                tile_lon = (tile_west + tile_east) / 2
+                _, _, tile_width = g.inv(tile_west, tile_lat, tile_east, tile_lat)
+                _, _, tile_height = g.inv(tile_lon, tile_south, tile_lon, tile_north)
+                downloads.append((name, image, tile_filename, params, {'image': image_id}, tile_bounds,
+                                  (int(tile_width / 20), int(tile_height / 20))))
+    else:
+        downloads = [
+            ('classification', fires, classification_geotiff_filename, {'bands': ['x']},
+             dict(cache_key, rule=CLASSIFICATION_RULE), bounds, (width, height)),
+            ('rgb', data, rgb_geotiff_filename, {'bands': ['B12', 'B11', 'B9']}, cache_key, bounds,
+             (width, height))]
+
+    def download_geotiff(name, image, filename, params, image_cache_key, image_bounds, pixels):
+        with metrics.stage(f'write_geotiff_{name}'):
+            write_geotiff(image, image_bounds, filename, params, pixels=pixels, bytes_per_pixel=12,
+                          cache_key=image_cache_key)
+
+    # The downloads don't depend on each other, so we fetch them at the same time.
+    with ThreadPoolExecutor(max_workers=len(downloads)) as executor:
+        futures = [metrics.submit(executor, download_geotiff, *download) for download in downloads]
+        for future in futures:
+            future.result()
+
+    if local_classification:
+        for name, filename in (('land_cover', land_cover_filename), ('dem', dem_filename)):
+            with metrics.stage(f'warp_{name}'):
+                warp_to_grid(static_tiles[name], filename, rgb_geotiff_filename)
+            for tile_filename in static_tiles[name]:
+                os.remove(tile_filename)
+        with metrics.stage('classify'):
+            classify_geotiff(rgb_geotiff_filename, land_cover_filename, dem_filename,
+                             classification_geotiff_filename)
+        for filename in (land_cover_filename, dem_filename):
+            os.remove(filename)
+
+
+def calculate_area(polygons: List[Polygon]):
+    statistics = calculate_statistics(polygons)
+    print(f'Total area: {statistics.area} m^2, {statistics.area/10000} hectares, '
+          f'perimeter: {statistics.perimeter} m, {statistics.polygon_count} polygons')
 
 
 def copy_file_local(source, target):
@@ -270,19 +573,53 @@ def copy_file_local(source, target):
     shutil.copy(source, target)
 
 
-async def upload_to_s3(rgb_geotiff_filename, object_store_path):
-    async with get_client() as (client, bucket):
-        with open(rgb_geotiff_filename, 'rb') as f:
-            print(f'Uploading to S3... {object_store_path}')
-            await client.put_object(Bucket=bucket, Key=object_store_path, Body=f)
+def generate_data(date_of_interest: date, point_of_interest: Point, identifier: str, current_size: float,
+                  incremental: Optional[bool] = None):
+    """
+    Generate polygons for the fire classification, and a geotiff file for the RGB image.
+
+    In incremental mode, returns 'skipped' without doing anything if there's no new imagery since the
+    last perimeter for this fire was generated. incremental defaults to the incremental setting.
+    """
+    fire = Fire(identifier=identifier, point=point_of_interest, current_size=current_size,
+                bounds=calculate_bounding_box(point_of_interest, current_size))
+    fire, = adapt_bounding_boxes([fire], date_of_interest)
+    return generate_cluster(date_of_interest, Cluster(fires=[fire], bounds=fire.bounds), incremental)
 
 
-def generate_data(date_of_interest: date, point_of_interest: Point, identifier: str, current_size: float):
+def generate_cluster(date_of_interest: date, cluster: Cluster, incremental: Optional[bool] = None):
     """
-    Generate a geojson file for the fire classification, and a geotiff file for the RGB image.
+    Generate perimeters for a cluster of fires (see planner.cluster_fires) from a single download of the
+    cluster's region. Each polygon found goes to the fire it belongs to, and all the fires in the cluster
+    share the one RGB image.
+
+    In incremental mode, returns 'skipped' without doing anything if there's no new imagery since the
+    last perimeters for these fires were generated. incremental defaults to the incremental setting.
     """
 
-    authenticate()
+    with metrics.stage('authenticate'):
+        authenticate()
+
+    date_range = int(config('date_range', 14))
+    cloud_cover = float(config('cloud_cover', 22.2))
+    bounds = cluster.bounds
+    # the first fire names the files (and object store key) for the whole cluster.
+    identifier = cluster.fires[0].identifier
+    west, south, east, north = bounds
+    center = Point((west + east) / 2, (south + north) / 2)
+
+    scene_fingerprint = None
+    if incremental is None:
+        incremental = config('incremental', 'false') == 'true'
+    if incremental:
+        with metrics.stage('scene_fingerprint'):
+            scene_fingerprint = calculate_scene_fingerprint(
+                date_of_interest, [fire.point for fire in cluster.fires], bounds, date_range, cloud_cover)
+            with limits.database:
+                previous_fingerprints = [get_scene_fingerprint(fire.identifier) for fire in cluster.fires]
+        if all(previous == scene_fingerprint for previous in previous_fingerprints):
+            print(f'{cluster.identifier}: no new imagery since the last perimeter, skipping')
+            return 'skipped'
 
     with tempfile.TemporaryDirectory() as temporary_path:
         # We use a temporary file to generate raster files and polygons. When we're done, we're throwing away
@@ -290,115 +627,182 @@ def generate_data(date_of_interest: date, point_of_interest: Point, identifier:
 
         classification_geotiff_filename = os.path.join(
             temporary_path, f'{identifier}_{date_of_interest.isoformat()}_binary_classification.tif')
-        geojson_filename = os.path.join(
-            temporary_path, f'{identifier}_{date_of_interest.isoformat()}_binary_classification.json')
         rgb_geotiff_filename = os.path.join(
             temporary_path, f'{identifier}_{date_of_interest.isoformat()}_rgb.tif')
 
-        date_range = int(config('date_range', 14))
-        cloud_cover = float(config('cloud_cover', 22.2))
-        generate_raster(
-            date_of_interest=date_of_interest,
-            point_of_interest=point_of_interest,
-            classification_geotiff_filename=classification_geotiff_filename,
-            rgb_geotiff_filename=rgb_geotiff_filename,
-            current_size=current_size,
-            date_range=date_range,
-            cloud_cover=cloud_cover)
-
-        polygonize(classification_geotiff_filename, geojson_filename)
+        save_local = config('save_local', 'false') == 'true'
+        if save_local and not os.path.exists('output'):
+            os.mkdir('output')
 
-        calculate_area(geojson_filename)
+        # only bother writing the polygons to disk if we're keeping them around.
+        geojson_filename = os.path.join(
+            os.getcwd(), 'output',
+            f'{identifier}_{date_of_interest.isoformat()}_binary_classification.json') if save_local else None
+
+        # if the perimeter runs off the edge of the raster, there's more fire out there: expand the edges it
+        # touches, and try again.
+        retries = int(config('adaptive_bounding_box_retries', 2)) \
+            if config('adaptive_bounding_box', 'true') == 'true' else 0
+        growth = float(config('adaptive_bounding_box_growth', 2000))
+        fires = cluster.fires
+        for attempt in range(retries + 1):
+            generate_raster(
+                date_of_interest=date_of_interest,
+                point_of_interest=center,
+                classification_geotiff_filename=classification_geotiff_filename,
+                rgb_geotiff_filename=rgb_geotiff_filename,
+                current_size=sum(fire.current_size for fire in cluster.fires),
+                date_range=date_range,
+                cloud_cover=cloud_cover,
+                bounds=bounds)
+
+            with metrics.stage('polygonize'):
+                polygons = polygonize(classification_geotiff_filename, geojson_filename)
+                metrics.add(polygons=len(polygons), vertices=count_vertices(polygons))
+
+            if len(cluster.fires) > 1:
+                with metrics.stage('assign_polygons'):
+                    fire_polygons = assign_polygons(polygons, fires)
+            else:
+                fire_polygons = {identifier: polygons}
+
+            if attempt == retries:
+                break
+            # only the fires' own perimeters count, not every false positive in the raster.
+            own_polygons = [polygon for fire in fires
+                            for polygon in nearest_polygons(fire_polygons[fire.identifier], fire.point)]
+            edges = touching_edges(own_polygons, *get_raster_bounds(classification_geotiff_filename))
+            if not edges:
+                break
+            # grow faster each time, so a fire that's far outgrown its last perimeter doesn't take many tries.
+            bounds = expand_bounding_box(bounds, growth * 2 ** attempt, edges)
+            # so polygons in the area we've added can still be handed to a fire.
+            fires = [fire._replace(bounds=expand_bounding_box(fire.bounds, growth * 2 ** attempt, edges))
+                     for fire in fires]
+            print(f'{cluster.identifier}: perimeter touches the {", ".join(edges)} edge, retrying with {bounds}')
+            for filename in [classification_geotiff_filename, rgb_geotiff_filename]:
+                if os.path.exists(filename):
+                    os.remove(filename)
+
+        with metrics.stage('calculate_area'):
+            for fire in cluster.fires:
+                if len(cluster.fires) > 1:
+                    print(f'{fire.identifier}:')
+                calculate_area(fire_polygons[fire.identifier])
+
+        if save_local:
+            copy_file_local(rgb_geotiff_filename,
+                            os.path.join(os.getcwd(),
+                                         'output', f'{identifier}_{date_of_interest.isoformat()}_rgb.tif'))
+            copy_file_local(classification_geotiff_filename,
+                            os.path.join(os.getcwd(),
+                                         'output', f'{identifier}_{date_of_interest.isoformat()}_binary_classification.tif'))
 
+        object_store_filename = f'{identifier}/{identifier}_{date_of_interest.isoformat()}_rgb.tif'
         try:
-            object_store_filename = f'{identifier}/{identifier}_{date_of_interest.isoformat()}_rgb.tif'
-            object_store_path = f'fire_perimeter/{object_store_filename}'
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(upload_to_s3(
-                rgb_geotiff_filename, object_store_path))
-            # loop.close() we can't close the event loop! we only have one for this thread.
-
+            with metrics.stage('upload_rgb'):
+                # cloud optimized, so viewers only have to fetch the tiles they're looking at.
+                rgb_cog_filename = os.path.join(
+                    temporary_path, f'{identifier}_{date_of_interest.isoformat()}_rgb_cog.tif')
+                translate_to_cog(rgb_geotiff_filename, rgb_cog_filename)
+                # the upload happens in the background, main waits for it to finish before exiting.
+                get_uploader().submit(rgb_cog_filename, f'fire_perimeter/{object_store_filename}')
         except Exception as e:
             print(f'Could not store RGB image: {e}')
 
+        if config('upload_classification', 'false') == 'true':
+            try:
+                with metrics.stage('upload_classification'):
+                    classification_cog_filename = os.path.join(
+                        temporary_path,
+                        f'{identifier}_{date_of_interest.isoformat()}_binary_classification_cog.tif')
+                    translate_to_cog(classification_geotiff_filename, classification_cog_filename,
+                                     resampling='NEAREST')
+                    get_uploader().submit(
+                        classification_cog_filename,
+                        f'fire_perimeter/{identifier}/{identifier}_{date_of_interest.isoformat()}_binary_classification.tif')
+            except Exception as e:
+                print(f'Could not store classification image: {e}')
+
         try:
-            persist_polygon(geojson_filename, identifier,
-                            date_of_interest, point_of_interest,
-                            date_range, cloud_cover, object_store_filename)
+            with metrics.stage('persist_polygon'):
+                perimeters = [prepare_perimeter(fire_polygons[fire.identifier], fire.identifier,
+                                                date_of_interest, fire.point,
+                                                date_range, cloud_cover, object_store_filename,
+                                                scene_fingerprint=scene_fingerprint)
+                              for fire in cluster.fires]
+                perimeters = [perimeter for perimeter in perimeters if perimeter is not None]
+                print(f'persist {", ".join(perimeter.identifier for perimeter in perimeters)} to postgresql')
+                # every perimeter in the cluster goes in the one statement and transaction.
+                with limits.database:
+                    persist_polygons(perimeters)
         except Exception as e:
-            print(f'Could not persist polygon: {e}')
-
-        if config('save_local', 'false') == 'true':
-            if not os.path.exists('output'):
-                os.mkdir('output')
-            copy_file_local(rgb_geotiff_filename,
-                            os.path.join(os.getcwd(),
-                                         'output', f'{identifier}_{date_of_interest.isoformat()}_rgb.tif'))
-            copy_file_local(classification_geotiff_filename,
-                            os.path.join(os.getcwd(),
-                                         'output', f'{identifier}_{date_of_interest.isoformat()}_binary_classification.tif'))
+            print(f'Could not persist polygons: {e}')
 
         # cleanup (do I need this? or will using temp directory be enough?)
-        for filename in [classification_geotiff_filename, geojson_filename, rgb_geotiff_filename]:
+        for filename in [classification_geotiff_filename, rgb_geotiff_filename]:
             if os.path.exists(filename):
                 os.remove(filename)
 
 
 def get_active_fires():
-    url = 'https://openmaps.gov.bc.ca/geo/pub/ows'
-    params = {
-        'service': 'WFS',
-        'version': '2.0.0',
-        'request': 'GetFeature',
-        'typeName': 'pub:WHSE_LAND_AND_NATURAL_RESOURCE.PROT_CURRENT_FIRE_PNTS_SP',
-        'outputFormat': 'json',
-        'srsName': 'EPSG:4326'
-    }
-
-    print(f'fetching active fires from {url}')
-    response = requests.get(url, params=params, timeout=60)
-    current_size_threshold = int(config('current_size_threshold', 90))
-
-    if response.status_code == 200:
-        js = response.json()
-
-        for feature in js['features']:
-            try:
-                properties = feature.get('properties', {})
-                fire_status = properties.get('FIRE_STATUS')
-                if fire_status != 'Out':
-                    current_size = int(properties.get('CURRENT_SIZE'))
-                    if current_size >= current_size_threshold:
-                        yield feature
-                    else:
-                        print(
-                            f'Skipping {fire_status} fire {properties.get("FIRE_NUMBER")} with size {current_size}')
-                else:
-                    pass
-                    # print(
-                    #     f'Skipping fire {properties.get("FIRE_NUMBER")} because it is out')
-            except:
-                print('trouble with feature')
-    else:
-        print(response.status_code)
-        print(response.text)
+    """ Yield fires that aren't out, and are at least current_size_threshold hectares. """
+    return fire_feed.get_active_fires()
 
 
-def main():
-    for feature in get_active_fires():
-        properties = feature.get('properties', {})
-        fire_status = properties.get('FIRE_STATUS')
-        current_size = float(properties.get('CURRENT_SIZE'))
-        ignition_date = properties.get('IGNITION_DATE')
-        fire_number = properties.get('FIRE_NUMBER')
+def to_fire(feature) -> Fire:
+    properties = feature.get('properties', {})
+    fire_status = properties.get('FIRE_STATUS')
+    current_size = float(properties.get('CURRENT_SIZE'))
+    ignition_date = properties.get('IGNITION_DATE')
+    fire_number = properties.get('FIRE_NUMBER')
+
+    print(
+        f'{fire_number} {fire_status} current size: {current_size}, ignition date: {ignition_date}')
+
+    point = shape(feature['geometry'])
+    return Fire(identifier=fire_number, point=point, current_size=current_size,
+                bounds=calculate_bounding_box(point, current_size))
 
-        print(
-            f'{fire_number} {fire_status} current size: {current_size}, ignition date: {ignition_date}')
 
-        point = shape(feature['geometry'])
+def process_fire(feature):
+    fire = to_fire(feature)
+    # run up to today
+    with metrics.fire(fire.identifier):
+        return generate_data(date.today(), fire.point, fire.identifier, fire.current_size)
 
-        # run up to today
-        generate_data(date.today(), point, fire_number, current_size)
+
+def process_cluster(cluster: Cluster):
+    # run up to today
+    with metrics.fire(cluster.identifier):
+        return generate_cluster(date.today(), cluster)
+
+
+def main():
+    try:
+        create_table()
+    except Exception as e:
+        print(f'Could not create table: {e}')
+
+    if config('merge_overlapping_fires', 'true') == 'true':
+        fires = adapt_bounding_boxes([to_fire(feature) for feature in get_active_fires()], date.today())
+        # a region too big for a single download would have its resolution reduced, unless it's tiled.
+        max_pixels = None if config('tiled_download', 'false') == 'true' else MAX_DOWNLOAD_BYTES / 12
+        clusters = cluster_fires(fires, max_pixels)
+        print(f'{sum(len(cluster.fires) for cluster in clusters)} fires in {len(clusters)} regions')
+        jobs = [(cluster.identifier, partial(process_cluster, cluster),
+                 [fire.identifier for fire in cluster.fires]) for cluster in clusters]
+    else:
+        jobs = [(feature.get('properties', {}).get('FIRE_NUMBER'), partial(process_fire, feature))
+                for feature in get_active_fires()]
+    results = scheduler.run(jobs, workers=int(config('workers', 4)))
+    scheduler.print_summary(results)
+    store.print_summary(get_uploader().wait())
+    cache = get_cache()
+    if cache:
+        cache.print_stats()
+    metrics.print_summary(metrics.get_stages())
+    metrics.write_reports()
 
     # for a particular date:
     # date_of_interest = date(2021, 8, 23)
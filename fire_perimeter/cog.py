@@ -0,0 +1,49 @@
+"""
+Convert GeoTIFFs to Cloud Optimized GeoTIFFs (COG).
+
+A COG is internally tiled, compressed and has overviews, with everything laid out so that a client can
+use HTTP range requests to fetch only the tiles (and zoom level) it needs, instead of the whole file.
+https://www.cogeo.org/
+"""
+import os
+import tempfile
+from osgeo import gdal
+
+
+def translate_to_cog(source: str, target: str, resampling: str = 'AVERAGE', compress: str = 'DEFLATE',
+                     blocksize: int = 512):
+    """
+    resampling: used to generate overviews, use NEAREST for categorical data (e.g. classifications).
+    """
+    if gdal.GetDriverByName('COG'):
+        gdal.Translate(target, source, format='COG',
+                       creationOptions=[f'COMPRESS={compress}',
+                                        'PREDICTOR=YES',
+                                        f'BLOCKSIZE={blocksize}',
+                                        f'OVERVIEW_RESAMPLING={resampling}',
+                                        'BIGTIFF=IF_SAFER'])
+        return
+
+    # The COG driver only arrived in GDAL 3.1, before that, we have to build the overviews ourselves, and
+    # then copy them into a tiled GeoTIFF.
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(target) or None) as temporary_path:
+        tiled_filename = os.path.join(temporary_path, 'tiled.tif')
+        tiled = gdal.Translate(tiled_filename, source, format='GTiff',
+                               creationOptions=['TILED=YES',
+                                                f'BLOCKXSIZE={blocksize}',
+                                                f'BLOCKYSIZE={blocksize}'])
+        levels = []
+        factor = 2
+        while max(tiled.RasterXSize, tiled.RasterYSize) / factor >= blocksize:
+            levels.append(factor)
+            factor *= 2
+        if levels:
+            tiled.BuildOverviews(resampling, levels)
+        gdal.Translate(target, tiled, format='GTiff',
+                       creationOptions=['TILED=YES',
+                                        f'BLOCKXSIZE={blocksize}',
+                                        f'BLOCKYSIZE={blocksize}',
+                                        'COPY_SRC_OVERVIEWS=YES',
+                                        f'COMPRESS={compress}',
+                                        'BIGTIFF=IF_SAFER'])
+        del tiled
@@ -0,0 +1,53 @@
+"""
+Download files over HTTP, using a single pooled session shared by every thread in the process.
+"""
+import threading
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from decouple import config
+from fire_perimeter import metrics
+
+# write to disk one chunk at a time, so we never hold a whole response in memory.
+CHUNK_SIZE = 1024 * 1024
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """ Return the shared session, creating it the first time we're called.
+    Transient failures (connection errors, 429 and 5xx responses) are retried with exponential backoff.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(total=int(config('download_retries', 3)),
+                          backoff_factor=float(config('download_backoff', 1.0)),
+                          status_forcelist=(429, 500, 502, 503, 504))
+            pool_size = int(config('download_pool_size', 10))
+            adapter = HTTPAdapter(pool_connections=pool_size,
+                                  pool_maxsize=pool_size,
+                                  max_retries=retry)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+    return _session
+
+
+def download(url: str, filename: str, timeout: int = 60) -> Optional[int]:
+    """ Stream url to filename, returning the number of bytes written, or None if the download failed.
+    """
+    with get_session().get(url, stream=True, timeout=timeout) as response:
+        if response.status_code != 200:
+            print(f'failed to download {filename}: {response.status_code}')
+            return None
+        bytes_written = 0
+        with open(filename, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+                bytes_written += len(chunk)
+    metrics.add(downloaded_bytes=bytes_written)
+    return bytes_written
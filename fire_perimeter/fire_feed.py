@@ -0,0 +1,218 @@
+"""
+Fire points from the BC Wildfire Service WFS feed.
+
+- Filtering (on status, size, fire number etc.) is done by the server, with a CQL filter, so we only
+  download the fires we're interested in.
+- Responses are cached on disk, and re-requested with If-None-Match/If-Modified-Since, so if the feed
+  hasn't changed since last time, we don't download it again.
+- Features are parsed one at a time, straight from the (cached) response, so we never hold the whole
+  feed in memory.
+"""
+import codecs
+import hashlib
+import json
+import os
+import re
+import tempfile
+from typing import IO, Iterable, Iterator, List, Optional, Sequence
+import requests
+from decouple import config
+from fire_perimeter.download import CHUNK_SIZE, get_session
+
+FEED_URL = 'https://openmaps.gov.bc.ca/geo/pub/ows'
+LAYER = 'pub:WHSE_LAND_AND_NATURAL_RESOURCE.PROT_CURRENT_FIRE_PNTS_SP'
+# fires from previous seasons, the current fire points only cover this one.
+HISTORICAL_LAYER = 'pub:WHSE_LAND_AND_NATURAL_RESOURCE.PROT_HISTORICAL_INCIDENTS_SP'
+
+_FEATURES = re.compile(r'"features"\s*:\s*\[')
+_SEPARATOR = re.compile(r'[\s,]*')
+
+
+def quote(value: str) -> str:
+    """ Quote a string literal for use in a CQL filter. """
+    return "'{}'".format(value.replace("'", "''"))
+
+
+def active_fires_filter(min_size: float) -> str:
+    """ CQL filter for fires that aren't out, and are at least min_size hectares. """
+    return f"FIRE_STATUS <> 'Out' AND CURRENT_SIZE >= {min_size}"
+
+
+def fire_numbers_filter(fire_numbers: Sequence[str]) -> str:
+    return 'FIRE_NUMBER IN ({})'.format(','.join(quote(fire_number) for fire_number in fire_numbers))
+
+
+def fire_years_filter(years: Iterable[int]) -> str:
+    """ CQL filter for fires from any of years - fire numbers are re-used from one year to the next. """
+    return 'FIRE_YEAR IN ({})'.format(','.join(str(int(year)) for year in years))
+
+
+def iter_features(stream: IO[bytes], chunk_size: int = CHUNK_SIZE) -> Iterator[dict]:
+    """ Yield the features of a GeoJSON FeatureCollection, one at a time, reading stream in chunks. """
+    decoder = json.JSONDecoder()
+    # chunks can end part way through a multi-byte character.
+    text = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    position = None
+    eof = False
+    while True:
+        if position is None:
+            match = _FEATURES.search(buffer)
+            if match:
+                position = match.end()
+        else:
+            position = _SEPARATOR.match(buffer, position).end()
+            if position < len(buffer):
+                if buffer[position] == ']':
+                    return
+                try:
+                    feature, position = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    # most likely we only have part of the feature, read some more.
+                    if eof:
+                        raise
+                else:
+                    yield feature
+                    continue
+        if eof:
+            if position is None:
+                raise ValueError('no features in response')
+            raise ValueError('unexpected end of response')
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+        # drop what we've already parsed, so the buffer only ever holds about one feature.
+        if position is not None:
+            buffer = buffer[position:]
+            position = 0
+        buffer += text.decode(chunk, final=eof)
+
+
+class FireFeed:
+    """
+    Fetch features from a WFS, through an on disk cache of responses.
+    Without a cache_path, every request downloads the feed.
+    """
+
+    def __init__(self, url: str = FEED_URL, layer: str = LAYER, cache_path: Optional[str] = None,
+                 timeout: int = 60):
+        self.url = url
+        self.layer = layer
+        self.cache_path = cache_path
+        self.timeout = timeout
+        self.downloads = 0
+        self.not_modified = 0
+        if cache_path:
+            os.makedirs(cache_path, exist_ok=True)
+
+    def _params(self, cql_filter: Optional[str], bbox: Optional[Sequence[float]]) -> dict:
+        params = {
+            'service': 'WFS',
+            'version': '2.0.0',
+            'request': 'GetFeature',
+            'typeName': self.layer,
+            'outputFormat': 'json',
+            'srsName': 'EPSG:4326'
+        }
+        if cql_filter and bbox:
+            raise ValueError('the WFS doesn\'t allow combining a CQL filter with a bbox')
+        if bbox:
+            # WFS 2.0 with EPSG:4326 is latitude, longitude
+            west, south, east, north = bbox
+            params['bbox'] = f'{south},{west},{north},{east},urn:ogc:def:crs:EPSG::4326'
+        if cql_filter:
+            params['CQL_FILTER'] = cql_filter
+        return params
+
+    def _cached(self, params: dict) -> str:
+        serialized = json.dumps({'url': self.url, **params}, sort_keys=True)
+        return os.path.join(self.cache_path, hashlib.sha256(serialized.encode('utf-8')).hexdigest())
+
+    def fetch(self, cql_filter: Optional[str] = None, bbox: Optional[Sequence[float]] = None) -> str:
+        """
+        Make sure we have an up to date copy of the response on disk, returning its filename.
+        If we have a copy with an ETag or Last-Modified date, we only download the feed if it has changed.
+        """
+        params = self._params(cql_filter, bbox)
+        if self.cache_path:
+            filename = self._cached(params)
+        else:
+            handle, filename = tempfile.mkstemp(suffix='.json')
+            os.close(handle)
+
+        headers = {}
+        validators = {}
+        if self.cache_path and os.path.exists(filename) and os.path.exists(f'{filename}.meta'):
+            with open(f'{filename}.meta') as f:
+                validators = json.load(f)
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+
+        print(f'fetching fires from {self.url}')
+        with get_session().get(self.url, params=params, headers=headers, stream=True,
+                               timeout=self.timeout) as response:
+            if response.status_code == 304:
+                self.not_modified += 1
+                print('fire feed not modified, using cached copy')
+                return filename
+            if response.status_code != 200:
+                if not self.cache_path:
+                    os.remove(filename)
+                response.raise_for_status()
+                raise requests.HTTPError(f'unexpected response: {response.status_code}', response=response)
+            self.downloads += 1
+            # write to a temporary file and rename, so the cache never holds a partial response.
+            handle, temporary = tempfile.mkstemp(dir=os.path.dirname(filename), suffix='.partial')
+            with os.fdopen(handle, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+            os.replace(temporary, filename)
+            if self.cache_path:
+                with open(f'{filename}.meta', 'w') as f:
+                    json.dump({'etag': response.headers.get('ETag'),
+                               'last_modified': response.headers.get('Last-Modified')}, f)
+        return filename
+
+    def features(self, cql_filter: Optional[str] = None,
+                 bbox: Optional[Sequence[float]] = None) -> Iterator[dict]:
+        """ Yield features matching cql_filter, or within a (west, south, east, north) bbox. """
+        filename = self.fetch(cql_filter, bbox)
+        try:
+            with open(filename, 'rb') as f:
+                yield from iter_features(f)
+        finally:
+            if not self.cache_path:
+                os.remove(filename)
+
+
+def get_feed(historical: bool = False) -> FireFeed:
+    """ The current fire points, or with historical, the fire incidents of previous years. """
+    layer = config('fire_history_layer', HISTORICAL_LAYER) if historical else config('fire_points_layer', LAYER)
+    return FireFeed(url=config('fire_feed_url', FEED_URL),
+                    layer=layer,
+                    cache_path=config('fire_feed_cache_path', os.path.join(tempfile.gettempdir(), 'fire_feed')))
+
+
+def find_fires(feed: FireFeed, fire_numbers: Sequence[str], cql_filter: Optional[str] = None) -> List[dict]:
+    """
+    Fetch the fires with fire_numbers (further filtered by cql_filter, if given), raising ValueError if
+    any of them can't be found.
+    """
+    query = fire_numbers_filter(fire_numbers)
+    if cql_filter:
+        query = f'{query} AND {cql_filter}'
+    features = list(feed.features(query))
+    found = {feature['properties'].get('FIRE_NUMBER') for feature in features}
+    missing = [fire_number for fire_number in fire_numbers if fire_number not in found]
+    if missing:
+        raise ValueError(f'{", ".join(missing)} not found in {feed.layer}')
+    return features
+
+
+def get_active_fires(min_size: Optional[float] = None) -> Iterator[dict]:
+    """ Yield fires that aren't out, and are at least min_size (default current_size_threshold) hectares. """
+    if min_size is None:
+        min_size = float(config('current_size_threshold', 90))
+    return get_feed().features(active_fires_filter(min_size))
@@ -0,0 +1,17 @@
+"""
+Concurrency limits for the external services we talk to while generating fire perimeters.
+
+The limits are shared by every worker in the process, so no matter how many fires we're processing at
+once, we never have more than this many calls in flight to earth engine or the database.
+(Uploads to the object store are limited by store.Uploader.)
+"""
+import threading
+from decouple import config
+
+earth_engine = threading.BoundedSemaphore(int(config('earth_engine_concurrency', 4)))
+database = threading.BoundedSemaphore(int(config('database_concurrency', 2)))
+
+# The earth engine client library shares a single http connection between threads, which isn't thread
+# safe - so only one thread at a time may make earth engine api calls (e.g. getDownloadUrl). Downloading
+# the resultant urls is done on our own session, and isn't affected by this.
+earth_engine_api = threading.Lock()
@@ -0,0 +1,218 @@
+"""
+Where does the time (and memory) go? Lightweight, per fire instrumentation of each stage of
+client.generate_data.
+
+    with metrics.fire(identifier):
+        with metrics.stage('polygonize'):
+            ...
+            metrics.add(polygons=len(polygons))
+
+Each stage records its wall time, how much the resident memory of the process grew while it ran (and
+how much memory the process had when it finished), and any values added while it runs (bytes downloaded
+and uploaded, raster dimensions, polygon and vertex counts).
+The current fire and stage are context variables, so values are attributed to the right fire when many
+fires are processed at once - use metrics.submit to carry them over to worker threads.
+
+At the end of a run, everything recorded can be written out in the Prometheus text format (e.g. for the
+node exporter's textfile collector, or a push gateway), and/or as a JSON report.
+"""
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Dict, Iterator, List
+from decouple import config
+
+# Descriptions of the values we record, used as prometheus help text.
+VALUES = {
+    'downloaded_bytes': 'Bytes downloaded',
+    'uploaded_bytes': 'Bytes queued for upload to the object store',
+    'raster_width_pixels': 'Width of the classification raster',
+    'raster_height_pixels': 'Height of the classification raster',
+    'polygons': 'Number of polygons',
+    'vertices': 'Number of vertices',
+}
+
+
+@dataclass
+class Stage:
+    """ Measurements of a single stage, of a single fire. """
+    fire: str
+    name: str
+    seconds: float = 0.0
+    # resident memory of the process at the end of the stage, and how much it grew during the stage - other
+    # fires being processed at the same time contribute to the growth too.
+    memory_bytes: int = 0
+    memory_growth_bytes: int = 0
+    values: Dict[str, float] = field(default_factory=dict)
+
+
+_fire = ContextVar('fire', default='')
+_stage = ContextVar('stage', default=None)
+_lock = threading.Lock()
+_stages: List[Stage] = []
+_started = time.time()
+
+
+def peak_memory() -> int:
+    """ Peak resident set size of the process so far, in bytes. """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macos bytes.
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def current_memory() -> int:
+    """ Resident set size of the process right now, in bytes. """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # no /proc (e.g. macos), the best we can do is the peak so far.
+        return peak_memory()
+
+
+@contextmanager
+def fire(identifier: str) -> Iterator[None]:
+    """ Attribute the stages that run inside this block to fire identifier. """
+    token = _fire.set(identifier)
+    try:
+        yield
+    finally:
+        _fire.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[Stage]:
+    """ Measure a stage. Stages that fail are recorded too. """
+    record = Stage(fire=_fire.get(), name=name)
+    token = _stage.set(record)
+    start_memory = current_memory()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.seconds = time.perf_counter() - start
+        record.memory_bytes = current_memory()
+        record.memory_growth_bytes = record.memory_bytes - start_memory
+        _stage.reset(token)
+        with _lock:
+            _stages.append(record)
+
+
+def add(**values: float):
+    """ Add values (e.g. downloaded_bytes=1024) to the current stage, if there is one. """
+    record = _stage.get()
+    if record is None:
+        return
+    with _lock:
+        for name, value in values.items():
+            record.values[name] = record.values.get(name, 0) + value
+
+
+def submit(executor: Executor, fn, *args, **kwargs) -> Future:
+    """ executor.submit, running fn in (a copy of) our context, so it records to the current stage. """
+    return executor.submit(copy_context().run, fn, *args, **kwargs)
+
+
+def get_stages() -> List[Stage]:
+    with _lock:
+        return list(_stages)
+
+
+def _totals(stages: List[Stage]) -> Dict[tuple, Stage]:
+    """ Combine stages by (fire, name) - a stage may run more than once for a fire. """
+    totals: Dict[tuple, Stage] = {}
+    for record in stages:
+        total = totals.setdefault((record.fire, record.name), Stage(fire=record.fire, name=record.name))
+        total.seconds += record.seconds
+        total.memory_bytes = max(total.memory_bytes, record.memory_bytes)
+        total.memory_growth_bytes += record.memory_growth_bytes
+        for name, value in record.values.items():
+            total.values[name] = total.values.get(name, 0) + value
+    return totals
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def to_prometheus(stages: List[Stage]) -> str:
+    """ Render stages in the prometheus text exposition format. """
+    totals = _totals(stages).values()
+    metrics = [('seconds', 'Wall time spent in the stage', lambda total: total.seconds),
+               ('memory_bytes', 'Resident memory of the process at the end of the stage',
+                lambda total: total.memory_bytes),
+               ('memory_growth_bytes', 'Growth of the resident memory of the process during the stage',
+                lambda total: total.memory_growth_bytes)]
+    metrics += [(name, description, lambda total, name=name: total.values.get(name))
+                for name, description in VALUES.items()]
+
+    lines = []
+    for name, description, value_of in metrics:
+        metric = f'fire_perimeter_stage_{name}'
+        samples = [(total, value_of(total)) for total in totals]
+        samples = [(total, value) for total, value in samples if value is not None]
+        if not samples:
+            continue
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} gauge')
+        for total, value in samples:
+            lines.append(f'{metric}{{fire="{_escape(total.fire)}",stage="{_escape(total.name)}"}} {value}')
+    lines.append('# HELP fire_perimeter_run_seconds Wall time of the whole run')
+    lines.append('# TYPE fire_perimeter_run_seconds gauge')
+    lines.append(f'fire_perimeter_run_seconds {time.time() - _started}')
+    lines.append('# HELP fire_perimeter_peak_memory_bytes Peak resident memory of the process')
+    lines.append('# TYPE fire_perimeter_peak_memory_bytes gauge')
+    lines.append(f'fire_perimeter_peak_memory_bytes {peak_memory()}')
+    return '\n'.join(lines) + '\n'
+
+
+def to_report(stages: List[Stage]) -> dict:
+    """ A JSON serializable report of the run: every stage, and totals per stage over all fires. """
+    by_stage: Dict[str, dict] = {}
+    for record in stages:
+        total = by_stage.setdefault(record.name, {'count': 0, 'seconds': 0.0, 'max_memory_growth_bytes': 0})
+        total['count'] += 1
+        total['seconds'] += record.seconds
+        total['max_memory_growth_bytes'] = max(total['max_memory_growth_bytes'], record.memory_growth_bytes)
+        for name, value in record.values.items():
+            total[name] = total.get(name, 0) + value
+    return {'started': datetime.fromtimestamp(_started).isoformat(),
+            'seconds': time.time() - _started,
+            'peak_memory_bytes': peak_memory(),
+            'totals': by_stage,
+            'stages': [asdict(record) for record in stages]}
+
+
+def print_summary(stages: List[Stage]):
+    """ Print the total and mean time spent in each stage, and the most memory a single run of the stage
+    added, over all fires. """
+    report = to_report(stages)
+    print(f'{"stage":<24} {"count":>6} {"total (s)":>10} {"mean (s)":>9} {"max growth (MB)":>16}')
+    for name, total in sorted(report['totals'].items(), key=lambda item: -item[1]['seconds']):
+        print(f'{name:<24} {total["count"]:>6} {total["seconds"]:>10.1f} '
+              f'{total["seconds"] / total["count"]:>9.2f} {total["max_memory_growth_bytes"] / 1024 / 1024:>16.1f}')
+
+
+def write_reports():
+    """ Write the metrics recorded so far to metrics_prometheus_path and/or metrics_report_path. """
+    stages = get_stages()
+    prometheus_path = config('metrics_prometheus_path', '')
+    if prometheus_path:
+        # collectors may read the file at any time, so make sure they never see half of it.
+        with open(f'{prometheus_path}.partial', 'w') as f:
+            f.write(to_prometheus(stages))
+        os.replace(f'{prometheus_path}.partial', prometheus_path)
+        print(f'metrics written to {prometheus_path}')
+    report_path = config('metrics_report_path', '')
+    if report_path:
+        with open(report_path, 'w') as f:
+            json.dump(to_report(stages), f, indent=2)
+        print(f'run report written to {report_path}')
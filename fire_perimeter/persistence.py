@@ -1,21 +1,33 @@
-import json
+import argparse
+import threading
 from datetime import datetime, date
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
 from urllib.parse import quote_plus as urlquote
-from shapely.geometry import shape, MultiPolygon, Point
+from shapely.geometry import MultiPolygon, Point, Polygon
 from shapely import wkb
-from sqlalchemy import UniqueConstraint, create_engine, MetaData, Table, Column, Integer, DATE, TIMESTAMP, String, Float
+from sqlalchemy import (Index, UniqueConstraint, bindparam, create_engine, func, inspect, select, text, MetaData,
+                        Table, Column, Integer, DATE, TIMESTAMP, String, Float)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Engine
 from geoalchemy2.types import Geometry
 from decouple import config
+from fire_perimeter.simplify import LEVELS_OF_DETAIL, describe, remove_slivers, simplify_perimeter
+from fire_perimeter.stats import calculate_statistics
 
+SRID = 4326
 
-def create_table_schema(meta_data: MetaData, table_name: str, srid: int) -> Table:
+
+def create_table_schema(meta_data: MetaData, table_name: str, srid: int, partitioned: bool = False) -> Table:
     """
     Create a table schema.
     geom_type: geometry type (e.g. POLYGON or MULTIPOLYGON)
     srid: spatial reference id (e.g. 4326)
+    partitioned: range partition the table on date_of_interest, one partition per fire season (see
+        ensure_partitions). Unique constraints on a partitioned table have to include the partition key, so
+        date_of_interest becomes part of the primary key.
     """
     return Table(table_name, meta_data,
-                 Column('id', Integer(), primary_key=True, nullable=False),
+                 Column('id', Integer(), primary_key=True, autoincrement=True, nullable=False),
                  Column('geom', Geometry(geometry_type='MULTIPOLYGON', srid=srid, spatial_index=True,
                         from_text='ST_GeomFromEWKT', name='geometry'), nullable=False),
                  Column('date_range', Integer(), nullable=False,
@@ -27,100 +39,518 @@ def create_table_schema(meta_data: MetaData, table_name: str, srid: int) -> Tabl
                         comment='Latitude of the fire'),
                  Column('longitude', Float(), nullable=False,
                         comment='Longitude of the fire'),
-                 Column('date_of_interest', DATE(), nullable=False),
+                 Column('date_of_interest', DATE(), primary_key=partitioned, nullable=False),
                  Column('rgb_raster', String(), nullable=False),
                  Column('create_date', TIMESTAMP(
                      timezone=True), nullable=False),
                  Column('update_date', TIMESTAMP(
                      timezone=True), nullable=False),
+                 Column('scene_fingerprint', String(), nullable=True,
+                        comment='Fingerprint of the imagery used to generate the fire perimeter'),
+                 Column('area', Float(), nullable=True,
+                        comment='Geodesic area of the fire perimeter, in square meters'),
+                 Column('perimeter', Float(), nullable=True,
+                        comment='Geodesic length of the fire perimeter, in meters'),
+                 Column('polygon_count', Integer(), nullable=True,
+                        comment='Number of polygons making up the fire perimeter'),
+                 *(Column(name, Geometry(geometry_type='MULTIPOLYGON', srid=srid, spatial_index=False,
+                                         from_text='ST_GeomFromEWKT', name='geometry'), nullable=True,
+                          comment=f'Fire perimeter simplified to {tolerance}m, for zoomed out maps')
+                   for name, tolerance in LEVELS_OF_DETAIL),
                  UniqueConstraint('fire_number', 'date_of_interest',
                                   name='uix_fire_number_date_of_interest'),
+                 # Exact fire_number matches are served by the unique constraint's index (fire_number comes
+                 # first), LIKE 'K2%' style prefix matches need an index with pattern ops.
+                 Index(f'ix_{table_name}_fire_number_pattern', 'fire_number',
+                       postgresql_ops={'fire_number': 'varchar_pattern_ops'}),
+                 Index(f'ix_{table_name}_date_of_interest', 'date_of_interest'),
+                 schema=None,
+                 **({'postgresql_partition_by': 'RANGE (date_of_interest)'} if partitioned else {}))
+
+
+def create_latest_table_schema(meta_data: MetaData, table_name: str, srid: int) -> Table:
+    """
+    Create the schema of the latest perimeter table: a copy of the most recent perimeter of each fire,
+    kept up to date as perimeters are persisted, so maps showing the current state of every fire don't
+    have to pick the latest perimeter out of every perimeter ever generated.
+    """
+    return Table(table_name, meta_data,
+                 Column('fire_number', String(), primary_key=True, nullable=False),
+                 Column('perimeter_id', Integer(), nullable=False,
+                        comment='id of the perimeter this is a copy of'),
+                 Column('geom', Geometry(geometry_type='MULTIPOLYGON', srid=srid, spatial_index=True,
+                        from_text='ST_GeomFromEWKT', name='geometry'), nullable=False),
+                 Column('date_range', Integer(), nullable=False),
+                 Column('cloud_cover', Float(), nullable=False),
+                 Column('latitude', Float(), nullable=False),
+                 Column('longitude', Float(), nullable=False),
+                 Column('date_of_interest', DATE(), nullable=False),
+                 Column('rgb_raster', String(), nullable=False),
+                 Column('create_date', TIMESTAMP(timezone=True), nullable=False),
+                 Column('update_date', TIMESTAMP(timezone=True), nullable=False),
+                 Column('area', Float(), nullable=True),
+                 Column('perimeter', Float(), nullable=True),
+                 Column('polygon_count', Integer(), nullable=True),
+                 *(Column(name, Geometry(geometry_type='MULTIPOLYGON', srid=srid, spatial_index=False,
+                                         from_text='ST_GeomFromEWKT', name='geometry'), nullable=True)
+                   for name, _ in LEVELS_OF_DETAIL),
                  schema=None)
 
 
-def construct_multipolygon(filename: str):
-    with open(filename) as f:
-        # the geojson is a bunch of polygons, we want a multipolygon
-        js = json.load(f)
-    polygons = [shape(feature['geometry']) for feature in js['features']]
+def construct_multipolygon(polygons: List[Polygon]):
+    # polygonize gives us a bunch of polygons, we want a multipolygon
     print(f'{len(polygons)} polygons found')
     if len(polygons) > 0:
         return MultiPolygon(polygons)
     return None
 
 
-def persist_polygon(filename: str,
+class Perimeter(NamedTuple):
+    """ A fire perimeter, ready to be persisted. """
+    identifier: str
+    date_of_interest: date
+    coordinate: Point
+    date_range: int
+    cloud_cover: float
+    object_store_filename: str
+    multi_polygon: MultiPolygon
+    scene_fingerprint: Optional[str] = None
+    # multi_polygon simplified to simplify_tolerance, if it's already been done (see simplify_perimeter)
+    simplified: Optional[MultiPolygon] = None
+
+
+_engine = None
+_table_schema = None
+_latest_table_schema = None
+# Is the perimeter table partitioned? (None until we've asked the database.)
+_partitioned = None
+# Seasons we know have a partition, so we only have to create them once per process.
+_seasons: Set[int] = set()
+_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    """ Return the process wide engine, creating it the first time we're called.
+    The engine holds a pool of connections, so we're not connecting to the database for every fire.
+    """
+    global _engine
+    with _lock:
+        if _engine is None:
+            user = config('user')
+            password = config('password')
+            port = config('port')
+            host = config('host')
+            dbname = config('dbname')
+
+            db_string = f'postgresql://{user}:{urlquote(password)}@{host}:{port}/{dbname}'
+
+            _engine = create_engine(db_string,
+                                    pool_size=int(config('database_pool_size', 5)),
+                                    pool_pre_ping=True,
+                                    connect_args={'options': '-c timezone=utc'})
+    return _engine
+
+
+def get_table_schema() -> Table:
+    """ Return the schema of the perimeter table. """
+    global _table_schema
+    with _lock:
+        if _table_schema is None:
+            _table_schema = create_table_schema(MetaData(), config('table'), SRID,
+                                                partitioned=config('partitioned', 'false') == 'true')
+    return _table_schema
+
+
+def get_latest_table_schema() -> Table:
+    """ Return the schema of the latest perimeter table. """
+    global _latest_table_schema
+    with _lock:
+        if _latest_table_schema is None:
+            _latest_table_schema = create_latest_table_schema(MetaData(), f'{config("table")}_latest', SRID)
+    return _latest_table_schema
+
+
+def _add_missing_columns(connection, table_schema: Table):
+    """ Add any columns that have been added to the schema since the table was created. """
+    existing = {column['name'] for column in inspect(connection).get_columns(table_schema.name)}
+    for column in table_schema.columns:
+        if column.name not in existing:
+            print(f'adding column {column.name} to {table_schema.name}')
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.execute(text(
+                f'ALTER TABLE {table_schema.name} ADD COLUMN IF NOT EXISTS {column.name} {column_type}'))
+
+
+def create_table():
+    """ Create the perimeter table if it doesn't exist yet (or bring it up to date if it does).
+    Call this once, before persisting anything.
+    """
+    global _partitioned
+    table_schema = get_table_schema()
+    latest_table_schema = get_latest_table_schema()
+    with get_engine().begin() as connection:
+        table_schema.create(connection, checkfirst=True)
+        _partitioned = None
+        if config('partitioned', 'false') == 'true' and not is_partitioned(connection):
+            print(f'{table_schema.name} isn\'t partitioned, run "persistence partition" to migrate it')
+        _add_missing_columns(connection, table_schema)
+        _add_missing_indexes(connection, table_schema)
+        if not inspect(connection).has_table(latest_table_schema.name):
+            latest_table_schema.create(connection)
+            refresh_latest(connection)
+        _add_missing_columns(connection, latest_table_schema)
+
+
+def is_partitioned(connection) -> bool:
+    """ Return True if the perimeter table is partitioned (regardless of the partitioned setting). """
+    global _partitioned
+    if _partitioned is None:
+        _partitioned = bool(connection.execute(
+            text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table_name)"),
+            {'table_name': get_table_schema().name}).scalar())
+    return _partitioned
+
+
+def _season(value: date) -> int:
+    """ Fire seasons don't cross the new year, so a season is a calendar year. """
+    return value.year
+
+
+def _create_partition(connection, table_name: str, season: int):
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {table_name}_{season} PARTITION OF {table_name} "
+        f"FOR VALUES FROM ('{season}-01-01') TO ('{season + 1}-01-01')"))
+
+
+def ensure_partitions(dates: Iterable[date]):
+    """ Create the partitions (if we don't have them yet) that rows for dates will go into. """
+    table_name = get_table_schema().name
+    missing = {_season(value) for value in dates} - _seasons
+    if not missing or _partitioned is False:
+        return
+    with get_engine().begin() as connection:
+        if not is_partitioned(connection):
+            return
+        # serialize partition creation, create table if not exists isn't safe against concurrent creates.
+        connection.execute(text('SELECT pg_advisory_xact_lock(hashtext(:table_name))'), {'table_name': table_name})
+        for season in sorted(missing):
+            _create_partition(connection, table_name, season)
+    _seasons.update(missing)
+
+
+def partition_table():
+    """
+    Migrate the (flat) perimeter table to a partitioned one. The flat table is renamed to <table>_flat
+    (drop it once you're happy with the migration), and its rows are copied to the partitioned table.
+    """
+    global _partitioned
+    table_name = get_table_schema().name
+    flat_table_name = f'{table_name}_flat'
+    table_schema = create_table_schema(MetaData(), table_name, SRID, partitioned=True)
+    with get_engine().begin() as connection:
+        if is_partitioned(connection):
+            print(f'{table_name} is already partitioned')
+            return
+        # index and sequence names are unique per schema, so the flat table's have to make way for the new
+        # table's.
+        index_names = connection.execute(text('SELECT indexname FROM pg_indexes WHERE tablename = :table_name'),
+                                         {'table_name': table_name}).scalars().all()
+        for index_name in index_names:
+            connection.execute(text(f'ALTER INDEX {index_name} RENAME TO {index_name}_flat'))
+        sequence = connection.execute(text("SELECT pg_get_serial_sequence(:table_name, 'id')"),
+                                      {'table_name': table_name}).scalar()
+        connection.execute(text(f'ALTER TABLE {table_name} RENAME TO {flat_table_name}'))
+        if sequence:
+            connection.execute(text(f'ALTER SEQUENCE {sequence} RENAME TO {flat_table_name}_id_seq'))
+
+        table_schema.create(connection)
+        seasons = connection.execute(text(
+            f'SELECT DISTINCT extract(year FROM date_of_interest)::integer FROM {flat_table_name}')).scalars().all()
+        for season in seasons:
+            _create_partition(connection, table_name, season)
+        columns = ', '.join(column.name for column in table_schema.columns)
+        result = connection.execute(text(
+            f'INSERT INTO {table_name} ({columns}) SELECT {columns} FROM {flat_table_name}'))
+        # ids are copied over, so carry on from the highest one.
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table_name}', 'id'), "
+            f"(SELECT coalesce(max(id), 0) + 1 FROM {table_name}), false)"))
+        print(f'copied {result.rowcount} perimeters into {len(seasons)} partitions of {table_name}, '
+              f'the flat table is now {flat_table_name}')
+    _partitioned = None
+    _seasons.clear()
+
+
+def archive_seasons(before: int, drop: bool = False):
+    """
+    Detach the partitions of seasons before the given one from the perimeter table. Detached partitions
+    are regular tables, which can be dumped, moved or dropped without touching the perimeter table.
+    """
+    table_name = get_table_schema().name
+    with get_engine().begin() as connection:
+        if not is_partitioned(connection):
+            print(f'{table_name} isn\'t partitioned, nothing to archive')
+            return
+        partitions = connection.execute(text(
+            'SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = to_regclass(:table_name)'), {'table_name': table_name}).scalars().all()
+        for partition in sorted(partitions):
+            season = partition[len(table_name) + 1:]
+            if not season.isdigit() or int(season) >= before:
+                continue
+            connection.execute(text(f'ALTER TABLE {table_name} DETACH PARTITION {partition}'))
+            if drop:
+                connection.execute(text(f'DROP TABLE {partition}'))
+                print(f'dropped {partition}')
+            else:
+                print(f'detached {partition}')
+    _seasons.clear()
+
+
+def _add_missing_indexes(connection, table_schema: Table):
+    """ Create any indexes that have been added to the schema since the table was created. """
+    existing = {index['name'] for index in inspect(connection).get_indexes(table_schema.name)}
+    for index in table_schema.indexes:
+        if index.name not in existing:
+            print(f'creating index {index.name} on {table_schema.name}')
+            index.create(connection)
+
+
+def refresh_latest(connection, identifiers: Optional[Iterable[str]] = None):
+    """
+    Copy the most recent perimeter of each fire in identifiers (or of every fire) into the latest
+    perimeter table. Run this in the same transaction as the write it follows, so the latest perimeter
+    table is never out of step with the perimeter table.
+    """
+    table_schema = get_table_schema()
+    latest_table_schema = get_latest_table_schema()
+    names = [column.name for column in latest_table_schema.columns]
+    # distinct on fire_number, ordered by date, gives us the most recent perimeter of each fire.
+    columns = [table_schema.c.id if name == 'perimeter_id' else table_schema.c[name] for name in names]
+    query = select(*columns).distinct(table_schema.c.fire_number).order_by(
+        table_schema.c.fire_number, table_schema.c.date_of_interest.desc())
+    if identifiers is not None:
+        query = query.where(table_schema.c.fire_number.in_(list(identifiers)))
+    statement = insert(latest_table_schema).from_select(names, query)
+    statement = statement.on_conflict_do_update(
+        index_elements=['fire_number'],
+        set_={name: statement.excluded[name] for name in names if name != 'fire_number'})
+    connection.execute(statement)
+
+
+def get_existing_perimeters(identifiers: Iterable[str], start: date, end: date) -> Set[Tuple[str, date]]:
+    """ Return the (fire_number, date_of_interest) pairs we already have perimeters for, between start
+    and end (inclusive). """
+    table_schema = get_table_schema()
+    with get_engine().connect() as connection:
+        rows = connection.execute(
+            select(table_schema.c.fire_number, table_schema.c.date_of_interest).where(
+                table_schema.c.fire_number.in_(list(identifiers)),
+                table_schema.c.date_of_interest.between(start, end)))
+        return {(fire_number, date_of_interest) for fire_number, date_of_interest in rows}
+
+
+def get_scene_fingerprint(identifier: str) -> Optional[str]:
+    """ Return the scene fingerprint of the most recent perimeter for a fire. """
+    table_schema = get_table_schema()
+    with get_engine().connect() as connection:
+        return connection.execute(
+            select(table_schema.c.scene_fingerprint).where(
+                table_schema.c.fire_number == identifier).order_by(
+                    table_schema.c.date_of_interest.desc()).limit(1)).scalar()
+
+
+def get_previous_perimeters(identifiers: Iterable[str], before: date) -> Dict[str, MultiPolygon]:
+    """ Return the most recent perimeter before a date, for each fire in identifiers that has one. """
+    table_schema = get_table_schema()
+    query = select(table_schema.c.fire_number, func.ST_AsBinary(table_schema.c.geom)).distinct(
+        table_schema.c.fire_number).where(
+            table_schema.c.fire_number.in_(list(identifiers)),
+            table_schema.c.date_of_interest < before).order_by(
+                table_schema.c.fire_number, table_schema.c.date_of_interest.desc())
+    with get_engine().connect() as connection:
+        return {fire_number: wkb.loads(bytes(geom)) for fire_number, geom in connection.execute(query)}
+
+
+def _dumps(multi_polygon: Optional[MultiPolygon]) -> Optional[str]:
+    if multi_polygon is None:
+        return None
+    return wkb.dumps(multi_polygon, hex=True, srid=SRID)
+
+
+def _values(perimeter: Perimeter, rasterserv_base: str, now: datetime, tolerance: float) -> dict:
+    # statistics are calculated on the geometry as polygonized, not the simplified one.
+    statistics = calculate_statistics(perimeter.multi_polygon.geoms)
+    simplified = perimeter.simplified
+    if simplified is None:
+        simplified = simplify_perimeter(perimeter.multi_polygon, tolerance)
+    geom = simplified or perimeter.multi_polygon
+    return {
+        'geom': _dumps(geom),
+        'latitude': perimeter.coordinate.y,
+        'longitude': perimeter.coordinate.x,
+        'date_range': perimeter.date_range,
+        'fire_number': perimeter.identifier,
+        'cloud_cover': perimeter.cloud_cover,
+        'rgb_raster': f'{rasterserv_base}/{perimeter.object_store_filename}',
+        'date_of_interest': perimeter.date_of_interest,
+        'create_date': now,
+        'update_date': now,
+        'scene_fingerprint': perimeter.scene_fingerprint,
+        'area': statistics.area,
+        'perimeter': statistics.perimeter,
+        'polygon_count': statistics.polygon_count,
+        **{name: _dumps(simplify_perimeter(perimeter.multi_polygon, level_tolerance))
+           for name, level_tolerance in LEVELS_OF_DETAIL},
+    }
+
+
+def persist_polygons(perimeters: List[Perimeter]):
+    """
+    Insert or update (if we already have a perimeter for that fire and date) a batch of perimeters,
+    in a single statement and transaction.
+    """
+    if not perimeters:
+        return
+
+    table_schema = get_table_schema()
+    rasterserv_base = config('rasterserv_base')
+    tolerance = float(config('simplify_tolerance', 10))
+    now = datetime.now()
+    ensure_partitions(perimeter.date_of_interest for perimeter in perimeters)
+
+    statement = insert(table_schema)
+    statement = statement.on_conflict_do_update(
+        constraint='uix_fire_number_date_of_interest',
+        # everything but the create date gets replaced
+        set_={name: statement.excluded[name] for name in (
+            'geom', 'latitude', 'longitude', 'date_range', 'cloud_cover', 'rgb_raster', 'update_date',
+            'scene_fingerprint', 'area', 'perimeter', 'polygon_count',
+            *(name for name, _ in LEVELS_OF_DETAIL))})
+
+    with get_engine().begin() as connection:
+        connection.execute(statement, [_values(perimeter, rasterserv_base, now, tolerance)
+                                       for perimeter in perimeters])
+        refresh_latest(connection, {perimeter.identifier for perimeter in perimeters})
+
+
+def prepare_perimeter(polygons: List[Polygon],
+                      identifier: str,
+                      date_of_interest: date,
+                      coordinate: Point,
+                      date_range: int,
+                      cloud_cover: float,
+                      object_store_filename: str,
+                      scene_fingerprint: Optional[str] = None) -> Optional[Perimeter]:
+    """
+    Turn polygons into a perimeter, ready for persist_polygons: slivers are dropped, and the perimeter is
+    simplified. Returns None if there's nothing left to persist.
+
+    polygons: fire polygons, as returned by polygonize
+    identifier: fire identifier
+    scene_fingerprint: fingerprint of the imagery used, see client.calculate_scene_fingerprint
+    """
+    polygons = remove_slivers(polygons, float(config('min_polygon_area', 800)))
+    multi_polygon = construct_multipolygon(polygons)
+    if multi_polygon is None:
+        print(f'failed to generate multipolygon for {identifier}')
+        return None
+
+    simplified = simplify_perimeter(multi_polygon, float(config('simplify_tolerance', 10)))
+    if simplified is not None:
+        vertices, size = describe(multi_polygon)
+        simplified_vertices, simplified_size = describe(simplified)
+        print(f'simplified {identifier} from {vertices} vertices ({size} bytes) to '
+              f'{simplified_vertices} vertices ({simplified_size} bytes)')
+
+    return Perimeter(identifier=identifier,
+                     date_of_interest=date_of_interest,
+                     coordinate=coordinate,
+                     date_range=date_range,
+                     cloud_cover=cloud_cover,
+                     object_store_filename=object_store_filename,
+                     multi_polygon=multi_polygon,
+                     scene_fingerprint=scene_fingerprint,
+                     simplified=simplified)
+
+
+def persist_polygon(polygons: List[Polygon],
                     identifier: str,
                     date_of_interest: date,
                     coordinate: Point,
                     date_range: int,
                     cloud_cover: float,
-                    object_store_filename: str):
+                    object_store_filename: str,
+                    scene_fingerprint: Optional[str] = None):
     """
-    filename: geojson file
-    identifier: fire identifier
+    Persist the perimeter of a single fire, see prepare_perimeter. To persist many perimeters at once,
+    use prepare_perimeter and persist_polygons.
     """
-    print(f'persist {filename} to postgresql')
+    print(f'persist {identifier} to postgresql')
+    perimeter = prepare_perimeter(polygons, identifier, date_of_interest, coordinate, date_range, cloud_cover,
+                                  object_store_filename, scene_fingerprint)
+    if perimeter is not None:
+        persist_polygons([perimeter])
 
-    multi_polygon = construct_multipolygon(filename)
-    if multi_polygon is None:
-        print('failed to generate multipolygon')
-        return
 
-    rasterserv_base = config('rasterserv_base')
-    object_store_url = f'{rasterserv_base}/{object_store_filename}'
-
-    user = config('user')
-    password = config('password')
-    port = config('port')
-    host = config('host')
-    dbname = config('dbname')
-    table = config('table')
-
-    db_string = f'postgresql://{user}:{urlquote(password)}@{host}:{port}/{dbname}'
-
-    srid = 4326
-    meta_data = MetaData()
-    table_schema = create_table_schema(meta_data, table, srid)
-
-    engine = create_engine(db_string, connect_args={
-        'options': '-c timezone=utc'})
-
-    with engine.connect() as connection:
-        if not engine.dialect.has_table(connection, table):
-            table_schema.create(engine)
-
-        wkt = wkb.dumps(multi_polygon, hex=True, srid=srid)
-
-        result = connection.execute(table_schema.select().where(
-            table_schema.c.fire_number == identifier).where(
-                table_schema.c.date_of_interest == date_of_interest)).first()
-
-        now = datetime.now()
-
-        if result:
-            connection.execute(table_schema.update().where(
-                table_schema.c.fire_number == identifier).where(
-                    table_schema.c.date_of_interest == date_of_interest).values(
-                        geom=wkt,
-                        latitude=coordinate.y,
-                        longitude=coordinate.x,
-                        date_range=date_range,
-                        fire_number=identifier,
-                        cloud_cover=cloud_cover,
-                        rgb_raster=object_store_url,
-                        update_date=now))
-        else:
-            values = {
-                'geom': wkt,
-                'latitude': coordinate.y,
-                'longitude': coordinate.x,
-                'date_range': date_range,
-                'fire_number': identifier,
-                'cloud_cover': cloud_cover,
-                'rgb_raster': object_store_url,
-                'date_of_interest': date_of_interest,
-                'create_date': now,
-                'update_date': now,
-            }
-            connection.execute(table_schema.insert().values(values))
+def update_statistics(recalculate: bool = False, batch_size: int = 1000):
+    """
+    Calculate area, perimeter and polygon count for perimeters that don't have them yet (e.g. perimeters
+    persisted before we started calculating them), or for all perimeters if recalculate is set.
+    """
+    table_schema = get_table_schema()
+    query = select(table_schema.c.id, func.ST_AsBinary(table_schema.c.geom))
+    if not recalculate:
+        query = query.where(table_schema.c.area.is_(None))
+    # bind parameters can't have the same names as the columns they're updating.
+    statement = table_schema.update().where(table_schema.c.id == bindparam('perimeter_id')).values(
+        area=bindparam('new_area'),
+        perimeter=bindparam('new_perimeter'),
+        polygon_count=bindparam('new_polygon_count'))
+
+    updated = 0
+    with get_engine().begin() as connection:
+        rows = connection.execute(query).fetchall()
+        for offset in range(0, len(rows), batch_size):
+            values = []
+            for perimeter_id, geom in rows[offset:offset + batch_size]:
+                statistics = calculate_statistics(wkb.loads(bytes(geom)).geoms)
+                values.append({'perimeter_id': perimeter_id,
+                               'new_area': statistics.area,
+                               'new_perimeter': statistics.perimeter,
+                               'new_polygon_count': statistics.polygon_count})
+            connection.execute(statement, values)
+            updated += len(values)
+        refresh_latest(connection)
+    print(f'updated statistics for {updated} perimeters')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the fire perimeter table.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    statistics_parser = subparsers.add_parser(
+        'statistics', help='calculate area, perimeter and polygon count for existing perimeters')
+    statistics_parser.add_argument('--recalculate', action='store_true',
+                                   help='recalculate statistics for all perimeters, not just missing ones')
+    subparsers.add_parser('latest', help='rebuild the latest perimeter table from the perimeter table')
+    subparsers.add_parser('partition', help='migrate the perimeter table to a table partitioned by season')
+    archive_parser = subparsers.add_parser(
+        'archive', help='detach the partitions of old seasons from the (partitioned) perimeter table')
+    archive_parser.add_argument('before', type=int, help='archive seasons before this one (e.g. 2021)')
+    archive_parser.add_argument('--drop', action='store_true', help='drop the partitions, instead of detaching')
+    args = parser.parse_args()
+
+    create_table()
+    if args.command == 'statistics':
+        update_statistics(recalculate=args.recalculate)
+    elif args.command == 'latest':
+        with get_engine().begin() as connection:
+            refresh_latest(connection)
+    elif args.command == 'partition':
+        partition_table()
+    elif args.command == 'archive':
+        archive_seasons(args.before, drop=args.drop)
+
+
+if __name__ == '__main__':
+    main()
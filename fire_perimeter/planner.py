@@ -0,0 +1,178 @@
+"""
+Plan which regions to download, before generating perimeters.
+
+Fires close to each other (e.g. complexes) have overlapping bounding boxes, so processing them one at a
+time downloads, classifies and polygonizes the same pixels more than once. We cluster overlapping
+bounding boxes into shared regions - one download per cluster - and then hand each polygon found in a
+cluster's region back to the fire it belongs to.
+
+Regions are grown (see expand_bounding_box and touching_edges) when a perimeter runs off the edge of the
+raster downloaded for it. Only the polygons at the fire point (see nearest_polygons) count as the fire's
+perimeter for this - the classification picks up false positives all over a raster, and following those
+would grow regions without end.
+"""
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from shapely.geometry import Point, Polygon, box
+from shapely.strtree import STRtree
+from fire_perimeter.stats import GEOD
+
+Bounds = Tuple[float, float, float, float]
+EDGES = ('west', 'south', 'east', 'north')
+# the most earth engine will give us in a single download (see client.write_geotiff)
+MAX_DOWNLOAD_BYTES = 32 * 1024 * 1024
+
+
+class Fire(NamedTuple):
+    identifier: str
+    point: Point
+    current_size: float
+    # (west, south, east, north) of the area we'd download for this fire on its own
+    bounds: Bounds
+
+
+class Cluster(NamedTuple):
+    fires: List[Fire]
+    bounds: Bounds
+
+    @property
+    def identifier(self) -> str:
+        return '+'.join(fire.identifier for fire in self.fires)
+
+
+def _union(a: Bounds, b: Bounds) -> Bounds:
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def _area(bounds: Bounds) -> float:
+    west, south, east, north = bounds
+    return (east - west) * (north - south)
+
+
+def count_pixels(bounds: Bounds, resolution: float = 20) -> int:
+    """ Number of pixels in bounds (west, south, east, north) at resolution meters, as generate_raster
+    works it out. """
+    west, south, east, north = bounds
+    lat = (south + north) / 2
+    lon = (west + east) / 2
+    _, _, width = GEOD.inv(west, lat, east, lat)
+    _, _, height = GEOD.inv(lon, south, lon, north)
+    return int(width / resolution) * int(height / resolution)
+
+
+def cluster_fires(fires: List[Fire], max_pixels: Optional[float] = None) -> List[Cluster]:
+    """
+    Merge fires with overlapping bounding boxes into clusters that share a region.
+
+    Two regions are only merged if the region covering both is no bigger than the two of them added
+    together - so we never download more pixels than we would have processing them separately. Merging
+    grows regions, which can make them overlap others, so we repeat until nothing changes.
+
+    max_pixels: if given, regions aren't merged if the result would have more pixels than that - a download
+        that's too big gets its resolution reduced, even though each fire on its own would have been fine.
+    """
+    clusters: List[Cluster] = [Cluster(fires=[fire], bounds=fire.bounds) for fire in fires]
+    merged = True
+    while merged:
+        merged = False
+        geometries = [box(*cluster.bounds) for cluster in clusters]
+        # shapely 1.8's STRtree.query returns geometries (not indices), so we look them up by identity.
+        indices = {id(geometry): index for index, geometry in enumerate(geometries)}
+        tree = STRtree(geometries)
+        remaining: List[Optional[Cluster]] = list(clusters)
+        for index in range(len(remaining)):
+            if remaining[index] is None:
+                continue
+            for candidate in tree.query(geometries[index]):
+                other_index = indices[id(candidate)]
+                if other_index == index or remaining[other_index] is None:
+                    continue
+                cluster, other = remaining[index], remaining[other_index]
+                if not candidate.intersects(geometries[index]):
+                    continue
+                bounds = _union(cluster.bounds, other.bounds)
+                if _area(bounds) > _area(cluster.bounds) + _area(other.bounds):
+                    continue
+                if max_pixels is not None and count_pixels(bounds) > max_pixels:
+                    continue
+                remaining[index] = Cluster(fires=cluster.fires + other.fires, bounds=bounds)
+                remaining[other_index] = None
+                merged = True
+        clusters = [cluster for cluster in remaining if cluster is not None]
+    return clusters
+
+
+def assign_polygons(polygons: List[Polygon], fires: List[Fire]) -> Dict[str, List[Polygon]]:
+    """
+    Hand each polygon to one of fires: the fire whose point it contains, otherwise the closest fire.
+    Only fires whose own bounding box the polygon reaches are considered, polygons that don't reach any
+    (they're in a corner of the cluster's region that none of the fires cover) are dropped.
+    """
+    assigned: Dict[str, List[Polygon]] = {fire.identifier: [] for fire in fires}
+    regions = [(fire, box(*fire.bounds)) for fire in fires]
+    for polygon in polygons:
+        candidates = [fire for fire, region in regions if region.intersects(polygon)]
+        if not candidates:
+            continue
+        containing = [fire for fire in candidates if polygon.contains(fire.point)]
+        if containing:
+            fire = containing[0]
+        else:
+            fire = min(candidates, key=lambda candidate: polygon.distance(candidate.point))
+        assigned[fire.identifier].append(polygon)
+    return assigned
+
+
+def nearest_polygons(polygons: Iterable[Polygon], point: Point) -> List[Polygon]:
+    """
+    Return the polygons that contain point, or if none do, the one closest to it: the main body of the
+    fire at point, as opposed to whatever else was classified as fire nearby.
+    """
+    polygons = list(polygons)
+    containing = [polygon for polygon in polygons if polygon.contains(point)]
+    if containing or not polygons:
+        return containing
+    return [min(polygons, key=lambda polygon: polygon.distance(point))]
+
+
+def clamp_bounding_box(bounds: Bounds, limit: Bounds) -> Bounds:
+    """ Shrink bounds (west, south, east, north) so that it doesn't extend beyond limit. """
+    west, south, east, north = bounds
+    return (max(west, limit[0]), max(south, limit[1]), min(east, limit[2]), min(north, limit[3]))
+
+
+def expand_bounding_box(bounds: Bounds, distance: float, edges: Iterable[str] = EDGES) -> Bounds:
+    """
+    Move edges (by default all of them) of bounds (west, south, east, north) out by distance meters.
+    """
+    west, south, east, north = bounds
+    edges = set(edges)
+    lat = (south + north) / 2
+    lon = (west + east) / 2
+    if 'west' in edges:
+        west = GEOD.fwd(west, lat, 270, distance)[0]
+    if 'east' in edges:
+        east = GEOD.fwd(east, lat, 90, distance)[0]
+    if 'south' in edges:
+        south = GEOD.fwd(lon, south, 180, distance)[1]
+    if 'north' in edges:
+        north = GEOD.fwd(lon, north, 0, distance)[1]
+    return (west, south, east, north)
+
+
+def touching_edges(polygons: List[Polygon], bounds: Bounds, pixel_size: Tuple[float, float]) -> List[str]:
+    """
+    Return the edges of the raster bounds (west, south, east, north) that polygons touch - if a perimeter
+    reaches the edge of the raster, the fire probably carries on beyond it.
+    """
+    if not polygons:
+        return []
+    west, south, east, north = bounds
+    # polygons follow pixel boundaries, half a pixel is plenty of room for rounding.
+    x_margin, y_margin = pixel_size[0] / 2, pixel_size[1] / 2
+    min_x = min(polygon.bounds[0] for polygon in polygons)
+    min_y = min(polygon.bounds[1] for polygon in polygons)
+    max_x = max(polygon.bounds[2] for polygon in polygons)
+    max_y = max(polygon.bounds[3] for polygon in polygons)
+    touching = [min_x <= west + x_margin, min_y <= south + y_margin,
+                max_x >= east - x_margin, max_y >= north - y_margin]
+    return [edge for edge, touches in zip(EDGES, touching) if touches]
@@ -0,0 +1,77 @@
+"""
+Process many fires at once.
+
+Most of the time spent on a fire is waiting on earth engine, the object store and the database, so we
+run fires on a pool of worker threads. Limits on how hard we hit each of those services are in
+fire_perimeter.limits.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Callable, Iterable, List, Optional
+
+
+@dataclass
+class Result:
+    """ Outcome of processing a single fire. """
+    identifier: str
+    status: str = 'pending'
+    started: float = 0.0
+    seconds: float = 0.0
+    error: Optional[str] = None
+    # the job the fire was processed in, if it was processed together with other fires.
+    job: Optional[str] = None
+
+
+def run_one(identifier: str, process: Callable[[], Optional[str]], run_start: float) -> Result:
+    """ Run process, making sure that whatever happens, we get a result - one fire failing must never
+    stop the others from being processed. process may return a status (e.g. 'skipped'), otherwise
+    the fire is considered ok. """
+    result = Result(identifier=identifier, started=time.perf_counter() - run_start)
+    start = time.perf_counter()
+    try:
+        result.status = process() or 'ok'
+    except Exception as e:
+        print(f'{identifier} failed: {e}')
+        result.status = 'failed'
+        result.error = str(e)
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def run(jobs: Iterable[tuple], workers: int) -> List[Result]:
+    """
+    jobs: (identifier, process) pairs, where process is a callable that processes that fire, optionally
+        returning a status - or (identifier, process, fires) for a job that processes several fires at
+        once (e.g. a cluster, see planner.cluster_fires).
+    workers: number of jobs to process at the same time.
+
+    Returns a result for every fire, in the order the jobs were given. The fires in a job share its
+    outcome.
+    """
+    jobs = list(jobs)
+    run_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fire') as executor:
+        futures = [executor.submit(run_one, job[0], job[1], run_start) for job in jobs]
+        results = []
+        for job, future in zip(jobs, futures):
+            result = future.result()
+            if len(job) > 2:
+                results.extend(replace(result, identifier=fire, job=result.identifier) for fire in job[2])
+            else:
+                results.append(result)
+        return results
+
+
+def print_summary(results: List[Result]):
+    """ Print the status and timing of each fire, followed by totals. """
+    print(f'{"fire":<12} {"status":<8} {"started (s)":>12} {"duration (s)":>13}  error')
+    for result in results:
+        print(f'{result.identifier:<12} {result.status:<8} {result.started:>12.1f} {result.seconds:>13.1f}  '
+              f'{result.error or ""}')
+    failed = sum(1 for result in results if result.status == 'failed')
+    skipped = sum(1 for result in results if result.status == 'skipped')
+    # fires processed together only took the time once.
+    busy = sum({result.job or result.identifier: result.seconds for result in results}.values())
+    elapsed = max((result.started + result.seconds for result in results), default=0.0)
+    print(f'{len(results)} fires, {failed} failed, {skipped} skipped, {busy:.1f}s of work in {elapsed:.1f}s')
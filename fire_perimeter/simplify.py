@@ -0,0 +1,51 @@
+"""
+Simplify fire perimeters before they're stored.
+
+Polygons straight out of gdal.Polygonize follow pixel edges, so they're staircase shaped with a vertex
+at every corner. We remove slivers that are too small to matter, simplify (without letting polygons
+cross each other or collapse) to roughly the raster resolution, and store extra, more simplified
+versions for map clients that are zoomed out.
+"""
+from typing import Iterable, List, Optional, Tuple, Union
+from shapely import wkb
+from shapely.geometry import MultiPolygon, Polygon
+from fire_perimeter.stats import calculate_statistics
+
+# Rough conversion from meters to degrees (of latitude). A degree of longitude is shorter than this in
+# BC, so tolerances are conservative east to west.
+METERS_PER_DEGREE = 111320
+
+# Column name and tolerance (meters) of each extra level of detail we store.
+LEVELS_OF_DETAIL = (('geom_100m', 100),
+                    ('geom_500m', 500),
+                    ('geom_2000m', 2000))
+
+
+def remove_slivers(polygons: List[Polygon], min_area: float) -> List[Polygon]:
+    """ Drop polygons with a geodesic area (square meters) smaller than min_area. """
+    return [polygon for polygon in polygons if calculate_statistics([polygon]).area >= min_area]
+
+
+def simplify_perimeter(multi_polygon: MultiPolygon, tolerance: float) -> Optional[MultiPolygon]:
+    """
+    Topology preserving simplification of multi_polygon, with tolerance in meters.
+    Returns None if nothing is left.
+    """
+    simplified = multi_polygon.simplify(tolerance / METERS_PER_DEGREE, preserve_topology=True)
+    if simplified.is_empty:
+        return None
+    if isinstance(simplified, Polygon):
+        return MultiPolygon([simplified])
+    return simplified
+
+
+def count_vertices(polygons: Union[MultiPolygon, Iterable[Polygon]]) -> int:
+    if isinstance(polygons, MultiPolygon):
+        polygons = polygons.geoms
+    return sum(len(polygon.exterior.coords) + sum(len(interior.coords) for interior in polygon.interiors)
+               for polygon in polygons)
+
+
+def describe(multi_polygon: MultiPolygon) -> Tuple[int, int]:
+    """ Return the number of vertices, and size in bytes (as WKB) of multi_polygon. """
+    return count_vertices(multi_polygon), len(wkb.dumps(multi_polygon))
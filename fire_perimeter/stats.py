@@ -0,0 +1,43 @@
+"""
+Geodesic area and perimeter statistics for fire perimeters.
+
+Areas and lengths are calculated on the WGS84 ellipsoid, so they're accurate anywhere in the province
+(unlike projecting to a single UTM zone).
+https://pyproj4.github.io/pyproj/stable/examples.html#geodesic-area
+"""
+from typing import Iterable, NamedTuple
+import numpy
+from pyproj import Geod
+from shapely.geometry import Polygon
+
+# Geod is immutable and thread safe, so we only ever need the one.
+GEOD = Geod(ellps='WGS84')
+
+
+class PerimeterStatistics(NamedTuple):
+    area: float  # square meters
+    perimeter: float  # meters
+    polygon_count: int
+
+
+def calculate_statistics(polygons: Iterable[Polygon]) -> PerimeterStatistics:
+    """
+    Calculate the total geodesic area (holes excluded) and perimeter (exterior rings) of polygons.
+
+    Polygons straight out of gdal.Polygonize aren't consistently oriented, and pyproj's area is signed by
+    orientation, so we take the absolute area of each ring - subtracting the holes from the exteriors.
+    """
+    area = 0.0
+    perimeter = 0.0
+    polygon_count = 0
+    for polygon in polygons:
+        polygon_count += 1
+        lons, lats = numpy.asarray(polygon.exterior.xy)
+        ring_area, ring_perimeter = GEOD.polygon_area_perimeter(lons, lats)
+        area += abs(ring_area)
+        perimeter += ring_perimeter
+        for interior in polygon.interiors:
+            lons, lats = numpy.asarray(interior.xy)
+            ring_area, _ = GEOD.polygon_area_perimeter(lons, lats)
+            area -= abs(ring_area)
+    return PerimeterStatistics(area=area, perimeter=perimeter, polygon_count=polygon_count)
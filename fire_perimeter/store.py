@@ -1,8 +1,19 @@
-from contextlib import asynccontextmanager
-from typing import Generator, Tuple
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, Generator, List, Optional, Tuple
 from decouple import config
 from aiobotocore.client import AioBaseClient
 from aiobotocore.session import get_session
+from fire_perimeter import metrics
+
 
 @asynccontextmanager
 async def get_client() -> Generator[Tuple[AioBaseClient, str], None, None]:
@@ -22,3 +33,153 @@ async def get_client() -> Generator[Tuple[AioBaseClient, str], None, None]:
             yield client, bucket
         finally:
             del client
+
+
+@dataclass
+class UploadResult:
+    """ Outcome of uploading a single object. """
+    key: str
+    status: str = 'pending'
+    bytes: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+class Uploader:
+    """
+    Upload files to the object store in the background.
+
+    A single client is kept open for the lifetime of the uploader, on an event loop running in its own
+    thread - so callers can hand off a file and carry on with the next fire while it uploads.
+    Large files are uploaded in parts, several parts at a time.
+    """
+
+    def __init__(self,
+                 concurrency: int,
+                 multipart_threshold: int,
+                 part_size: int,
+                 part_concurrency: int):
+        self.concurrency = concurrency
+        self.multipart_threshold = multipart_threshold
+        self.part_size = part_size
+        self.part_concurrency = part_concurrency
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._spool_path = None
+        self._futures: Dict[str, Future] = {}
+
+    def _start(self):
+        """ Start the event loop, and open the client (must be called holding the lock). """
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='uploader', daemon=True)
+        self._thread.start()
+        self._spool_path = tempfile.mkdtemp(prefix='upload_')
+        asyncio.run_coroutine_threadsafe(self._open(), self._loop).result()
+
+    async def _open(self):
+        self._stack = AsyncExitStack()
+        self._client, self._bucket = await self._stack.enter_async_context(get_client())
+        # asyncio primitives have to be created on the loop that uses them.
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    def submit(self, filename: str, key: str) -> Future:
+        """
+        Queue filename for upload to key, returning a future that resolves to an UploadResult.
+        The file is moved out of the way, so the caller is free to clean up once submit returns.
+        """
+        with self._lock:
+            if self._loop is None:
+                self._start()
+            spooled = os.path.join(self._spool_path, f'{uuid.uuid4()}_{os.path.basename(filename)}')
+            shutil.move(filename, spooled)
+            metrics.add(uploaded_bytes=os.path.getsize(spooled))
+            print(f'Uploading to S3... {key}')
+            future = asyncio.run_coroutine_threadsafe(self._upload(spooled, key), self._loop)
+            self._futures[key] = future
+        return future
+
+    async def _upload(self, filename: str, key: str) -> UploadResult:
+        result = UploadResult(key=key, bytes=os.path.getsize(filename))
+        start = time.perf_counter()
+        try:
+            async with self._semaphore:
+                if result.bytes >= self.multipart_threshold:
+                    await self._multipart_upload(filename, key, result.bytes)
+                else:
+                    with open(filename, 'rb') as f:
+                        await self._client.put_object(Bucket=self._bucket, Key=key, Body=f)
+            result.status = 'ok'
+        except Exception as e:
+            print(f'Could not upload {key}: {e}')
+            result.status = 'failed'
+            result.error = str(e)
+        finally:
+            os.remove(filename)
+        result.seconds = time.perf_counter() - start
+        return result
+
+    async def _multipart_upload(self, filename: str, key: str, size: int):
+        upload = await self._client.create_multipart_upload(Bucket=self._bucket, Key=key)
+        upload_id = upload['UploadId']
+        part_semaphore = asyncio.Semaphore(self.part_concurrency)
+
+        async def upload_part(part_number: int, offset: int) -> dict:
+            async with part_semaphore:
+                # only read the part once we're allowed to send it, so we never have more than
+                # part_concurrency parts in memory.
+                with open(filename, 'rb') as f:
+                    f.seek(offset)
+                    body = f.read(self.part_size)
+                response = await self._client.upload_part(Bucket=self._bucket, Key=key, UploadId=upload_id,
+                                                          PartNumber=part_number, Body=body)
+                return {'PartNumber': part_number, 'ETag': response['ETag']}
+
+        try:
+            parts = await asyncio.gather(*[upload_part(index + 1, offset)
+                                           for index, offset in enumerate(range(0, size, self.part_size))])
+            await self._client.complete_multipart_upload(Bucket=self._bucket, Key=key, UploadId=upload_id,
+                                                         MultipartUpload={'Parts': parts})
+        except Exception:
+            await self._client.abort_multipart_upload(Bucket=self._bucket, Key=key, UploadId=upload_id)
+            raise
+
+    def wait(self) -> List[UploadResult]:
+        """ Wait for all pending uploads to finish, then shut down. Returns a result for every upload. """
+        with self._lock:
+            if self._loop is None:
+                return []
+            results = [future.result() for future in self._futures.values()]
+            asyncio.run_coroutine_threadsafe(self._stack.aclose(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            shutil.rmtree(self._spool_path, ignore_errors=True)
+            self._loop = None
+            self._futures = {}
+        return results
+
+
+_uploader = None
+_uploader_lock = threading.Lock()
+
+
+def get_uploader() -> Uploader:
+    """ Return the process wide uploader. """
+    global _uploader
+    with _uploader_lock:
+        if _uploader is None:
+            _uploader = Uploader(concurrency=int(config('object_store_concurrency', 4)),
+                                 multipart_threshold=int(config('multipart_threshold', 16 * 1024 * 1024)),
+                                 part_size=int(config('multipart_part_size', 8 * 1024 * 1024)),
+                                 part_concurrency=int(config('multipart_part_concurrency', 4)))
+    return _uploader
+
+
+def print_summary(results: List[UploadResult]):
+    """ Print the outcome of each upload. """
+    for result in results:
+        print(f'{result.key} {result.status} {result.bytes} bytes in {result.seconds:.1f}s '
+              f'{result.error or ""}')
+    failed = sum(1 for result in results if result.status != 'ok')
+    print(f'{len(results)} uploads, {failed} failed')
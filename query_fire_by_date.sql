@@ -13,6 +13,7 @@ BEGIN
 		t.latitude, t.longitude,
 		t.rgb_raster, t.create_date, t.update_date
     FROM public.featureserv t
+    -- date_of_interest is the partition key, so only the partition for that season is scanned.
     WHERE t.date_of_interest = fire_by_date.date_of_interest;
 END;
 $$
@@ -0,0 +1,33 @@
+create schema if not exists postgisftw;
+
+CREATE OR REPLACE FUNCTION postgisftw.fire_by_date_simplified(
+	date_of_interest date,
+	tolerance integer DEFAULT 500)
+RETURNS TABLE(id integer, geom geometry, date_range integer, cloud_cover double precision,
+			  fire_number character varying,
+			 latitude double precision, longitude double precision,
+			  rgb_raster character varying, create_date timestamp with time zone, update_date timestamp with time zone)
+AS $$
+BEGIN
+	RETURN QUERY
+		SELECT t.id,
+		-- the most detailed level that's at least as simplified as asked for (tolerance is in meters),
+		-- perimeters too small to survive simplification fall back to the full perimeter.
+		COALESCE(CASE
+			WHEN fire_by_date_simplified.tolerance >= 2000 THEN t.geom_2000m
+			WHEN fire_by_date_simplified.tolerance >= 500 THEN t.geom_500m
+			WHEN fire_by_date_simplified.tolerance >= 100 THEN t.geom_100m
+		END, t.geom),
+		t.date_range, t.cloud_cover,
+		t.fire_number,
+		t.latitude, t.longitude,
+		t.rgb_raster, t.create_date, t.update_date
+    FROM public.featureserv t
+    -- date_of_interest is the partition key, so only the partition for that season is scanned.
+    WHERE t.date_of_interest = fire_by_date_simplified.date_of_interest;
+END;
+$$
+
+LANGUAGE 'plpgsql' STABLE PARALLEL SAFE;
+
+COMMENT ON FUNCTION postgisftw.fire_by_date_simplified IS 'Filters the featureserv table by date of interest, with perimeters simplified to tolerance meters (100, 500 or 2000) for zoomed out maps';
@@ -1,22 +1,39 @@
 
+-- season was added as a parameter, so drop the old, single parameter version.
+DROP FUNCTION IF EXISTS postgisftw.fire_by_number(text);
+
 CREATE OR REPLACE FUNCTION postgisftw.fire_by_number(
-	fire_number text)
+	fire_number text,
+	season integer DEFAULT NULL)
 RETURNS TABLE(id integer, geom geometry, date_range integer, cloud_cover double precision,
 			 latitude double precision, longitude double precision,
 			  date_of_interest date,
 			  rgb_raster character varying, create_date timestamp with time zone, update_date timestamp with time zone)
 AS $$
 BEGIN
-	RETURN QUERY
-		SELECT t.id, t.geom, t.date_range, t.cloud_cover,
-		t.latitude, t.longitude,
-		t.date_of_interest,
-		t.rgb_raster, t.create_date, t.update_date
-    FROM public.featureserv t
-    WHERE t.fire_number LIKE fire_by_number.fire_number;
+	IF fire_by_number.season IS NULL THEN
+		RETURN QUERY
+			SELECT t.id, t.geom, t.date_range, t.cloud_cover,
+			t.latitude, t.longitude,
+			t.date_of_interest,
+			t.rgb_raster, t.create_date, t.update_date
+		FROM public.featureserv t
+		WHERE t.fire_number LIKE fire_by_number.fire_number;
+	ELSE
+		-- a plain range on date_of_interest (the partition key), so only that season's partition is scanned.
+		RETURN QUERY
+			SELECT t.id, t.geom, t.date_range, t.cloud_cover,
+			t.latitude, t.longitude,
+			t.date_of_interest,
+			t.rgb_raster, t.create_date, t.update_date
+		FROM public.featureserv t
+		WHERE t.fire_number LIKE fire_by_number.fire_number
+		AND t.date_of_interest >= make_date(fire_by_number.season, 1, 1)
+		AND t.date_of_interest < make_date(fire_by_number.season + 1, 1, 1);
+	END IF;
 END;
 $$
 
 LANGUAGE 'plpgsql' STABLE PARALLEL SAFE;
 
-COMMENT ON FUNCTION postgisftw.fire_by_number IS 'Filters the featureserv table by fire_number ';
\ No newline at end of file
+COMMENT ON FUNCTION postgisftw.fire_by_number IS 'Filters the featureserv table by fire_number, and optionally season (year)';
\ No newline at end of file
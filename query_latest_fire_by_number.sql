@@ -0,0 +1,25 @@
+create schema if not exists postgisftw;
+
+CREATE OR REPLACE FUNCTION postgisftw.latest_fire_by_number(
+	fire_number text)
+RETURNS TABLE(id integer, geom geometry, date_range integer, cloud_cover double precision,
+			 latitude double precision, longitude double precision,
+			  date_of_interest date,
+			  area double precision, perimeter double precision,
+			  rgb_raster character varying, create_date timestamp with time zone, update_date timestamp with time zone)
+AS $$
+BEGIN
+	RETURN QUERY
+		SELECT t.perimeter_id, t.geom, t.date_range, t.cloud_cover,
+		t.latitude, t.longitude,
+		t.date_of_interest,
+		t.area, t.perimeter,
+		t.rgb_raster, t.create_date, t.update_date
+    FROM public.featureserv_latest t
+    WHERE t.fire_number LIKE latest_fire_by_number.fire_number;
+END;
+$$
+
+LANGUAGE 'plpgsql' STABLE PARALLEL SAFE;
+
+COMMENT ON FUNCTION postgisftw.latest_fire_by_number IS 'The most recent perimeter of fires matching fire_number';
@@ -0,0 +1,27 @@
+create schema if not exists postgisftw;
+
+CREATE OR REPLACE FUNCTION postgisftw.latest_fires(
+	since date DEFAULT NULL)
+RETURNS TABLE(id integer, geom geometry, date_range integer, cloud_cover double precision,
+			  fire_number character varying,
+			 latitude double precision, longitude double precision,
+			  date_of_interest date,
+			  area double precision, perimeter double precision,
+			  rgb_raster character varying, create_date timestamp with time zone, update_date timestamp with time zone)
+AS $$
+BEGIN
+	RETURN QUERY
+		SELECT t.perimeter_id, t.geom, t.date_range, t.cloud_cover,
+		t.fire_number,
+		t.latitude, t.longitude,
+		t.date_of_interest,
+		t.area, t.perimeter,
+		t.rgb_raster, t.create_date, t.update_date
+    FROM public.featureserv_latest t
+    WHERE latest_fires.since IS NULL OR t.date_of_interest >= latest_fires.since;
+END;
+$$
+
+LANGUAGE 'plpgsql' STABLE PARALLEL SAFE;
+
+COMMENT ON FUNCTION postgisftw.latest_fires IS 'The most recent perimeter of each fire, optionally only fires with a perimeter since a date';
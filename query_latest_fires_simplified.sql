@@ -0,0 +1,36 @@
+create schema if not exists postgisftw;
+
+CREATE OR REPLACE FUNCTION postgisftw.latest_fires_simplified(
+	tolerance integer DEFAULT 500,
+	since date DEFAULT NULL)
+RETURNS TABLE(id integer, geom geometry, date_range integer, cloud_cover double precision,
+			  fire_number character varying,
+			 latitude double precision, longitude double precision,
+			  date_of_interest date,
+			  area double precision, perimeter double precision,
+			  rgb_raster character varying, create_date timestamp with time zone, update_date timestamp with time zone)
+AS $$
+BEGIN
+	RETURN QUERY
+		SELECT t.perimeter_id,
+		-- the most detailed level that's at least as simplified as asked for (tolerance is in meters),
+		-- perimeters too small to survive simplification fall back to the full perimeter.
+		COALESCE(CASE
+			WHEN latest_fires_simplified.tolerance >= 2000 THEN t.geom_2000m
+			WHEN latest_fires_simplified.tolerance >= 500 THEN t.geom_500m
+			WHEN latest_fires_simplified.tolerance >= 100 THEN t.geom_100m
+		END, t.geom),
+		t.date_range, t.cloud_cover,
+		t.fire_number,
+		t.latitude, t.longitude,
+		t.date_of_interest,
+		t.area, t.perimeter,
+		t.rgb_raster, t.create_date, t.update_date
+    FROM public.featureserv_latest t
+    WHERE latest_fires_simplified.since IS NULL OR t.date_of_interest >= latest_fires_simplified.since;
+END;
+$$
+
+LANGUAGE 'plpgsql' STABLE PARALLEL SAFE;
+
+COMMENT ON FUNCTION postgisftw.latest_fires_simplified IS 'The most recent perimeter of each fire, simplified to tolerance meters (100, 500 or 2000) for zoomed out maps, optionally only fires with a perimeter since a date';
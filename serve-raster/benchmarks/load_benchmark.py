@@ -0,0 +1,60 @@
+"""
+Load test the raster server: hammer a single url with concurrent requests (without following the
+redirect), and report requests per second and latency.
+
+Run it against a build before and after a change to compare, e.g.:
+    make run
+    poetry run python -m benchmarks.load_benchmark http://localhost:8000/G80000/G80000_2022-08-01_rgb.tif
+"""
+import argparse
+import asyncio
+import time
+import aiohttp
+
+
+async def worker(session: aiohttp.ClientSession, url: str, deadline: float, latencies: list, errors: list):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            async with session.get(url, allow_redirects=False) as response:
+                await response.read()
+                if response.status >= 400:
+                    errors.append(response.status)
+                    continue
+        except aiohttp.ClientError as e:
+            errors.append(str(e))
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def load_test(url: str, concurrency: int, duration: float):
+    latencies = []
+    errors = []
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*[worker(session, url, deadline, latencies, errors) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f'{len(latencies)} requests in {elapsed:.1f}s: {len(latencies) / elapsed:.1f} requests/s, '
+          f'{len(errors)} errors')
+    if latencies:
+        for percentile in (50, 90, 99):
+            index = min(len(latencies) - 1, int(len(latencies) * percentile / 100))
+            print(f'p{percentile}: {latencies[index] * 1000:.1f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('url')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=30)
+    args = parser.parse_args()
+    asyncio.run(load_test(args.url, args.concurrency, args.duration))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,35 +1,111 @@
-from fastapi import FastAPI
-from starlette.responses import RedirectResponse
+from contextlib import AsyncExitStack
+from fastapi import FastAPI, Request
+from starlette.responses import RedirectResponse, Response
 from decouple import config
 from aiobotocore.session import get_session
+from botocore.exceptions import ClientError
+from serve_raster.presign import PresignedUrlCache
+from serve_raster.ranges import BlockCache, RangeNotSatisfiable, RangeReader, is_not_found, parse_range
 
 
 app = FastAPI()
 
-
-@app.get('/ready')
-async def ready():
-    return {'status': 'ok'}
+# How long presigned urls are valid for.
+url_expiry = int(config('PRESIGNED_URL_EXPIRY', 3600))
+# Only hand out cached urls for the first half of their lifetime, so they're still good for a while after
+# the client gets them.
+url_cache = PresignedUrlCache(ttl=url_expiry / 2)
+block_cache = BlockCache(max_bytes=int(config('BLOCK_CACHE_MAX_BYTES', 256 * 1024 * 1024)))
+# Larger ranges are redirected to the object store, rather than read into memory and pushed through the
+# block cache (where they'd evict everything else).
+max_range_bytes = int(config('MAX_RANGE_BYTES', 4 * 1024 * 1024))
 
 
-@app.get("/{fire}/{filename}")
-async def read_root(fire, filename):
+@app.on_event('startup')
+async def startup():
+    """ Create one s3 client for the lifetime of the application, instead of one per request. """
     server = config('OBJECT_STORE_SERVER')
     user_id = config('OBJECT_STORE_USER_ID')
     secret_key = config('OBJECT_STORE_SECRET')
 
+    app.state.exit_stack = AsyncExitStack()
     session = get_session()
-    async with session.create_client('s3',
-                                     endpoint_url=f'https://{server}',
-                                     aws_secret_access_key=secret_key,
-                                     aws_access_key_id=user_id) as client:
+    app.state.client = await app.state.exit_stack.enter_async_context(
+        session.create_client('s3',
+                              endpoint_url=f'https://{server}',
+                              aws_secret_access_key=secret_key,
+                              aws_access_key_id=user_id))
+    app.state.bucket = config('OBJECT_STORE_BUCKET')
+    app.state.range_reader = RangeReader(app.state.client, app.state.bucket, block_cache)
+
+
+@app.on_event('shutdown')
+async def shutdown():
+    await app.state.exit_stack.aclose()
+
+
+@app.get('/ready')
+async def ready():
+    return {'status': 'ok'}
 
-        fire = fire.strip('.')
-        filename = filename.strip('.')
-        key = f'fire_perimeter/{fire}/{filename}'
-        bucket = config('OBJECT_STORE_BUCKET')
 
-        response = await client.generate_presigned_url(
+def object_key(fire: str, filename: str) -> str:
+    fire = fire.strip('.')
+    filename = filename.strip('.')
+    return f'fire_perimeter/{fire}/{filename}'
+
+
+@app.api_route("/range/{fire}/{filename}", methods=['GET', 'HEAD'])
+async def read_range(fire, filename, request: Request):
+    """ Serve (single) HTTP range requests for an object, through the block cache.
+    Requests without a Range header, or for more than max_range_bytes, are redirected to the object
+    store. """
+    key = object_key(fire, filename)
+    try:
+        info = await app.state.range_reader.info(key)
+    except ClientError as e:
+        if is_not_found(e):
+            return Response(status_code=404)
+        raise
+    headers = {'Accept-Ranges': 'bytes', 'ETag': info.etag}
+
+    if request.method == 'HEAD':
+        headers['Content-Length'] = str(info.size)
+        return Response(headers=headers, media_type=info.content_type)
+
+    range_header = request.headers.get('range')
+    if range_header is None:
+        return await read_root(fire, filename)
+
+    try:
+        start, end = parse_range(range_header, info.size)
+    except (RangeNotSatisfiable, ValueError):
+        return Response(status_code=416, headers={'Content-Range': f'bytes */{info.size}'})
+
+    if end - start + 1 > max_range_bytes:
+        return RedirectResponse(url=await presigned_url(key), status_code=302)
+
+    try:
+        content = await app.state.range_reader.read(key, start, end)
+    except ClientError as e:
+        if is_not_found(e):
+            return Response(status_code=404)
+        raise
+    headers['Content-Range'] = f'bytes {start}-{end}/{info.size}'
+    return Response(content=content, status_code=206, headers=headers, media_type=info.content_type)
+
+
+async def presigned_url(key: str) -> str:
+    url = url_cache.get(key)
+    if url is None:
+        url = await app.state.client.generate_presigned_url(
             'get_object',
-            Params={'Bucket': bucket, 'Key': key})
-    return RedirectResponse(url=response)
+            Params={'Bucket': app.state.bucket, 'Key': key},
+            ExpiresIn=url_expiry)
+        url_cache.put(key, url)
+    return url
+
+
+@app.get("/{fire}/{filename}")
+async def read_root(fire, filename):
+    return RedirectResponse(url=await presigned_url(object_key(fire, filename)))
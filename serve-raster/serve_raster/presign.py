@@ -0,0 +1,39 @@
+"""
+In process cache of presigned urls.
+"""
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+class PresignedUrlCache:
+    """
+    Cache presigned urls by object key, for ttl seconds.
+
+    ttl must be well inside the lifetime of the signature, so that a url handed out of the cache is
+    still valid for a while after the client receives it.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        """ Return the cached url for key, or None if we don't have one (or it's too old). """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        url, expires = entry
+        if self._clock() >= expires:
+            del self._entries[key]
+            return None
+        return url
+
+    def put(self, key: str, url: str):
+        self._entries.pop(key, None)
+        self._entries[key] = (url, self._clock() + self.ttl)
+        # entries are in insertion order, so the first one is the oldest.
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
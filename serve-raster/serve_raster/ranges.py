@@ -0,0 +1,168 @@
+"""
+Serve byte ranges of objects in the object store, through a local cache.
+
+Objects are split into fixed size blocks, and blocks are cached in memory (least recently used blocks
+are evicted first, once the cache is full). During an active incident, everyone is looking at the same
+few fires, so most range requests are served from the cache instead of the object store.
+"""
+import re
+import time
+from collections import OrderedDict
+from typing import Callable, NamedTuple, Optional, Tuple
+from botocore.exceptions import ClientError
+
+BLOCK_SIZE = 256 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    """ The requested range is outside of the object. """
+
+
+def parse_range(header: str, size: int) -> Tuple[int, int]:
+    """
+    Parse a HTTP Range header (e.g. "bytes=0-1023", "bytes=1024-", "bytes=-512"), returning the first and
+    last (inclusive) byte requested. Only single ranges are supported, if more than one range is
+    requested, only the first one is served.
+    """
+    match = re.match(r'^bytes=(\d*)-(\d*)', header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        raise ValueError(f'unsupported range: {header}')
+    first, last = match.groups()
+    if first == '':
+        # suffix range, the last n bytes
+        start = max(0, size - int(last))
+        end = size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable(header)
+    return start, end
+
+
+def is_not_found(error: ClientError) -> bool:
+    """ True if error means the object doesn't exist - as opposed to e.g. access denied or throttling. """
+    return error.response.get('Error', {}).get('Code') in ('NoSuchKey', 'NotFound', '404') or \
+        error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 404
+
+
+def is_precondition_failed(error: ClientError) -> bool:
+    return error.response.get('Error', {}).get('Code') == 'PreconditionFailed' or \
+        error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 412
+
+
+class BlockCache:
+    """ Size bounded, least recently used, in memory cache of blocks. """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._blocks: OrderedDict = OrderedDict()
+
+    def get(self, key: tuple) -> Optional[bytes]:
+        block = self._blocks.get(key)
+        if block is None:
+            self.misses += 1
+            return None
+        self._blocks.move_to_end(key)
+        self.hits += 1
+        return block
+
+    def put(self, key: tuple, block: bytes):
+        previous = self._blocks.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous)
+        self._blocks[key] = block
+        self.size += len(block)
+        while self.size > self.max_bytes and self._blocks:
+            _, evicted = self._blocks.popitem(last=False)
+            self.size -= len(evicted)
+
+
+class ObjectInfo(NamedTuple):
+    size: int
+    etag: str
+    content_type: str
+    checked: float
+
+
+class RangeReader:
+    """
+    Read byte ranges of objects, through a BlockCache.
+
+    Blocks are cached by object key and etag, so if an object is replaced (e.g. a fire is re-processed),
+    we stop serving the old blocks once we notice the new etag. Object metadata is re-checked every
+    info_ttl seconds. Blocks are only fetched if the object still has the etag we know of, so blocks of
+    different versions of an object never end up in the same response.
+    """
+
+    def __init__(self, client, bucket: str, cache: BlockCache, block_size: int = BLOCK_SIZE,
+                 info_ttl: float = 60, clock: Callable[[], float] = time.monotonic):
+        self.client = client
+        self.bucket = bucket
+        self.cache = cache
+        self.block_size = block_size
+        self.info_ttl = info_ttl
+        self._clock = clock
+        self._info: OrderedDict = OrderedDict()
+
+    async def info(self, key: str) -> ObjectInfo:
+        """ Return the size and etag of an object. """
+        info = self._info.get(key)
+        if info is None or self._clock() - info.checked >= self.info_ttl:
+            response = await self.client.head_object(Bucket=self.bucket, Key=key)
+            info = ObjectInfo(size=response['ContentLength'],
+                              etag=response['ETag'],
+                              content_type=response.get('ContentType', 'application/octet-stream'),
+                              checked=self._clock())
+            self._info[key] = info
+            self._info.move_to_end(key)
+            # we only need to remember the objects that are currently being looked at.
+            while len(self._info) > 10000:
+                self._info.popitem(last=False)
+        return info
+
+    async def _fetch(self, key: str, first_block: int, last_block: int, info: ObjectInfo) -> bytes:
+        start = first_block * self.block_size
+        end = min((last_block + 1) * self.block_size, info.size) - 1
+        response = await self.client.get_object(Bucket=self.bucket, Key=key, Range=f'bytes={start}-{end}',
+                                                IfMatch=info.etag)
+        async with response['Body'] as stream:
+            return await stream.read()
+
+    async def read(self, key: str, start: int, end: int, retry: bool = True) -> bytes:
+        """ Return bytes start to end (inclusive) of object key. """
+        info = await self.info(key)
+        first_block = start // self.block_size
+        last_block = end // self.block_size
+
+        blocks = {}
+        missing = []
+        for index in range(first_block, last_block + 1):
+            block = self.cache.get((key, info.etag, index))
+            if block is None:
+                missing.append(index)
+            else:
+                blocks[index] = block
+
+        if missing:
+            # one request for everything we don't have, from the first to the last missing block.
+            try:
+                data = await self._fetch(key, missing[0], missing[-1], info)
+            except ClientError as e:
+                if not retry or not is_precondition_failed(e):
+                    raise
+                # the object has been replaced since we last looked, start over with the new version.
+                self._info.pop(key, None)
+                return await self.read(key, start, end, retry=False)
+            for index in range(missing[0], missing[-1] + 1):
+                offset = (index - missing[0]) * self.block_size
+                block = data[offset:offset + self.block_size]
+                blocks[index] = block
+                self.cache.put((key, info.etag, index), block)
+
+        data = b''.join(blocks[index] for index in range(first_block, last_block + 1))
+        offset = start - first_block * self.block_size
+        return data[offset:offset + end - start + 1]
@@ -0,0 +1,111 @@
+import pytest
+from botocore.exceptions import ClientError
+from serve_raster import main
+from serve_raster.presign import PresignedUrlCache
+from serve_raster.ranges import BlockCache, RangeReader
+
+testclient = pytest.importorskip('fastapi.testclient')
+
+KEY = 'fire_perimeter/G80000/G80000_2022-08-01_rgb.tif'
+CONTENT = bytes(range(256)) * 40
+
+
+class Body:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def read(self) -> bytes:
+        return self.data
+
+
+class FakeS3:
+    """ Just enough of an s3 client for the endpoints - an actual object store doesn't play well with the
+    test client's event loop. """
+
+    def __init__(self, objects, error_code=None):
+        self.objects = objects
+        self.error_code = error_code
+
+    def _check(self, key, operation):
+        if self.error_code:
+            raise ClientError({'Error': {'Code': self.error_code},
+                               'ResponseMetadata': {'HTTPStatusCode': 403}}, operation)
+        if key not in self.objects:
+            raise ClientError({'Error': {'Code': '404'}, 'ResponseMetadata': {'HTTPStatusCode': 404}}, operation)
+
+    async def head_object(self, Bucket, Key):
+        self._check(Key, 'HeadObject')
+        return {'ContentLength': len(self.objects[Key]), 'ETag': '"1"', 'ContentType': 'image/tiff'}
+
+    async def get_object(self, Bucket, Key, Range, IfMatch):
+        self._check(Key, 'GetObject')
+        start, end = (int(value) for value in Range[len('bytes='):].split('-'))
+        return {'Body': Body(self.objects[Key][start:end + 1])}
+
+    async def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f'https://object.store/{Params["Bucket"]}/{Params["Key"]}?signed'
+
+
+@pytest.fixture
+def client(monkeypatch):
+    def create(objects=None, error_code=None):
+        monkeypatch.setattr(main, 'url_cache', PresignedUrlCache(ttl=60))
+        main.app.state.client = FakeS3({KEY: CONTENT} if objects is None else objects, error_code)
+        main.app.state.bucket = 'rasters'
+        main.app.state.range_reader = RangeReader(main.app.state.client, 'rasters',
+                                                  BlockCache(max_bytes=1024 * 1024), block_size=1024)
+        # not used as a context manager, so startup doesn't try to connect to the real object store.
+        return testclient.TestClient(main.app)
+    return create
+
+
+def test_head(client):
+    response = client().head('/range/G80000/G80000_2022-08-01_rgb.tif')
+    assert response.status_code == 200
+    assert response.headers['content-length'] == str(len(CONTENT))
+    assert response.headers['accept-ranges'] == 'bytes'
+
+
+def test_range(client):
+    response = client().get('/range/G80000/G80000_2022-08-01_rgb.tif', headers={'Range': 'bytes=100-1999'})
+    assert response.status_code == 206
+    assert response.content == CONTENT[100:2000]
+    assert response.headers['content-range'] == f'bytes 100-1999/{len(CONTENT)}'
+
+
+def test_unsatisfiable_range(client):
+    response = client().get('/range/G80000/G80000_2022-08-01_rgb.tif',
+                            headers={'Range': f'bytes={len(CONTENT)}-'})
+    assert response.status_code == 416
+    assert response.headers['content-range'] == f'bytes */{len(CONTENT)}'
+
+
+def test_no_range_redirects(client):
+    response = client().get('/range/G80000/G80000_2022-08-01_rgb.tif', allow_redirects=False)
+    assert response.status_code == 307
+    assert response.headers['location'] == f'https://object.store/rasters/{KEY}?signed'
+
+
+def test_large_range_redirects(client, monkeypatch):
+    monkeypatch.setattr(main, 'max_range_bytes', 1000)
+    response = client().get('/range/G80000/G80000_2022-08-01_rgb.tif', headers={'Range': 'bytes=0-'},
+                            allow_redirects=False)
+    assert response.status_code == 302
+    assert response.headers['location'] == f'https://object.store/rasters/{KEY}?signed'
+
+
+def test_missing_object(client):
+    response = client(objects={}).get('/range/G80000/missing.tif', headers={'Range': 'bytes=0-99'})
+    assert response.status_code == 404
+
+
+def test_access_denied_is_not_not_found(client):
+    with pytest.raises(ClientError):
+        client(error_code='AccessDenied').get('/range/G80000/G80000_2022-08-01_rgb.tif',
+                                              headers={'Range': 'bytes=0-99'})
@@ -0,0 +1,34 @@
+from serve_raster.presign import PresignedUrlCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cached_url_is_returned_until_expiry():
+    clock = Clock()
+    cache = PresignedUrlCache(ttl=10, clock=clock)
+    cache.put('key', 'url')
+    clock.now = 9.9
+    assert cache.get('key') == 'url'
+    clock.now = 10
+    assert cache.get('key') is None
+
+
+def test_missing_key():
+    cache = PresignedUrlCache(ttl=10)
+    assert cache.get('key') is None
+
+
+def test_oldest_entries_are_evicted():
+    cache = PresignedUrlCache(ttl=10, max_entries=2)
+    cache.put('a', 'url a')
+    cache.put('b', 'url b')
+    cache.put('c', 'url c')
+    assert cache.get('a') is None
+    assert cache.get('b') == 'url b'
+    assert cache.get('c') == 'url c'
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import pytest
+from serve_raster.ranges import BlockCache, RangeNotSatisfiable, RangeReader, parse_range
+
+moto_server = pytest.importorskip('moto.server')
+aiobotocore_session = pytest.importorskip('aiobotocore.session')
+
+BUCKET = 'rasters'
+KEY = 'fire_perimeter/G80000/G80000_2022-08-01_rgb.tif'
+
+
+@pytest.fixture(scope='module')
+def endpoint():
+    """ Local S3 stand-in. """
+    server = moto_server.ThreadedMotoServer(ip_address='127.0.0.1', port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f'http://{host}:{port}'
+    server.stop()
+
+
+def run_with_client(endpoint, function):
+    """ Run function(client) against the local S3, with a fresh bucket. """
+    async def run():
+        session = aiobotocore_session.get_session()
+        async with session.create_client('s3', endpoint_url=endpoint, region_name='us-east-1',
+                                         aws_access_key_id='test', aws_secret_access_key='test') as client:
+            await client.create_bucket(Bucket=BUCKET)
+            try:
+                return await function(client)
+            finally:
+                objects = await client.list_objects_v2(Bucket=BUCKET)
+                for item in objects.get('Contents', []):
+                    await client.delete_object(Bucket=BUCKET, Key=item['Key'])
+                await client.delete_bucket(Bucket=BUCKET)
+    return asyncio.run(run())
+
+
+def test_parse_range():
+    assert parse_range('bytes=0-99', 1000) == (0, 99)
+    assert parse_range('bytes=900-', 1000) == (900, 999)
+    assert parse_range('bytes=-100', 1000) == (900, 999)
+    assert parse_range('bytes=900-2000', 1000) == (900, 999)
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range('bytes=1000-', 1000)
+    with pytest.raises(ValueError):
+        parse_range('items=0-1', 1000)
+
+
+def test_block_cache_evicts_least_recently_used():
+    cache = BlockCache(max_bytes=20)
+    cache.put('a', b'a' * 10)
+    cache.put('b', b'b' * 10)
+    cache.get('a')
+    cache.put('c', b'c' * 10)
+    assert cache.get('b') is None
+    assert cache.get('a') == b'a' * 10
+    assert cache.size == 20
+
+
+def test_read_ranges_through_cache(endpoint):
+    content = os.urandom(10000)
+
+    async def check(client):
+        await client.put_object(Bucket=BUCKET, Key=KEY, Body=content)
+        cache = BlockCache(max_bytes=1024 * 1024)
+        reader = RangeReader(client, BUCKET, cache, block_size=1024)
+
+        assert await reader.read(KEY, 100, 3000) == content[100:3001]
+        assert cache.misses == 3
+        # same blocks, served from the cache
+        assert await reader.read(KEY, 1024, 2047) == content[1024:2048]
+        assert cache.hits == 1
+        # partly cached, last block is short
+        assert await reader.read(KEY, 2500, 9999) == content[2500:10000]
+
+    run_with_client(endpoint, check)
+
+
+def test_replaced_object_is_not_served_from_cache(endpoint):
+    clock_time = [0.0]
+
+    async def check(client):
+        await client.put_object(Bucket=BUCKET, Key=KEY, Body=b'a' * 2048)
+        reader = RangeReader(client, BUCKET, BlockCache(max_bytes=1024 * 1024), block_size=1024,
+                             info_ttl=60, clock=lambda: clock_time[0])
+        assert await reader.read(KEY, 0, 9) == b'a' * 10
+
+        await client.put_object(Bucket=BUCKET, Key=KEY, Body=b'b' * 2048)
+        clock_time[0] = 60
+        assert await reader.read(KEY, 0, 9) == b'b' * 10
+
+    run_with_client(endpoint, check)
+
+
+def test_replaced_object_is_not_mixed_with_cached_blocks(endpoint):
+    async def check(client):
+        await client.put_object(Bucket=BUCKET, Key=KEY, Body=b'a' * 2048)
+        reader = RangeReader(client, BUCKET, BlockCache(max_bytes=1024 * 1024), block_size=1024)
+        assert await reader.read(KEY, 0, 9) == b'a' * 10
+
+        # replaced before the object info is due to be re-checked: the first block is cached for the old
+        # version, but the second block has to come from the new one.
+        await client.put_object(Bucket=BUCKET, Key=KEY, Body=b'b' * 2048)
+        assert await reader.read(KEY, 1000, 1099) == b'b' * 100
+
+    run_with_client(endpoint, check)
@@ -0,0 +1,51 @@
+"""
+Capture the fixture for tests/test_classify.py::test_classify_geotiff_matches_captured_fixture: the RGB,
+land cover and elevation rasters for a small area around a fire, and the classification earth engine makes
+of them, all on the same grid. The fixture isn't committed yet, so that test is skipped, and local
+classification hasn't been checked against earth engine's own output.
+
+Usage (needs earth engine credentials, see README.md):
+    poetry run python -m tests.fixtures.capture_classification
+
+Re-capture it whenever active_fire.CLASSIFICATION_RULE changes.
+"""
+import argparse
+import os
+from datetime import date, timedelta
+from fire_perimeter.active_fire import (apply_classification_rule, apply_cloud_cover_threshold, get_dem,
+                                        get_land_cover)
+from fire_perimeter.client import authenticate, to_ee_date, write_geotiff
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), 'earth_engine_classification')
+
+
+def capture(date_of_interest: date, bounds, pixels, date_range: int, cloud_cover: float, path: str):
+    authenticate()
+    data = apply_cloud_cover_threshold(to_ee_date(date_of_interest - timedelta(days=date_range)), date_range,
+                                       cloud_cover)
+    os.makedirs(path, exist_ok=True)
+    for name, image, bands in (('rgb', data, ['B12', 'B11', 'B9']),
+                               ('land_cover', get_land_cover(), ['Map']),
+                               ('dem', get_dem(), ['elevation']),
+                               ('classification', apply_classification_rule(data), ['x'])):
+        filename = os.path.join(path, f'{name}.tif')
+        # no tiling and no cache, we want exactly what earth engine gives us, all on the same grid.
+        write_geotiff(image, bounds, filename, {'bands': bands}, pixels=pixels, tiled=False)
+        print(f'{filename} written')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--date', type=date.fromisoformat, default=date(2021, 8, 23))
+    parser.add_argument('--bounds', type=float, nargs=4, default=[-121.62, 51.49, -121.58, 51.51],
+                        metavar=('WEST', 'SOUTH', 'EAST', 'NORTH'))
+    parser.add_argument('--pixels', type=int, nargs=2, default=[140, 110], metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--date-range', type=int, default=14)
+    parser.add_argument('--cloud-cover', type=float, default=22.2)
+    parser.add_argument('--path', default=FIXTURE_PATH)
+    args = parser.parse_args()
+    capture(args.date, tuple(args.bounds), tuple(args.pixels), args.date_range, args.cloud_cover, args.path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import threading
+import pytest
+
+ee = pytest.importorskip('ee')
+jwt = pytest.importorskip('jwt')
+pytest.importorskip('cryptography')
+pytest.importorskip('decouple')
+
+from cryptography.hazmat.primitives import serialization  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import rsa  # noqa: E402
+from fire_perimeter import auth  # noqa: E402
+
+PRIVATE_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+SERVICE_ACCOUNT = {
+    'client_email': 'fire-perimeter@example.iam.gserviceaccount.com',
+    'private_key_id': 'key-1',
+    'private_key': PRIVATE_KEY.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                             serialization.NoEncryption()).decode('utf-8'),
+}
+
+
+@pytest.fixture
+def initialized(monkeypatch):
+    """ Record the tokens earth engine is initialized with, instead of initializing it. """
+    tokens = []
+    loads = []
+
+    def load_service_account():
+        loads.append(1)
+        return SERVICE_ACCOUNT
+    monkeypatch.setattr(auth, 'load_service_account', load_service_account)
+    monkeypatch.setattr(ee, 'Initialize', lambda credentials=None: tokens.append(credentials.token))
+    return tokens, loads
+
+
+def test_create_jwt_token():
+    token, expires = auth.create_jwt_token(SERVICE_ACCOUNT, lifetime=600)
+    payload = jwt.decode(token, PRIVATE_KEY.public_key(), algorithms=['RS256'],
+                         audience='https://earthengine.googleapis.com/')
+    assert payload['iss'] == SERVICE_ACCOUNT['client_email']
+    assert payload['exp'] == expires
+    assert payload['exp'] - payload['iat'] == 600
+    assert jwt.get_unverified_header(token)['kid'] == 'key-1'
+
+
+def test_session_initializes_once(initialized):
+    tokens, loads = initialized
+    session = auth.EarthEngineSession()
+    for _ in range(5):
+        session.ensure()
+    assert len(tokens) == 1
+    assert len(loads) == 1
+
+
+def test_session_refreshes_before_expiry(initialized, monkeypatch):
+    tokens, loads = initialized
+    session = auth.EarthEngineSession(lifetime=3600, refresh_margin=300)
+    session.ensure()
+    now = auth.time.time()
+    monkeypatch.setattr(auth.time, 'time', lambda: now + 3600 - 310)
+    session.ensure()
+    assert len(tokens) == 1
+    monkeypatch.setattr(auth.time, 'time', lambda: now + 3600 - 290)
+    session.ensure()
+    assert len(tokens) == 2
+    # the service account is only read the once.
+    assert len(loads) == 1
+
+
+def test_session_shared_by_threads(initialized):
+    tokens, _ = initialized
+    session = auth.EarthEngineSession()
+    threads = [threading.Thread(target=session.ensure) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(tokens) == 1
@@ -0,0 +1,86 @@
+import os
+import pytest
+
+pytest.importorskip('decouple')
+
+from fire_perimeter.cache import RasterCache  # noqa: E402
+
+
+def raster(tmp_path, name: str, size: int) -> str:
+    filename = str(tmp_path / name)
+    with open(filename, 'wb') as f:
+        f.write(os.urandom(size))
+    return filename
+
+
+def set_age(cache: RasterCache, key: str, mtime: float):
+    """ Entries are ordered by modified time, which can be too coarse to tell quick writes apart. """
+    os.utime(cache._filename(key), (mtime, mtime))
+
+
+def cached_keys(cache: RasterCache):
+    return sorted(name[:-len('.tif')] for name in os.listdir(cache.path) if name.endswith('.tif'))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return RasterCache(str(tmp_path / 'cache'), max_bytes=250)
+
+
+def test_key_is_independent_of_order():
+    assert RasterCache.key({'a': 1, 'b': [1, 2]}) == RasterCache.key({'b': [1, 2], 'a': 1})
+    assert RasterCache.key({'a': 1}) != RasterCache.key({'a': 2})
+
+
+def test_get_and_put(cache, tmp_path):
+    source = raster(tmp_path, 'source.tif', 100)
+    target = str(tmp_path / 'target.tif')
+    assert not cache.get('a', target)
+    cache.put('a', source)
+    assert cache.get('a', target)
+    with open(source, 'rb') as expected, open(target, 'rb') as actual:
+        assert expected.read() == actual.read()
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_are_evicted(cache, tmp_path):
+    cache.put('a', raster(tmp_path, 'a.tif', 100))
+    set_age(cache, 'a', 1000)
+    cache.put('b', raster(tmp_path, 'b.tif', 100))
+    set_age(cache, 'b', 2000)
+    # a third raster takes us over 250 bytes, so the oldest (a) has to go.
+    cache.put('c', raster(tmp_path, 'c.tif', 100))
+    assert cached_keys(cache) == ['b', 'c']
+
+
+def test_get_makes_an_entry_recently_used(cache, tmp_path):
+    cache.put('a', raster(tmp_path, 'a.tif', 100))
+    set_age(cache, 'a', 1000)
+    cache.put('b', raster(tmp_path, 'b.tif', 100))
+    set_age(cache, 'b', 2000)
+    assert cache.get('a', str(tmp_path / 'target.tif'))
+    cache.put('c', raster(tmp_path, 'c.tif', 100))
+    assert cached_keys(cache) == ['a', 'c']
+
+
+def test_replacing_an_entry_counts_its_size_once(cache, tmp_path):
+    cache.put('a', raster(tmp_path, 'a.tif', 100))
+    cache.put('a', raster(tmp_path, 'a2.tif', 120))
+    cache.put('b', raster(tmp_path, 'b.tif', 120))
+    assert cached_keys(cache) == ['a', 'b']
+    assert sum(os.path.getsize(cache._filename(key)) for key in cached_keys(cache)) == 240
+
+
+def test_raster_bigger_than_the_cache_is_not_kept(cache, tmp_path):
+    cache.put('big', raster(tmp_path, 'big.tif', 300))
+    assert cached_keys(cache) == []
+    assert not [name for name in os.listdir(cache.path) if name.endswith('.partial')]
+
+
+def test_print_stats(cache, tmp_path, capsys):
+    cache.put('a', raster(tmp_path, 'a.tif', 10))
+    cache.get('a', str(tmp_path / 'target.tif'))
+    cache.get('missing', str(tmp_path / 'target.tif'))
+    cache.get('missing', str(tmp_path / 'target.tif'))
+    cache.print_stats()
+    assert capsys.readouterr().out.strip() == 'raster cache: 1 hits, 2 misses (33.3% hit rate)'
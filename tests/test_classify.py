@@ -0,0 +1,88 @@
+import os
+import pytest
+
+numpy = pytest.importorskip('numpy')
+gdal = pytest.importorskip('osgeo.gdal')
+active_fire = pytest.importorskip('fire_perimeter.active_fire')
+from fire_perimeter.classify import classify, classify_geotiff  # noqa: E402
+
+# optional, captured from earth engine with tests/fixtures/capture_classification.py - not committed.
+EARTH_ENGINE_FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'earth_engine_classification')
+
+
+def earth_engine_rule(r, g, b, land_cover, dem):
+    """ Evaluate the earth engine expression (active_fire.CLASSIFICATION_RULE) for a single pixel. """
+    expression = active_fire.CLASSIFICATION_RULE.split('=', 1)[1].replace('&&', ' and ')
+    return int(eval(expression, {}, {'R': r, 'G': g, 'B': b, 'LC': land_cover, 'DEM': dem}))
+
+
+def fixture_bands(rows=40, cols=50, seed=0):
+    rng = numpy.random.default_rng(seed)
+    r = rng.random((rows, cols), dtype=numpy.float32)
+    g = rng.random((rows, cols), dtype=numpy.float32)
+    b = rng.random((rows, cols), dtype=numpy.float32)
+    land_cover = rng.choice(numpy.array([0, 10, 20, 30, 40, 50, 60, 70, 80, 90, 95, 100], dtype=numpy.uint8),
+                            (rows, cols))
+    dem = rng.integers(0, 3000, (rows, cols), dtype=numpy.int16)
+    # include some ties and the elevation cut-off, where off by one errors would show up
+    g[0, :10] = r[0, :10]
+    dem[1, :10] = 1500
+    return r, g, b, land_cover, dem
+
+
+def expected_classification(r, g, b, land_cover, dem):
+    rows, cols = r.shape
+    return numpy.array([[earth_engine_rule(r[y, x], g[y, x], b[y, x], land_cover[y, x], dem[y, x])
+                         for x in range(cols)] for y in range(rows)], dtype=numpy.uint8)
+
+
+def write_fixture(filename, bands, data_type):
+    rows, cols = bands[0].shape
+    dataset = gdal.GetDriverByName('GTiff').Create(filename, cols, rows, len(bands), data_type)
+    dataset.SetGeoTransform((-121.6, 0.0002, 0, 51.5, 0, -0.0002))
+    for index, band in enumerate(bands):
+        dataset.GetRasterBand(index + 1).WriteArray(band)
+    dataset.FlushCache()
+    del dataset
+
+
+def test_classify_matches_earth_engine_rule():
+    bands = fixture_bands()
+    assert (classify(*bands) == expected_classification(*bands)).all()
+
+
+def test_classify_geotiff_matches_earth_engine_rule(tmp_path):
+    r, g, b, land_cover, dem = fixture_bands(rows=300, cols=70)
+    rgb_filename = str(tmp_path / 'rgb.tif')
+    land_cover_filename = str(tmp_path / 'land_cover.tif')
+    dem_filename = str(tmp_path / 'dem.tif')
+    classification_filename = str(tmp_path / 'classification.tif')
+    write_fixture(rgb_filename, [r, g, b], gdal.GDT_Float32)
+    write_fixture(land_cover_filename, [land_cover], gdal.GDT_Byte)
+    write_fixture(dem_filename, [dem], gdal.GDT_Int16)
+
+    classify_geotiff(rgb_filename, land_cover_filename, dem_filename, classification_filename)
+
+    classification = gdal.Open(classification_filename)
+    assert classification.GetGeoTransform() == (-121.6, 0.0002, 0, 51.5, 0, -0.0002)
+    result = classification.GetRasterBand(1).ReadAsArray()
+    assert (result == expected_classification(r, g, b, land_cover, dem)).all()
+
+
+@pytest.mark.skipif(not os.path.exists(os.path.join(EARTH_ENGINE_FIXTURE, 'classification.tif')),
+                    reason='no captured fixture, capture one with: python -m tests.fixtures.capture_classification')
+def test_classify_geotiff_matches_captured_fixture(tmp_path):
+    """ Optional: compare against a classification captured from earth engine, if one has been captured
+    locally. The tests above only check classify against our reading of active_fire.CLASSIFICATION_RULE,
+    so until a fixture is captured and committed, nothing here checks parity with earth engine itself. """
+    rgb_filename, land_cover_filename, dem_filename, expected_filename = (
+        os.path.join(EARTH_ENGINE_FIXTURE, f'{name}.tif')
+        for name in ('rgb', 'land_cover', 'dem', 'classification'))
+    classification_filename = str(tmp_path / 'classification.tif')
+
+    classify_geotiff(rgb_filename, land_cover_filename, dem_filename, classification_filename)
+
+    result = gdal.Open(classification_filename).GetRasterBand(1).ReadAsArray()
+    expected = gdal.Open(expected_filename).GetRasterBand(1).ReadAsArray()
+    assert result.shape == expected.shape
+    assert (result == expected).all()
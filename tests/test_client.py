@@ -0,0 +1,135 @@
+import pytest
+
+numpy = pytest.importorskip('numpy')
+gdal = pytest.importorskip('osgeo.gdal')
+pytest.importorskip('ee')
+pytest.importorskip('sqlalchemy')
+
+from datetime import date  # noqa: E402
+from shapely.geometry import Point, box  # noqa: E402
+from fire_perimeter import client, metrics  # noqa: E402
+from fire_perimeter.client import (calculate_grid_tiles, calculate_scene_fingerprint,  # noqa: E402
+                                   calculate_tiles, polygonize)
+
+BOUNDS = (-121.0, 50.0, -120.0, 51.0)
+
+
+def check_tiles_cover(tiles, bounds, pixels):
+    """ Tiles should cover bounds exactly, at the resolution of the full grid. """
+    west, south, east, north = bounds
+    width, height = pixels
+    assert min(tile[0] for tile, _ in tiles) == pytest.approx(west)
+    assert min(tile[1] for tile, _ in tiles) == pytest.approx(south)
+    assert max(tile[2] for tile, _ in tiles) == pytest.approx(east)
+    assert max(tile[3] for tile, _ in tiles) == pytest.approx(north)
+    assert sum(columns * rows for _, (columns, rows) in tiles) == width * height
+    for (tile_west, tile_south, tile_east, tile_north), (columns, rows) in tiles:
+        assert (tile_east - tile_west) / columns == pytest.approx((east - west) / width)
+        assert (tile_north - tile_south) / rows == pytest.approx((north - south) / height)
+
+
+def test_single_tile():
+    tiles = calculate_tiles(BOUNDS, (100, 80), max_pixels=100 * 100)
+    assert tiles == [(BOUNDS, (100, 80))]
+
+
+def test_exact_fit():
+    tiles = calculate_tiles(BOUNDS, (200, 100), max_pixels=100 * 100)
+    assert [dimensions for _, dimensions in tiles] == [(100, 100), (100, 100)]
+    (first, _), (second, _) = tiles
+    assert first == pytest.approx((-121.0, 50.0, -120.5, 51.0))
+    assert second == pytest.approx((-120.5, 50.0, -120.0, 51.0))
+    check_tiles_cover(tiles, BOUNDS, (200, 100))
+
+
+def test_remainder_rows_and_columns():
+    tiles = calculate_tiles(BOUNDS, (250, 101), max_pixels=100 * 100)
+    # three columns and two rows, with the left over pixels spread over the tiles.
+    assert len(tiles) == 6
+    assert [dimensions for _, dimensions in tiles] == [(83, 50), (83, 50), (84, 50),
+                                                       (83, 51), (83, 51), (84, 51)]
+    assert all(columns * rows <= 100 * 100 for _, (columns, rows) in tiles)
+    check_tiles_cover(tiles, BOUNDS, (250, 101))
+
+
+def test_tiles_go_north_to_south():
+    tiles = calculate_tiles(BOUNDS, (100, 200), max_pixels=100 * 100)
+    (first, _), (second, _) = tiles
+    assert first[3] == pytest.approx(51.0)
+    assert second[1] == pytest.approx(50.0)
+
+
+def test_grid_tiles_cover_bounds():
+    tiles = calculate_grid_tiles((-120.6, 50.1, -120.1, 50.3), 0.25)
+    assert tiles == [(-120.75, 50.25, -120.5, 50.5),
+                     (-120.5, 50.25, -120.25, 50.5),
+                     (-120.25, 50.25, -120.0, 50.5),
+                     (-120.75, 50.0, -120.5, 50.25),
+                     (-120.5, 50.0, -120.25, 50.25),
+                     (-120.25, 50.0, -120.0, 50.25)]
+
+
+def test_grid_tiles_do_not_depend_on_bounds():
+    # bounds that fall on the grid don't pull in the neighbouring tiles.
+    assert calculate_grid_tiles((-120.5, 50.0, -120.25, 50.25), 0.25) == [(-120.5, 50.0, -120.25, 50.25)]
+    # a slightly different area inside the same tile gets the same tile.
+    assert calculate_grid_tiles((-120.4, 50.1, -120.3, 50.2), 0.25) == [(-120.5, 50.0, -120.25, 50.25)]
+
+
+@pytest.fixture
+def classification(tmp_path):
+    """ A small classification raster with a fire that has a hole in it, a spot fire, and a fire touching
+    the edge of the raster - in tiles smaller than the raster, so the on disk mask is written in strips. """
+    rows, cols = 300, 260
+    data = numpy.zeros((rows, cols), dtype=numpy.float32)
+    data[20:120, 30:150] = 1
+    data[50:80, 60:90] = 0
+    data[200:204, 200:203] = 1
+    data[250:300, 0:40] = 1
+    # values other than 1 aren't fire
+    data[150:160, 150:160] = 2
+    filename = str(tmp_path / 'classification.tif')
+    dataset = gdal.GetDriverByName('GTiff').Create(filename, cols, rows, 1, gdal.GDT_Float32,
+                                                   options=['TILED=YES', 'BLOCKXSIZE=64', 'BLOCKYSIZE=64'])
+    dataset.SetGeoTransform((-121.0, 0.0002, 0, 51.0, 0, -0.0002))
+    dataset.GetRasterBand(1).WriteArray(data)
+    dataset.FlushCache()
+    del dataset
+    return filename
+
+
+def test_on_disk_mask_gives_the_same_polygons(classification):
+    in_memory = polygonize(classification, max_in_memory_pixels=2 ** 62)
+    on_disk = polygonize(classification, max_in_memory_pixels=0)
+    assert len(in_memory) == 3
+    assert sorted(polygon.normalize().wkb for polygon in on_disk) == \
+        sorted(polygon.normalize().wkb for polygon in in_memory)
+    assert sum(len(polygon.interiors) for polygon in on_disk) == 1
+
+
+@pytest.mark.parametrize('max_in_memory_pixels', [2 ** 62, 0])
+def test_polygonize_records_raster_dimensions(classification, max_in_memory_pixels):
+    fire = f'dimensions_{max_in_memory_pixels}'
+    with metrics.fire(fire), metrics.stage('polygonize'):
+        polygonize(classification, max_in_memory_pixels=max_in_memory_pixels)
+    stage, = [stage for stage in metrics.get_stages() if stage.fire == fire]
+    assert (stage.values['raster_width_pixels'], stage.values['raster_height_pixels']) == (260, 300)
+
+
+def test_scene_over_the_box_but_not_the_point_changes_fingerprint(monkeypatch):
+    """ A new scene that only covers part of the area downloaded can still change the perimeter. """
+    scenes = {'T10UEA_1': box(-121.5, 49.5, -120.4, 51.5)}
+    monkeypatch.setattr(client, 'to_ee_date', lambda value: value)
+    # stand in for earth engine: regions are shapely geometries, and scenes are footprints.
+    monkeypatch.setattr(client.ee.Geometry, 'BBox', lambda *bounds: box(*bounds))
+    monkeypatch.setattr(client, 'get_scene_ids', lambda start_date, n_days, cloud_cover, region: [
+        scene_id for scene_id, footprint in scenes.items() if footprint.intersects(region)])
+    point = Point(-120.5, 50.5)
+
+    def fingerprint():
+        return calculate_scene_fingerprint(date(2022, 8, 1), [point], BOUNDS, 14, 22.2)
+
+    before = fingerprint()
+    scenes['T10UFA_1'] = box(-120.3, 49.5, -119.0, 51.5)
+    assert not scenes['T10UFA_1'].intersects(point)
+    assert fingerprint() != before
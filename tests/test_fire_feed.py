@@ -0,0 +1,102 @@
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pytest
+
+pytest.importorskip('requests')
+pytest.importorskip('decouple')
+
+from fire_perimeter.fire_feed import (FireFeed, active_fires_filter, find_fires, fire_years_filter,  # noqa: E402
+                                      iter_features)
+
+FEATURES = [{'type': 'Feature',
+             'geometry': {'type': 'Point', 'coordinates': [-121.6, 51.5 + index]},
+             'properties': {'FIRE_NUMBER': f'K2000{index}', 'FIRE_STATUS': 'Out of Control',
+                            'CURRENT_SIZE': 100 + index, 'GEOGRAPHIC_DESCRIPTION': 'Île de Feu'}}
+            for index in range(5)]
+BODY = json.dumps({'type': 'FeatureCollection', 'features': FEATURES, 'totalFeatures': 5}).encode('utf-8')
+ETAG = '"feed-1"'
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        FeedHandler.requests.append((parse_qs(urlparse(self.path).query), dict(self.headers)))
+        if self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.send_header('ETag', ETAG)
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def feed_url():
+    FeedHandler.requests = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FeedHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}/ows'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1024 * 1024])
+def test_iter_features(chunk_size):
+    assert list(iter_features(io.BytesIO(BODY), chunk_size=chunk_size)) == FEATURES
+
+
+def test_iter_features_empty():
+    assert list(iter_features(io.BytesIO(b'{"type": "FeatureCollection", "features": []}'))) == []
+
+
+def test_iter_features_truncated():
+    with pytest.raises(ValueError):
+        list(iter_features(io.BytesIO(BODY[:len(BODY) // 2]), chunk_size=16))
+
+
+def test_features_filtered_by_server(feed_url, tmp_path):
+    feed = FireFeed(url=feed_url, cache_path=str(tmp_path))
+    assert list(feed.features(active_fires_filter(90))) == FEATURES
+    params, _ = FeedHandler.requests[0]
+    assert params['CQL_FILTER'] == ["FIRE_STATUS <> 'Out' AND CURRENT_SIZE >= 90"]
+
+
+def test_unchanged_feed_not_downloaded_again(feed_url, tmp_path):
+    feed = FireFeed(url=feed_url, cache_path=str(tmp_path))
+    assert list(feed.features(active_fires_filter(90))) == FEATURES
+    assert list(feed.features(active_fires_filter(90))) == FEATURES
+    assert (feed.downloads, feed.not_modified) == (1, 1)
+    _, headers = FeedHandler.requests[1]
+    assert headers['If-None-Match'] == ETAG
+
+
+def test_without_cache(feed_url):
+    feed = FireFeed(url=feed_url)
+    assert list(feed.features(active_fires_filter(90))) == FEATURES
+    assert list(feed.features(active_fires_filter(90))) == FEATURES
+    assert feed.downloads == 2
+
+
+def test_find_fires(feed_url):
+    feed = FireFeed(url=feed_url)
+    features = find_fires(feed, ['K20001', 'K20003'], fire_years_filter([2021, 2022]))
+    assert {feature['properties']['FIRE_NUMBER'] for feature in features} >= {'K20001', 'K20003'}
+    params, _ = FeedHandler.requests[0]
+    assert params['CQL_FILTER'] == ["FIRE_NUMBER IN ('K20001','K20003') AND FIRE_YEAR IN (2021,2022)"]
+
+
+def test_fire_number_not_found(feed_url):
+    feed = FireFeed(url=feed_url)
+    with pytest.raises(ValueError, match='K29999'):
+        find_fires(feed, ['K20001', 'K29999'])
@@ -0,0 +1,73 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+pytest.importorskip('decouple')
+
+from fire_perimeter import metrics  # noqa: E402
+
+
+def stages_for(fire):
+    return [stage for stage in metrics.get_stages() if stage.fire == fire]
+
+
+def test_stage_records_values_from_worker_threads():
+    with metrics.fire('K20001'):
+        with metrics.stage('write_geotiff_rgb'):
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                futures = [metrics.submit(executor, metrics.add, downloaded_bytes=1024) for _ in range(8)]
+                for future in futures:
+                    future.result()
+    stage, = stages_for('K20001')
+    assert stage.name == 'write_geotiff_rgb'
+    assert stage.values == {'downloaded_bytes': 8192}
+    assert stage.seconds >= 0
+    assert stage.memory_bytes > 0
+
+
+def test_add_outside_of_a_stage_is_ignored():
+    metrics.add(downloaded_bytes=1024)
+
+
+def test_failed_stage_is_recorded():
+    with pytest.raises(RuntimeError):
+        with metrics.fire('K20002'), metrics.stage('polygonize'):
+            raise RuntimeError('broken raster')
+    assert [stage.name for stage in stages_for('K20002')] == ['polygonize']
+
+
+def test_to_prometheus():
+    stages = [metrics.Stage(fire='K20003', name='polygonize', seconds=1.5, memory_bytes=2048,
+                            memory_growth_bytes=1024, values={'polygons': 3, 'vertices': 120}),
+              metrics.Stage(fire='K20003', name='polygonize', seconds=0.5, memory_bytes=4096,
+                            memory_growth_bytes=2048, values={'polygons': 1})]
+    lines = metrics.to_prometheus(stages).splitlines()
+    assert '# TYPE fire_perimeter_stage_seconds gauge' in lines
+    assert 'fire_perimeter_stage_seconds{fire="K20003",stage="polygonize"} 2.0' in lines
+    assert 'fire_perimeter_stage_memory_bytes{fire="K20003",stage="polygonize"} 4096' in lines
+    assert 'fire_perimeter_stage_memory_growth_bytes{fire="K20003",stage="polygonize"} 3072' in lines
+    assert 'fire_perimeter_stage_polygons{fire="K20003",stage="polygonize"} 4' in lines
+    assert 'fire_perimeter_stage_vertices{fire="K20003",stage="polygonize"} 120' in lines
+    assert not any(line.startswith('fire_perimeter_stage_downloaded_bytes') for line in lines)
+
+
+def test_to_report():
+    stages = [metrics.Stage(fire=fire, name='persist_polygon', seconds=1.0, memory_growth_bytes=growth)
+              for fire, growth in (('K20004', 1024), ('K20005', 512))]
+    report = json.loads(json.dumps(metrics.to_report(stages)))
+    assert report['totals']['persist_polygon'] == {'count': 2, 'seconds': 2.0,
+                                                   'max_memory_growth_bytes': 1024}
+    assert [stage['fire'] for stage in report['stages']] == ['K20004', 'K20005']
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/statm'), reason='needs /proc to sample current memory')
+def test_stage_memory_growth():
+    with metrics.fire('K20006'), metrics.stage('polygonize'):
+        # touch every page, so it's resident.
+        data = bytearray(64 * 1024 * 1024)
+        for index in range(0, len(data), 4096):
+            data[index] = 1
+    stage, = stages_for('K20006')
+    assert stage.memory_growth_bytes >= 32 * 1024 * 1024
+    del data
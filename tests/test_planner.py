@@ -0,0 +1,99 @@
+import pytest
+
+pytest.importorskip('shapely')
+pytest.importorskip('pyproj')
+
+from shapely.geometry import Point, box  # noqa: E402
+from fire_perimeter.planner import (Fire, assign_polygons, clamp_bounding_box, cluster_fires,  # noqa: E402
+                                    count_pixels, expand_bounding_box, nearest_polygons, touching_edges)
+
+
+def fire(identifier, x, y, half_width=1.0):
+    return Fire(identifier=identifier, point=Point(x, y), current_size=100,
+                bounds=(x - half_width, y - half_width, x + half_width, y + half_width))
+
+
+def test_separate_fires_are_not_merged():
+    clusters = cluster_fires([fire('A', 0, 0), fire('B', 10, 0)])
+    assert sorted(cluster.identifier for cluster in clusters) == ['A', 'B']
+
+
+def test_overlapping_fires_are_merged():
+    clusters = cluster_fires([fire('A', 0, 0), fire('B', 0.5, 0.5), fire('C', 10, 0)])
+    assert sorted(cluster.identifier for cluster in clusters) == ['A+B', 'C']
+    merged = [cluster for cluster in clusters if cluster.identifier == 'A+B'][0]
+    assert merged.bounds == (-1, -1, 1.5, 1.5)
+
+
+def test_barely_overlapping_fires_are_not_merged():
+    # the region covering both would be far bigger than the two regions on their own.
+    clusters = cluster_fires([fire('A', 0, 0), fire('B', 1.9, 1.9)])
+    assert len(clusters) == 2
+
+
+def test_fires_merge_into_one_region():
+    clusters = cluster_fires([fire('A', 0, 0), fire('B', 0.2, 0), fire('C', 0.6, 0.1, half_width=0.4)])
+    assert len(clusters) == 1
+    assert sorted(f.identifier for f in clusters[0].fires) == ['A', 'B', 'C']
+
+
+def test_merges_too_big_to_download_are_refused():
+    a, b = fire('A', -120.0, 51.0, half_width=0.1), fire('B', -119.9, 51.0, half_width=0.1)
+    merged = count_pixels((-120.1, 50.9, -119.8, 51.1))
+    assert count_pixels(a.bounds) < merged
+    assert len(cluster_fires([a, b], max_pixels=merged)) == 1
+    assert len(cluster_fires([a, b], max_pixels=merged - 1)) == 2
+
+
+def test_count_pixels():
+    # a degree of latitude is roughly 111km, so 0.1 degrees is roughly 555 pixels of 20 meters.
+    assert count_pixels((0.0, 0.0, 0.1, 0.1)) == pytest.approx(556 * 553, rel=0.01)
+
+
+def test_assign_polygons():
+    fires = [fire('A', 0, 0), fire('B', 1, 0)]
+    containing_a = box(-0.2, -0.2, 0.2, 0.2)
+    near_b = box(0.8, 0.3, 0.9, 0.4)
+    outside = box(5, 5, 6, 6)
+    assigned = assign_polygons([containing_a, near_b, outside], fires)
+    assert assigned == {'A': [containing_a], 'B': [near_b]}
+
+
+def test_expand_bounding_box():
+    bounds = (-121.0, 51.0, -120.0, 52.0)
+    west, south, east, north = expand_bounding_box(bounds, 1000)
+    # a kilometer is roughly 0.009 degrees of latitude, and 0.014 degrees of longitude at 51.5 degrees north.
+    assert north - 52.0 == pytest.approx(0.009, abs=0.0005)
+    assert 51.0 - south == pytest.approx(0.009, abs=0.0005)
+    assert -121.0 - west == pytest.approx(0.0144, abs=0.0005)
+    assert east + 120.0 == pytest.approx(0.0144, abs=0.0005)
+
+
+def test_expand_some_edges():
+    bounds = (-121.0, 51.0, -120.0, 52.0)
+    west, south, east, north = expand_bounding_box(bounds, 1000, ['east'])
+    assert (west, south, north) == (-121.0, 51.0, 52.0)
+    assert east > -120.0
+
+
+def test_touching_edges():
+    bounds = (0.0, 0.0, 1.0, 1.0)
+    pixel_size = (0.01, 0.01)
+    assert touching_edges([box(0.2, 0.2, 0.8, 0.8)], bounds, pixel_size) == []
+    assert touching_edges([box(0.0, 0.2, 0.5, 0.5), box(0.6, 0.6, 0.9, 1.0)], bounds, pixel_size) == \
+        ['west', 'north']
+    assert touching_edges([], bounds, pixel_size) == []
+
+
+def test_nearest_polygons():
+    point = Point(0, 0)
+    containing = box(-1, -1, 1, 1)
+    near = box(2, 0, 3, 1)
+    far = box(10, 10, 11, 11)
+    assert nearest_polygons([far, containing, near], point) == [containing]
+    assert nearest_polygons([far, near], point) == [near]
+    assert nearest_polygons([], point) == []
+
+
+def test_clamp_bounding_box():
+    assert clamp_bounding_box((-2.0, -1.0, 3.0, 0.5), (-1.0, -1.0, 1.0, 1.0)) == (-1.0, -1.0, 1.0, 0.5)
@@ -0,0 +1,56 @@
+import threading
+from fire_perimeter import scheduler
+
+
+def test_one_fire_failing_does_not_stop_the_others(capsys):
+    processed = []
+    lock = threading.Lock()
+
+    def process(identifier):
+        def run():
+            if identifier == 'K20002':
+                raise RuntimeError('earth engine said no')
+            with lock:
+                processed.append(identifier)
+            return 'skipped' if identifier == 'K20003' else None
+        return run
+
+    identifiers = ['K20001', 'K20002', 'K20003', 'K20004']
+    results = scheduler.run([(identifier, process(identifier)) for identifier in identifiers], workers=2)
+
+    assert sorted(processed) == ['K20001', 'K20003', 'K20004']
+    assert [result.identifier for result in results] == identifiers
+    assert [result.status for result in results] == ['ok', 'failed', 'skipped', 'ok']
+    assert results[1].error == 'earth engine said no'
+
+    # run_one prints failures as they happen, we're only interested in the summary.
+    capsys.readouterr()
+    scheduler.print_summary(results)
+    lines = capsys.readouterr().out.splitlines()
+    failed_line, = [line for line in lines if line.startswith('K20002')]
+    assert 'failed' in failed_line and 'earth engine said no' in failed_line
+    assert lines[-1].startswith('4 fires, 1 failed, 1 skipped')
+
+
+def test_run_one_times_the_job():
+    result = scheduler.run_one('K20005', lambda: 'ok', run_start=0.0)
+    assert result.status == 'ok'
+    assert result.seconds >= 0
+    assert result.error is None
+
+
+def test_fires_processed_together_are_reported_per_fire(capsys):
+    def fail():
+        raise RuntimeError('download failed')
+
+    jobs = [('K20006+K20007', fail, ['K20006', 'K20007']), ('K20008', lambda: None)]
+    results = scheduler.run(jobs, workers=2)
+
+    assert [(result.identifier, result.status) for result in results] == \
+        [('K20006', 'failed'), ('K20007', 'failed'), ('K20008', 'ok')]
+    assert [result.job for result in results] == ['K20006+K20007', 'K20006+K20007', None]
+    assert results[1].error == 'download failed'
+
+    capsys.readouterr()
+    scheduler.print_summary(results)
+    assert capsys.readouterr().out.splitlines()[-1].startswith('3 fires, 2 failed, 0 skipped')
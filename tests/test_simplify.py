@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip('pyproj')
+shapely_geometry = pytest.importorskip('shapely.geometry')
+
+from fire_perimeter.simplify import (  # noqa: E402
+    METERS_PER_DEGREE, count_vertices, remove_slivers, simplify_perimeter)
+
+PIXEL = 20 / METERS_PER_DEGREE
+
+
+def staircase(steps: int):
+    """ A polygon following pixel edges, with a vertex at every step. """
+    coordinates = [(-120, 50)]
+    for step in range(steps):
+        x, y = coordinates[-1]
+        coordinates.append((x + PIXEL, y))
+        coordinates.append((x + PIXEL, y + PIXEL))
+    x, y = coordinates[-1]
+    coordinates.append((-120, y))
+    return shapely_geometry.Polygon(coordinates)
+
+
+def test_simplify_perimeter_reduces_vertices():
+    multi_polygon = shapely_geometry.MultiPolygon([staircase(50)])
+    simplified = simplify_perimeter(multi_polygon, 30)
+    assert simplified.is_valid
+    assert count_vertices(simplified) < count_vertices(multi_polygon)
+    assert simplified.area == pytest.approx(multi_polygon.area, rel=0.1)
+
+
+def test_simplify_perimeter_keeps_touching_polygons_valid():
+    left = staircase(20)
+    right = shapely_geometry.Polygon([(x + 21 * PIXEL, y) for x, y in left.exterior.coords])
+    simplified = simplify_perimeter(shapely_geometry.MultiPolygon([left, right]), 100)
+    assert simplified.is_valid
+    assert len(simplified.geoms) == 2
+
+
+def test_remove_slivers():
+    pixel = shapely_geometry.box(-120, 50, -120 + PIXEL, 50 + PIXEL)
+    big = staircase(20)
+    assert remove_slivers([pixel, big], 800) == [big]
@@ -0,0 +1,76 @@
+import math
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('pyproj')
+pytest.importorskip('shapely')
+
+from shapely.geometry import Polygon, box  # noqa: E402
+from fire_perimeter.stats import calculate_statistics  # noqa: E402
+
+# WGS84
+A = 6378137.0
+F = 1 / 298.257223563
+B = A * (1 - F)
+E = math.sqrt(2 * F - F * F)
+
+
+def zone_area(latitude: float) -> float:
+    """ Area of the ellipsoid between the equator and latitude, per radian of longitude. """
+    sin = math.sin(math.radians(latitude))
+    return B * B / 2 * (sin / (1 - E * E * sin * sin) + math.log((1 + E * sin) / (1 - E * sin)) / (2 * E))
+
+
+def parallel_length(latitude: float) -> float:
+    """ Length of a degree of longitude along a parallel. """
+    sin = math.sin(math.radians(latitude))
+    return math.radians(1) * A / math.sqrt(1 - E * E * sin * sin) * math.cos(math.radians(latitude))
+
+
+def meridian_length(south: float, north: float, steps: int = 1000) -> float:
+    """ Length of a meridian between two latitudes (midpoint rule over the meridional radius). """
+    step = (north - south) / steps
+    length = 0.0
+    for index in range(steps):
+        sin = math.sin(math.radians(south + (index + 0.5) * step))
+        length += A * (1 - E * E) / (1 - E * E * sin * sin) ** 1.5 * math.radians(step)
+    return length
+
+
+def test_one_degree_box():
+    statistics = calculate_statistics([box(-121, 50, -120, 51)])
+    # the box's east-west edges are geodesics, not parallels, so we allow a little slack.
+    assert statistics.area == pytest.approx(math.radians(1) * (zone_area(51) - zone_area(50)), rel=1e-4)
+    assert statistics.perimeter == pytest.approx(
+        2 * meridian_length(50, 51) + parallel_length(50) + parallel_length(51), rel=1e-4)
+    assert statistics.polygon_count == 1
+
+
+def test_orientation_does_not_matter():
+    clockwise = Polygon([(-121, 50), (-121, 51), (-120, 51), (-120, 50)])
+    counter_clockwise = Polygon([(-121, 50), (-120, 50), (-120, 51), (-121, 51)])
+    assert calculate_statistics([clockwise]).area == pytest.approx(
+        calculate_statistics([counter_clockwise]).area)
+    assert calculate_statistics([clockwise]).area > 0
+
+
+def test_holes_are_subtracted():
+    outer = box(-121, 50, -120, 51)
+    hole = box(-120.75, 50.25, -120.25, 50.75)
+    with_hole = Polygon(outer.exterior.coords, [hole.exterior.coords])
+    statistics = calculate_statistics([with_hole])
+    assert statistics.area == pytest.approx(
+        calculate_statistics([outer]).area - calculate_statistics([hole]).area)
+    # only the exterior counts towards the perimeter.
+    assert statistics.perimeter == pytest.approx(calculate_statistics([outer]).perimeter)
+
+
+def test_many_polygons():
+    polygons = [box(-121, 50, -120.5, 50.5), box(-120, 51, -119.5, 51.5)]
+    statistics = calculate_statistics(polygons)
+    assert statistics.area == pytest.approx(sum(calculate_statistics([polygon]).area for polygon in polygons))
+    assert statistics.polygon_count == 2
+
+
+def test_no_polygons():
+    assert calculate_statistics([]) == (0.0, 0.0, 0)
@@ -0,0 +1,145 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+import pytest
+
+moto_server = pytest.importorskip('moto.server')
+aiobotocore_session = pytest.importorskip('aiobotocore.session')
+pytest.importorskip('decouple')
+
+from fire_perimeter import store  # noqa: E402
+
+BUCKET = 'fire-perimeter'
+MB = 1024 * 1024
+
+
+@pytest.fixture(scope='module')
+def endpoint():
+    """ Local S3 stand-in. """
+    server = moto_server.ThreadedMotoServer(ip_address='127.0.0.1', port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f'http://{host}:{port}'
+    server.stop()
+
+
+def create_client(endpoint):
+    return aiobotocore_session.get_session().create_client(
+        's3', endpoint_url=endpoint, region_name='us-east-1',
+        aws_access_key_id='test', aws_secret_access_key='test')
+
+
+def run_with_client(endpoint, function):
+    async def run():
+        async with create_client(endpoint) as client:
+            return await function(client)
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def bucket(endpoint, monkeypatch):
+    """ A fresh bucket, which the uploader's client is pointed at. """
+    @asynccontextmanager
+    async def get_client():
+        async with create_client(endpoint) as client:
+            yield client, BUCKET
+    monkeypatch.setattr(store, 'get_client', get_client)
+
+    async def create(client):
+        await client.create_bucket(Bucket=BUCKET)
+    run_with_client(endpoint, create)
+    yield BUCKET
+
+    async def delete(client):
+        objects = await client.list_objects_v2(Bucket=BUCKET)
+        for item in objects.get('Contents', []):
+            await client.delete_object(Bucket=BUCKET, Key=item['Key'])
+        await client.delete_bucket(Bucket=BUCKET)
+    run_with_client(endpoint, delete)
+
+
+def get_object(endpoint, key: str) -> bytes:
+    async def get(client):
+        response = await client.get_object(Bucket=BUCKET, Key=key)
+        async with response['Body'] as body:
+            return await body.read()
+    return run_with_client(endpoint, get)
+
+
+def create_file(tmp_path, name: str, size: int) -> str:
+    filename = str(tmp_path / name)
+    with open(filename, 'wb') as f:
+        f.write(os.urandom(size))
+    return filename
+
+
+def uploader(**kwargs) -> store.Uploader:
+    settings = dict(concurrency=2, multipart_threshold=16 * MB, part_size=5 * MB, part_concurrency=2)
+    settings.update(kwargs)
+    return store.Uploader(**settings)
+
+
+def test_upload_in_background(endpoint, bucket, tmp_path):
+    upload = uploader()
+    files = {f'fire_perimeter/K2000{index}/rgb.tif': create_file(tmp_path, f'{index}.tif', 1000 + index)
+             for index in range(3)}
+    contents = {}
+    for key, filename in files.items():
+        with open(filename, 'rb') as f:
+            contents[key] = f.read()
+        future = upload.submit(filename, key)
+        # the file is moved out of the way, so the caller can clean up straight away.
+        assert not os.path.exists(filename)
+
+    assert future.result().status == 'ok'
+    results = upload.wait()
+    assert [result.key for result in results] == list(files)
+    assert all(result.status == 'ok' for result in results)
+    assert [result.bytes for result in results] == [1000, 1001, 1002]
+    for key, content in contents.items():
+        assert get_object(endpoint, key) == content
+
+
+def test_multipart_upload(endpoint, bucket, tmp_path):
+    # S3 parts have to be at least 5MB (other than the last one), so this goes up in 3 parts.
+    upload = uploader(multipart_threshold=8 * MB, part_size=5 * MB)
+    filename = create_file(tmp_path, 'big.tif', 11 * MB)
+    with open(filename, 'rb') as f:
+        content = f.read()
+    upload.submit(filename, 'fire_perimeter/K20003/rgb.tif')
+    result, = upload.wait()
+    assert result.status == 'ok', result.error
+    assert get_object(endpoint, 'fire_perimeter/K20003/rgb.tif') == content
+
+    async def check_no_pending_uploads(client):
+        return await client.list_multipart_uploads(Bucket=BUCKET)
+    assert not run_with_client(endpoint, check_no_pending_uploads).get('Uploads')
+
+
+def test_wait_reports_failed_uploads(endpoint, bucket, tmp_path, monkeypatch):
+    upload = uploader()
+    upload.submit(create_file(tmp_path, 'ok.tif', 100), 'fire_perimeter/K20004/rgb.tif')
+    # a bucket that doesn't exist makes just this one fail.
+    original = upload._upload
+
+    async def upload_to_missing_bucket(filename, key):
+        if key.endswith('missing.tif'):
+            upload._bucket = 'no-such-bucket'
+            try:
+                return await original(filename, key)
+            finally:
+                upload._bucket = BUCKET
+        return await original(filename, key)
+    monkeypatch.setattr(upload, '_upload', upload_to_missing_bucket)
+    upload.submit(create_file(tmp_path, 'missing.tif', 100), 'fire_perimeter/K20005/missing.tif')
+
+    spool_path = upload._spool_path
+    results = upload.wait()
+    assert [result.status for result in results] == ['ok', 'failed']
+    assert 'NoSuchBucket' in results[1].error
+    # the spooled copies are cleaned up, whether the upload worked or not.
+    assert not os.path.exists(spool_path)
+
+
+def test_wait_without_uploads():
+    assert uploader().wait() == []